@@ -7,6 +7,8 @@ import sys
 import os
 import shutil
 import bisect
+import mmap
+import multiprocessing
 
 from builtins import zip
 from builtins import object
@@ -20,6 +22,8 @@ DESCRIPTION = "repren: Multi-pattern string replacement and file renaming"
 BACKUP_SUFFIX = b".orig"
 TEMP_SUFFIX = b".repren.tmp"
 DEFAULT_EXCLUDE_PAT = b"\."
+# Files at least this large are mapped into memory instead of read, when not working by line.
+MMAP_THRESHOLD = 1024 * 1024
 
 
 def log(op, msg):
@@ -43,6 +47,15 @@ class _Tally(object):
         self.files_rewritten = 0
         self.renames = 0
 
+    def add(self, o):
+        self.files += o.files
+        self.chars += o.chars
+        self.matches += o.matches
+        self.valid_matches += o.valid_matches
+        self.files_changed += o.files_changed
+        self.files_rewritten += o.files_rewritten
+        self.renames += o.renames
+
 
 _tally = _Tally()
 
@@ -87,6 +100,20 @@ def _apply_replacements(input_str, matches):
     return b"".join(out)
 
 
+def _write_replacements(stream_out, input_str, matches):
+    '''Like _apply_replacements, but write the result to stream_out piece by piece instead of
+  building it in memory. Returns the number of matches applied.'''
+    pos = 0
+    count = 0
+    for (match, replacement) in matches:
+        stream_out.write(input_str[pos:match.start()])
+        stream_out.write(match.expand(replacement))
+        pos = match.end()
+        count += 1
+    stream_out.write(input_str[pos:])
+    return count
+
+
 class _MatchCounts(object):
     def __init__(self, found=0, valid=0):
         self.found = found
@@ -97,27 +124,153 @@ class _MatchCounts(object):
         self.valid += o.valid
 
 
-def multi_replace(input_str, patterns, is_path=False, source_name=None):
+_literal_pat = re.compile(rb"(?:[^\\.^$*+?{}\[\]|()]|\\[^0-9A-Za-z])*\Z")
+_escape_pat = re.compile(rb"\\(.)", re.DOTALL)
+
+
+def _literal_text(regex):
+    '''Return the text a pattern matches if it is a plain literal (as parse_patterns(literal=True)
+  produces), otherwise None.'''
+    if regex.flags & (re.VERBOSE | re.MULTILINE) or not _literal_pat.match(regex.pattern):
+        return None
+    return _escape_pat.sub(rb"\1", regex.pattern)
+
+
+def _trie_regex(words):
+    '''Return a regex source matching any of words, shaped as a trie so the regex engine never
+  backtracks across words and, at each position, prefers the longest word.'''
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[None] = True
+
+    def build(node):
+        branches = [re.escape(bytes([char])) + build(child)
+                    for (char, child) in sorted((k, v) for (k, v) in node.items() if k is not None)]
+        if not branches:
+            return b""
+        body = branches[0] if len(branches) == 1 else b"(?:" + b"|".join(branches) + b")"
+        # A word ending here is optional: the greedy group tries the longer words first.
+        return b"(?:" + body + b")?" if None in node else body
+
+    return build(trie)
+
+
+class _CompiledPatterns(object):
+    '''All patterns combined into one regex and matched in a single pass.
+
+  Consecutive literal patterns are merged into a trie, so at each position the longest
+  literal wins; other patterns keep their relative order as alternatives. The scan yields
+  leftmost non-overlapping matches, so nothing has to be sorted or dropped afterwards.'''
+
+    def __init__(self, patterns):
+        flags = set(regex.flags for (regex, _) in patterns)
+        if len(flags) != 1:
+            raise ValueError("patterns use different flags")
+        self.flags = flags.pop()
+        self.fold = bool(self.flags & re.IGNORECASE)
+        self.groups = []
+        alternatives = []
+        run = {}
+
+        def flush_literals():
+            if run:
+                name = "_g%d" % len(self.groups)
+                alternatives.append(b"(?P<%s>%s)" % (name.encode(), _trie_regex(sorted(run))))
+                self.groups.append((name, dict(run)))
+                run.clear()
+
+        for (regex, replacement) in patterns:
+            text = _literal_text(regex)
+            if text:
+                run.setdefault(text.lower() if self.fold else text, (regex, replacement))
+                continue
+            # Backreferences inside a pattern would point at the wrong group once combined.
+            if re.search(rb"\\[1-9]|\(\?P=", regex.pattern):
+                raise ValueError("pattern uses backreferences")
+            flush_literals()
+            name = "_g%d" % len(self.groups)
+            alternatives.append(b"(?P<%s>%s)" % (name.encode(), regex.pattern))
+            self.groups.append((name, (regex, replacement)))
+        flush_literals()
+        self.regex = re.compile(b"|".join(alternatives), self.flags)
+        self.lookup = dict(self.groups)
+
+    def finditer(self, input_str):
+        '''Yield (match, replacement), where match comes from the originating pattern so that
+  its groups and replacement template work as before.'''
+        for combined in self.regex.finditer(input_str):
+            if combined.start() == combined.end():
+                continue
+            entry = self.lookup[combined.lastgroup]
+            if isinstance(entry, dict):
+                text = combined.group()
+                entry = entry[text.lower() if self.fold else text]
+            (regex, replacement) = entry
+            yield (regex.match(input_str, combined.start()), replacement)
+
+
+_compiled_cache = (None, None)
+
+
+def compile_patterns(patterns):
+    '''Return the single-pass engine for patterns, or None if they cannot be combined.'''
+    global _compiled_cache
+    if _compiled_cache[0] is patterns:
+        return _compiled_cache[1]
+    try:
+        compiled = _CompiledPatterns(patterns) if patterns else None
+    except (ValueError, re.error):
+        compiled = None
+    _compiled_cache = (patterns, compiled)
+    return compiled
+
+
+def multi_replace(input_str, patterns, is_path=False, source_name=None, single_pass=True, stream_out=None):
     '''Replace all occurrences in the input given a list of patterns (regex,
   replacement), simultaneously, so that no replacement affects any other. E.g.
-  { xxx -> yyy, yyy -> xxx } or { xxx -> yyy, y -> z } are possible. If matches
-  overlap, one is selected, with matches appearing earlier in the list of
-  patterns preferred.
+  { xxx -> yyy, yyy -> xxx } or { xxx -> yyy, y -> z } are possible.
+
+  By default all patterns are combined and matched in one pass (see _CompiledPatterns):
+  overlapping candidates resolve to the leftmost match, and among literals to the longest.
+  With single_pass=False, or for patterns that cannot be combined (mixed flags, backreferences),
+  each pattern is matched separately and overlaps are resolved in favour of the pattern
+  appearing earlier in the list.
+
+  With stream_out, the result is written there as it is produced and None is returned in its
+  place; in single-pass mode the matches are not collected either.
   '''
-    matches = []
-    for (regex, replacement) in patterns:
-        for match in regex.finditer(input_str):
-            matches.append((match, replacement))
-    valid_matches = _sort_drop_overlaps(matches, source_name=source_name)
-    result = _apply_replacements(input_str, valid_matches)
+    compiled = compile_patterns(patterns) if single_pass else None
+    found = None
+    if compiled is not None:
+        valid_matches = compiled.finditer(input_str)
+        if stream_out is None:
+            valid_matches = list(valid_matches)
+    else:
+        matches = []
+        for (regex, replacement) in patterns:
+            for match in regex.finditer(input_str):
+                matches.append((match, replacement))
+        found = len(matches)
+        valid_matches = _sort_drop_overlaps(matches, source_name=source_name)
+    if stream_out is not None:
+        result = None
+        valid = _write_replacements(stream_out, input_str, valid_matches)
+    else:
+        result = _apply_replacements(input_str, valid_matches)
+        valid = len(valid_matches)
+    if found is None:
+        found = valid
 
     global _tally
     if not is_path:
         _tally.chars += len(input_str)
-        _tally.matches += len(matches)
-        _tally.valid_matches += len(valid_matches)
+        _tally.matches += found
+        _tally.valid_matches += valid
 
-    return result, _MatchCounts(len(matches), len(valid_matches))
+    return result, _MatchCounts(found, valid)
 
 # --- Case handling (only used for case-preserving magic) ---
 
@@ -183,7 +336,8 @@ def make_parent_dirs(path):
     '''Ensure parent directories of a file are created as needed.'''
     dirname = os.path.dirname(path)
     if dirname and not os.path.isdir(dirname):
-        os.makedirs(dirname)
+        # Parallel workers may race to create the same directory.
+        os.makedirs(dirname, exist_ok=True)
     return path
 
 
@@ -201,6 +355,8 @@ def move_file(source_path, dest_path, clobber=False):
 
 
 def transform_stream(transform, stream_in, stream_out, by_line=False):
+    '''Copy stream_in to stream_out through transform. By line, transform(line) returns the new
+  line and its counts; otherwise transform(contents, stream_out) writes the whole result itself.'''
     counts = _MatchCounts()
     if by_line:
         for line in stream_in:
@@ -211,9 +367,15 @@ def transform_stream(transform, stream_in, stream_out, by_line=False):
                 new_line = line
             stream_out.write(new_line)
     else:
-        contents = stream_in.read()
-        (new_contents, new_counts) = transform(contents) if transform else contents
-        stream_out.write(new_contents)
+        size = os.fstat(stream_in.fileno()).st_size if hasattr(stream_in, "fileno") else 0
+        if transform and size >= MMAP_THRESHOLD:
+            # Regexes run directly over the mapped pages, so the input is never copied into memory.
+            with mmap.mmap(stream_in.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                counts = transform(contents, stream_out)[1]
+        elif transform:
+            counts = transform(stream_in.read(), stream_out)[1]
+        else:
+            stream_out.write(stream_in.read())
     return counts
 
 
@@ -274,7 +436,8 @@ def rewrite_file(path, patterns, do_renames=False, do_contents=False, by_line=Fa
     dest_path = multi_replace(path, patterns, is_path=True)[0] if do_renames else path
     transform = None
     if do_contents:
-        transform = lambda contents: multi_replace(contents, patterns, source_name=path)
+        transform = lambda contents, stream_out=None: multi_replace(
+            contents, patterns, source_name=path, stream_out=stream_out)
     counts = transform_file(transform, path, dest_path, by_line=by_line, dry_run=dry_run, clean=clean)
     if counts.found > 0:
         log("modify", "%s: %s matches" % (path.decode(), counts.found))
@@ -300,17 +463,66 @@ def walk_files(paths, exclude_pat=DEFAULT_EXCLUDE_PAT):
     return out
 
 
+_worker_args = None
+
+
+def _init_worker(patterns, options):
+    global _worker_args
+    _worker_args = (patterns, options)
+
+
+def _rewrite_file_worker(path):
+    '''Rewrite one file in a pool worker and return the worker's tally for just that file.'''
+    global _tally
+    _tally = _Tally()
+    (patterns, options) = _worker_args
+    rewrite_file(path, patterns, **options)
+    return _tally
+
+
+def _dest_path(path, patterns, do_renames):
+    return multi_replace(path, patterns, is_path=True)[0] if do_renames else path
+
+
 def rewrite_files(root_paths, patterns,
                   do_renames=False,
                   do_contents=False,
                   exclude_pat=DEFAULT_EXCLUDE_PAT,
                   by_line=False,
                   dry_run=False,
-                  clean=False):
+                  clean=False,
+                  jobs=1):
+    '''Rewrite every file under root_paths. With jobs > 1, files are spread over a process pool
+  and the workers' tallies are combined into the global _tally.'''
     paths = walk_files(root_paths, exclude_pat=exclude_pat)
     log(None, "Found %s files in: %s" % (len(paths), ", ".join([path.decode() for path in root_paths])))
-    for path in paths:
-        rewrite_file(path, patterns, do_renames=do_renames, do_contents=do_contents, by_line=by_line, dry_run=dry_run, clean=clean)
+    options = dict(do_renames=do_renames, do_contents=do_contents, by_line=by_line, dry_run=dry_run, clean=clean)
+    if jobs <= 1 or len(paths) < 2:
+        for path in paths:
+            rewrite_file(path, patterns, **options)
+        return
+
+    # Files renamed onto the same destination, or onto another file's path, depend on the
+    # order of moves; those stay serial. Everything else is independent.
+    dests = [_dest_path(path, patterns, do_renames) for path in paths]
+    sources = set(paths)
+    seen = {}
+    for dest in dests:
+        seen[dest] = seen.get(dest, 0) + 1
+    parallel, serial = [], []
+    for (path, dest) in zip(paths, dests):
+        if seen[dest] > 1 or (dest != path and dest in sources):
+            serial.append(path)
+        else:
+            parallel.append(path)
+
+    global _tally
+    context = multiprocessing.get_context("fork") if hasattr(os, "fork") else multiprocessing.get_context()
+    with context.Pool(jobs, initializer=_init_worker, initargs=(patterns, options)) as pool:
+        for tally in pool.imap_unordered(_rewrite_file_worker, parallel, chunksize=16):
+            _tally.add(tally)
+    for path in serial:
+        rewrite_file(path, patterns, **options)
 
 # --- Invocation ---
 
@@ -354,14 +566,17 @@ if __name__ == '__main__':
     pat_str = b'%s\t%s' % ('netbox_newplugin'.encode(), new_name.encode())
     patterns = parse_patterns(pat_str)
     root_paths = ['.'.encode()]
+    # Parallel workers; set REPREN_JOBS=1 for the original serial behaviour.
+    jobs = int(os.environ.get("REPREN_JOBS", os.cpu_count() or 1))
     rewrite_files(
         root_paths, patterns,
         do_renames=True,
         do_contents=True,
         exclude_pat=b"repren.py",
-        by_line=True,
+        by_line=False,
         dry_run=False,
-        clean=True
+        clean=True,
+        jobs=jobs
     )
     pat_str = b'%s\t%s' % ('Newplugin'.encode(), new_name.replace('_', '').capitalize().encode())
     patterns = parse_patterns(pat_str)
@@ -370,9 +585,14 @@ if __name__ == '__main__':
         do_renames=True,
         do_contents=True,
         exclude_pat=b"repren.py",
-        by_line=True,
+        by_line=False,
         dry_run=False,
-        clean=True)
+        clean=True,
+        jobs=jobs)
+    log(None, "Read %s files (%s chars), found %s matches (%s skipped due to overlaps)" %
+        (_tally.files, _tally.chars, _tally.valid_matches, _tally.matches - _tally.valid_matches))
+    log(None, "Changed %s files (%s rewritten and %s renamed)" %
+        (_tally.files_changed, _tally.files_rewritten, _tally.renames))
     try:
         shutil.rmtree('./netbox_newplugin/')
     except Exception:
@@ -0,0 +1,65 @@
+# Compare repren.multi_replace's single-pass engine with the per-pattern finditer engine.
+# Usage: python repren_benchmark.py [patterns] [input_kib]
+
+import random
+import sys
+import time
+
+import repren
+
+
+def make_words(count, rng, avoid=()):
+    # No word may contain another, so both engines see the same, non-overlapping matches.
+    words = []
+    while len(words) < count:
+        word = "_".join(
+            "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 8)))
+            for _ in range(rng.randint(1, 3))
+        )
+        if not any(word in other or other in word for other in words + list(avoid)):
+            words.append(word)
+    return sorted(words)
+
+
+def make_input(words, size, rng):
+    filler = make_words(200, rng, avoid=words)
+    out, length = [], 0
+    while length < size:
+        # Roughly one in twenty tokens is a pattern hit, as in a real rename.
+        word = rng.choice(words) if rng.random() < 0.05 else rng.choice(filler)
+        out.append(word)
+        length += len(word) + 1
+    return " ".join(out).encode()
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    size = (int(sys.argv[2]) if len(sys.argv) > 2 else 1024) * 1024
+    rng = random.Random(42)
+    words = make_words(count, rng)
+    pattern_str = b"\n".join(b"%s\t%s_new" % (w.encode(), w.encode()) for w in words)
+    input_str = make_input(words, size, rng)
+
+    for (label, options) in [("literal", dict(literal=True)), ("literal + preserve case", dict(literal=True, preserve_case=True))]:
+        patterns = repren.parse_patterns(pattern_str, **options)
+        compile_time, _ = timed(lambda: repren._CompiledPatterns(patterns), repeat=1)
+        single, (single_out, single_counts) = timed(lambda: repren.multi_replace(input_str, patterns))
+        classic, (classic_out, _) = timed(lambda: repren.multi_replace(input_str, patterns, single_pass=False))
+        print("%s: %d patterns, %d KiB input, %d matches" % (label, len(patterns), size // 1024, single_counts.valid))
+        print("  per-pattern finditer: %8.3f s" % classic)
+        print("  single pass:          %8.3f s  (compile %.3f s, %.1fx faster)" % (single, compile_time, classic / single))
+        print("  identical output:     %s" % (single_out == classic_out))
+
+
+if __name__ == "__main__":
+    main()
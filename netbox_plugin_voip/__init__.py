@@ -10,7 +10,79 @@ class VoicePluginConfig(PluginConfig):
     author = 'Dan King'
     author_email = 'test@test.com'
     required_settings = []
-    default_settings = {}
+    middleware = ["netbox_plugin_voip.middleware.ReplicaPinningMiddleware"]
+    # Loaded by NetBox 3.0 and later.
+    graphql_schema = "graphql.schema"
+    default_settings = {
+        # Paginated DID lists whose planner estimate exceeds this many rows report the
+        # estimate instead of running an exact COUNT(*).
+        "estimated_count_threshold": 100000,
+        # Upper bound, in bytes, for a single DID set loaded by the set-algebra API (8 bytes per number).
+        "didset_memory_limit": 512 * 1024 * 1024,
+        # CSV header names the CDR ingester reads the called number, call start and duration (seconds) from.
+        "cdr_columns": {
+            "called": "called_number",
+            "start": "start_time",
+            "duration": "duration",
+        },
+        # Shared secret for the resolve endpoints (X-Resolve-Token header). When unset they are
+        # only open if LOGIN_REQUIRED is off, since they skip NetBox's session/token lookup.
+        "resolve_token": None,
+        # Numbers kept in each worker's in-process resolve index.
+        "resolve_index_size": 100000,
+        # Seconds between checks of the DID version counter that flushes the resolve index.
+        "resolve_refresh_interval": 5,
+        # ISO 3166 region (e.g. "US") used to parse DIDs without a leading "+" into display formats.
+        "default_region": None,
+        # Rows per backfill batch, and seconds to sleep between batches.
+        "backfill_batch_size": 1000,
+        "backfill_sleep": 0.05,
+        # Backfills wait while any streaming replica's replay lag exceeds this many seconds
+        # (None disables the check).
+        "backfill_max_replica_lag": 30,
+        # Plugin ObjectChange retention (voip_changelog_retention): each object's changes older than
+        # the first horizon are collapsed into one, changes older than the second are deleted.
+        # None disables either pass.
+        "changelog_compact_after_days": 30,
+        "changelog_retention_days": 365,
+        # Objects compacted, or changes purged, per transaction.
+        "changelog_batch_size": 1000,
+        # URLs receiving coalesced DID change events from voip_event_dispatcher (see events.py).
+        # Nothing is buffered while this is empty.
+        "event_endpoints": [],
+        # Seconds of edits coalesced into one flush, events per POST, and concurrent POSTs.
+        "event_window": 5,
+        "event_batch_size": 500,
+        "event_concurrency": 4,
+        # Retries per batch (exponential backoff) and per-request timeout in seconds.
+        "event_max_retries": 5,
+        "event_timeout": 10,
+        # When set, each POST carries an X-Voip-Signature header: HMAC-SHA256 of the body.
+        "event_secret": None,
+        # DATABASES alias of a streaming replica that serves DIDNumbers reads (see routers.py).
+        # None disables replica routing.
+        "replica_database": None,
+        # Reads fall back to the primary while the replica's replay lag exceeds this many seconds.
+        # Lag is measured at most once per interval (seconds) in each process.
+        "replica_max_lag": 5,
+        "replica_lag_check_interval": 1,
+        # GraphQL (NetBox 3.0+): most rows one list field returns, and deepest nesting of a query.
+        "graphql_max_results": 1000,
+        "graphql_max_depth": 5,
+        # Most lines a nested list under one DID or phone returns.
+        "graphql_max_nested": 100,
+    }
+
+    def ready(self):
+        super().ready()
+        from .utils import get_plugin_setting
+        from . import signals  # noqa: F401
+        # Modules registering backfills (see backfill.py).
+        from . import partitioning  # noqa: F401
+        if get_plugin_setting("replica_database"):
+            from django.db import router
+            from .routers import ReplicaRouter
+            router.routers.insert(0, ReplicaRouter())
 
 
 config = VoicePluginConfig # noqa
@@ -7,8 +7,86 @@ class MyModel1Admin(admin.ModelAdmin):
     fields = '__all__'
 """
 from django.contrib import admin
-from .models import DIDNumbers
+from .models import (
+    BackfillState, ChangeSet, DIDAuditFinding, DIDAuditRun, DIDHistory, DIDNumbers, Line, Phone, SiteAssignment,
+    StagedChange,
+)
+from .paginator import EstimatedCountAdminPaginator
 
 @admin.register(DIDNumbers)
 class DIDVoipAdmin(admin.ModelAdmin):
-    list_display = ("did", "description","provider","route_option","partition","called_party_mask")
\ No newline at end of file
+    list_display = ("did", "description","provider","route_option","partition","called_party_mask")
+    list_select_related = ("provider",)
+    paginator = EstimatedCountAdminPaginator
+    # The "N total" link would run the exact COUNT(*) the paginator avoids.
+    show_full_result_count = False
+
+
+@admin.register(DIDAuditRun)
+class DIDAuditRunAdmin(admin.ModelAdmin):
+    list_display = ("pk", "created", "finished", "status", "rows_checked", "completed_through", "max_pk")
+    readonly_fields = ("created", "finished", "status", "chunk_size", "max_pk", "completed_through",
+                       "duplicates_checked", "rows_checked")
+
+
+@admin.register(DIDAuditFinding)
+class DIDAuditFindingAdmin(admin.ModelAdmin):
+    list_display = ("did", "partition", "rule", "detail", "run")
+    list_filter = ("rule", "run")
+    search_fields = ("did",)
+    paginator = EstimatedCountAdminPaginator
+    show_full_result_count = False
+
+
+@admin.register(BackfillState)
+class BackfillStateAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "rows_processed", "rows_changed", "last_pk", "updated")
+    readonly_fields = ("name", "status", "last_pk", "rows_processed", "rows_changed", "started", "updated",
+                       "finished", "last_error")
+
+
+@admin.register(SiteAssignment)
+class SiteAssignmentAdmin(admin.ModelAdmin):
+    list_display = ("prefix", "site", "location", "description")
+    list_select_related = ("site", "location")
+    search_fields = ("prefix",)
+    raw_id_fields = ("site", "location")
+
+
+@admin.register(Phone)
+class PhoneAdmin(admin.ModelAdmin):
+    list_display = ("device", "description")
+    list_select_related = ("device",)
+    raw_id_fields = ("device",)
+
+
+@admin.register(Line)
+class LineAdmin(admin.ModelAdmin):
+    list_display = ("phone", "position", "did", "interface", "label")
+    list_select_related = ("phone__device", "did", "interface")
+    raw_id_fields = ("phone", "did", "interface")
+
+
+@admin.register(ChangeSet)
+class ChangeSetAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "created", "validated", "applied", "rolled_back")
+    readonly_fields = ("status", "created", "validated", "applied", "rolled_back", "last_error")
+
+
+@admin.register(StagedChange)
+class StagedChangeAdmin(admin.ModelAdmin):
+    list_display = ("changeset", "action", "did", "partition", "did_pk", "error")
+    list_filter = ("action", "changeset")
+    search_fields = ("did",)
+    readonly_fields = ("did_pk", "values", "before", "error")
+    paginator = EstimatedCountAdminPaginator
+    show_full_result_count = False
+
+
+@admin.register(DIDHistory)
+class DIDHistoryAdmin(admin.ModelAdmin):
+    list_display = ("did", "partition", "provider_name", "valid", "did_pk")
+    search_fields = ("did",)
+    readonly_fields = ("did_pk", "did", "partition", "provider_id", "provider_name", "valid")
+    paginator = EstimatedCountAdminPaginator
+    show_full_result_count = False
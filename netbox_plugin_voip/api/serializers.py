@@ -10,3 +10,101 @@ class MyModel1Serializer(ModelSerializer):
         model = MyModel1
         fields = '__all__'
 """
+import base64
+
+from rest_framework import serializers
+
+from circuits.api.nested_serializers import NestedProviderSerializer
+from dcim.api.nested_serializers import (
+    NestedDeviceSerializer, NestedInterfaceSerializer, NestedLocationSerializer, NestedSiteSerializer,
+)
+from netbox.api import ValidatedModelSerializer, WritableNestedSerializer
+
+from netbox_plugin_voip.lines import MAX_POSITION
+from netbox_plugin_voip.models import DIDHistory, DIDNumbers, Line, NumberBlock, Phone, SiteAssignment
+
+
+class NestedDIDNumbersSerializer(WritableNestedSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name="plugins-api:netbox_plugin_voip-api:didnumbers-detail")
+
+    class Meta:
+        model = DIDNumbers
+        fields = ["id", "url", "did", "partition"]
+
+
+class DIDNumbersSerializer(ValidatedModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name="plugins-api:netbox_plugin_voip-api:didnumbers-detail")
+    provider = NestedProviderSerializer(required=False, allow_null=True)
+    # Overrides only; the inherited site is served by the site-lookup endpoint and the effective_site_id filter.
+    site = NestedSiteSerializer(required=False, allow_null=True)
+    location = NestedLocationSerializer(required=False, allow_null=True)
+
+    class Meta:
+        model = DIDNumbers
+        fields = [
+            "id", "url", "did", "did_e164", "did_national", "did_international", "country_code", "region_code",
+            "description", "provider", "partition", "route_option", "called_party_mask", "site", "location",
+            "created", "last_updated",
+        ]
+
+
+class DIDHistorySerializer(serializers.ModelSerializer):
+    # The period is [valid_from, valid_until); valid_until is null while it is current.
+    valid_from = serializers.DateTimeField(source="valid.lower", read_only=True)
+    valid_until = serializers.DateTimeField(source="valid.upper", read_only=True)
+
+    class Meta:
+        model = DIDHistory
+        fields = ["id", "did_pk", "did", "partition", "provider", "provider_name", "valid_from", "valid_until"]
+
+
+class SiteAssignmentSerializer(ValidatedModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name="plugins-api:netbox_plugin_voip-api:siteassignment-detail")
+    site = NestedSiteSerializer()
+    location = NestedLocationSerializer(required=False, allow_null=True)
+
+    class Meta:
+        model = SiteAssignment
+        fields = ["id", "url", "prefix", "site", "location", "description", "created", "last_updated"]
+
+
+class PhoneSerializer(ValidatedModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name="plugins-api:netbox_plugin_voip-api:phone-detail")
+    device = NestedDeviceSerializer()
+
+    class Meta:
+        model = Phone
+        fields = ["id", "url", "device", "description", "created", "last_updated"]
+
+
+class LineSerializer(ValidatedModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name="plugins-api:netbox_plugin_voip-api:line-detail")
+    did = NestedDIDNumbersSerializer(required=False, allow_null=True)
+    interface = NestedInterfaceSerializer(required=False, allow_null=True)
+
+    class Meta:
+        model = Line
+        fields = ["id", "url", "phone", "position", "did", "interface", "label", "created", "last_updated"]
+
+
+class LineAssignmentSerializer(serializers.Serializer):
+    """One row of a bulk line assignment; references are natural keys resolved by assign_lines."""
+    device = serializers.CharField(required=False)
+    serial = serializers.CharField(required=False)
+    position = serializers.IntegerField(min_value=0, max_value=MAX_POSITION, default=1)
+    did = serializers.CharField(required=False, allow_blank=True)
+    partition = serializers.CharField(required=False, allow_blank=True)
+    interface = serializers.CharField(required=False, allow_blank=True)
+    label = serializers.CharField(required=False, allow_blank=True, max_length=100)
+
+
+class NumberBlockSerializer(serializers.ModelSerializer):
+    # Base64 of the 1,250-byte bitmap; bit N (LSB first within each byte) is number prefix + "%04d" % N.
+    bitmap = serializers.SerializerMethodField()
+
+    class Meta:
+        model = NumberBlock
+        fields = ["id", "prefix", "assigned_count", "bitmap"]
+
+    def get_bitmap(self, obj):
+        return base64.b64encode(bytes(obj.bitmap)).decode()
@@ -8,3 +8,22 @@ router.register('', MyModel1ViewSet)
 urlpatterns = router.urls
 
 """
+from django.urls import path
+from rest_framework import routers
+from .views import (
+    DIDHistoryViewSet, DIDNumbersViewSet, DIDSetView, EventMetricsView, LineViewSet, NumberBlockViewSet,
+    PhoneViewSet, SiteAssignmentViewSet,
+)
+
+
+router = routers.DefaultRouter()
+router.register("dids", DIDNumbersViewSet)
+router.register("number-blocks", NumberBlockViewSet)
+router.register("did-history", DIDHistoryViewSet)
+router.register("site-assignments", SiteAssignmentViewSet)
+router.register("phones", PhoneViewSet)
+router.register("lines", LineViewSet)
+urlpatterns = router.urls + [
+    path("did-sets/", DIDSetView.as_view(), name="did-sets"),
+    path("events/metrics/", EventMetricsView.as_view(), name="event-metrics"),
+]
@@ -8,3 +8,215 @@ class MyModel1ViewSet(ModelViewSet):
     queryset = MyModel1.objects.all()
     serializer_class = MyModel1Serializer
 """
+from django.utils.decorators import method_decorator
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from netbox.api.authentication import IsAuthenticatedOrLoginNotRequired
+from netbox.api.views import ModelViewSet
+
+from netbox_plugin_voip import events, fastpath
+from netbox_plugin_voip.blocks import heatmap, largest_free_run, region_blocks
+from netbox_plugin_voip.cdr import idle_report
+from netbox_plugin_voip.didsets import DIDSetError, evaluate
+from netbox_plugin_voip.filters import DIDHistoryFilterSet, DIDNumbersFilterSet
+from netbox_plugin_voip.lines import LineAssignmentError, assign_lines
+from netbox_plugin_voip.models import DIDHistory, DIDNumbers, Line, NumberBlock, Phone, SiteAssignment
+from netbox_plugin_voip.sites import site_for_number
+from netbox_plugin_voip.paginator import EstimatedCountLimitOffsetPagination
+from netbox_plugin_voip.versioning import did_condition
+from .serializers import (
+    DIDHistorySerializer, DIDNumbersSerializer, LineAssignmentSerializer, LineSerializer, NumberBlockSerializer,
+    PhoneSerializer, SiteAssignmentSerializer,
+)
+
+
+class DIDNumbersViewSet(ModelViewSet):
+    queryset = DIDNumbers.objects.select_related("provider", "site", "location")
+    serializer_class = DIDNumbersSerializer
+    filterset_class = DIDNumbersFilterSet
+    pagination_class = EstimatedCountLimitOffsetPagination
+
+    # Unchanged polls get a 304 from the version counters before any row is queried.
+    @method_decorator(did_condition)
+    def list(self, request, *args, **kwargs):
+        # ?brief and ?fields= skip the serializers for JSON clients; see fastpath.py.
+        if request.accepted_renderer.format == "json":
+            try:
+                fields = fastpath.requested_fields(request)
+            except fastpath.FieldsError as e:
+                return Response({"detail": str(e)}, status=400)
+            if fields is not None:
+                return self.fast_list(request, fields)
+        return super().list(request, *args, **kwargs)
+
+    def fast_list(self, request, fields):
+        queryset, render = fastpath.rows(self.filter_queryset(self.get_queryset()), fields, request)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return fastpath.json_response(render(queryset))
+        return fastpath.json_response(self.get_paginated_response(render(page)).data)
+
+    @method_decorator(did_condition)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, url_path="idle-report")
+    def idle_report(self, request):
+        """Count DIDs without calls in the last ``days`` days (default 30), per provider and partition."""
+        try:
+            days = int(request.query_params.get("days", 30))
+        except ValueError:
+            return Response({"detail": "days must be an integer"}, status=400)
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response({
+            "days": days,
+            "results": [
+                {"provider": row["provider__name"], "partition": row["partition"], "idle": row["idle"]}
+                for row in idle_report(queryset, days)
+            ],
+        })
+
+
+class DIDSetView(APIView):
+    """Union, intersection or difference of DID sets, returned as compressed ranges.
+
+    POST {"operation": "difference", "sets": [{"provider": ["a"]}, {"partition": ["x", "y"]}]}
+    """
+    permission_classes = [IsAuthenticatedOrLoginNotRequired]
+
+    def post(self, request):
+        queryset = DIDNumbers.objects.restrict(request.user, "view")
+        try:
+            result = evaluate(
+                request.data.get("operation"),
+                request.data.get("sets"),
+                queryset,
+                DIDNumbersFilterSet,
+            )
+        except DIDSetError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        return Response({
+            "count": len(result),
+            "skipped": result.skipped,
+            "ranges": [{"start": start, "end": end} for start, end in result.ranges()],
+        })
+
+
+class DIDHistoryViewSet(ReadOnlyModelViewSet):
+    """Number, partition and provider periods of DIDs; ?number= gives a timeline, ?at= an as-of view."""
+    queryset = DIDHistory.objects.all()
+    serializer_class = DIDHistorySerializer
+    filterset_class = DIDHistoryFilterSet
+    pagination_class = EstimatedCountLimitOffsetPagination
+
+    def get_queryset(self):
+        return super().get_queryset().restrict(self.request.user, "view")
+
+
+class SiteAssignmentViewSet(ModelViewSet):
+    queryset = SiteAssignment.objects.select_related("site", "location")
+    serializer_class = SiteAssignmentSerializer
+    filterset_fields = ["prefix", "site_id", "location_id"]
+
+    @action(detail=False, url_path="lookup")
+    def lookup(self, request):
+        """The assignment giving ``number`` its site: the one with the longest matching prefix."""
+        assignment = site_for_number(request.query_params.get("number", ""))
+        if assignment is None or not self.get_queryset().filter(pk=assignment.pk).exists():
+            return Response({"detail": "No site is assigned to this number"}, status=404)
+        return Response(self.get_serializer(assignment).data)
+
+
+class PhoneViewSet(ModelViewSet):
+    queryset = Phone.objects.select_related("device")
+    serializer_class = PhoneSerializer
+    filterset_fields = ["device_id"]
+
+
+class LineViewSet(ModelViewSet):
+    queryset = Line.objects.select_related("phone__device", "did", "interface__device")
+    serializer_class = LineSerializer
+    filterset_fields = ["phone_id", "did_id", "interface_id"]
+
+    @action(detail=False, methods=["post"], url_path="bulk-assign")
+    def bulk_assign(self, request):
+        """Create or update many lines at once.
+
+        POST a list of {"device" or "serial", "position", "did", "partition", "interface", "label"};
+        add "?create_phones=false" to reject devices that are not phones yet. The batch is applied
+        only if every row resolves.
+        """
+        create_phones = request.query_params.get("create_phones", "true").lower() != "false"
+        permissions = ["netbox_plugin_voip.add_line", "netbox_plugin_voip.change_line"]
+        if create_phones:
+            permissions.append("netbox_plugin_voip.add_phone")
+        if not request.user.has_perms(permissions):
+            raise PermissionDenied()
+        rows = LineAssignmentSerializer(data=request.data, many=True)
+        rows.is_valid(raise_exception=True)
+        try:
+            counts = assign_lines(
+                rows.validated_data,
+                create_phones=create_phones,
+                user=request.user,
+                request_id=getattr(request, "id", None),
+            )
+        except LineAssignmentError as e:
+            return Response({"errors": [{"row": index, "detail": message} for index, message in e.errors]},
+                            status=400)
+        return Response(counts)
+
+
+class EventMetricsView(APIView):
+    """Delivery counters of the DID change-event pipeline and the number of DIDs still buffered; staff only."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(events.metrics())
+
+
+class NumberBlockViewSet(ReadOnlyModelViewSet):
+    queryset = NumberBlock.objects.all()
+    serializer_class = NumberBlockSerializer
+    filterset_fields = ["prefix"]
+
+    def get_queryset(self):
+        return super().get_queryset().restrict(self.request.user, "view")
+
+    def _region(self, request):
+        region = request.query_params.get("region", "")
+        if not region.isdigit():
+            return None
+        return region
+
+    @action(detail=False, url_path="heatmap")
+    def heatmap(self, request):
+        """Per-100-number assignment counts for every 10k block of the 1M-number ``region``."""
+        region = self._region(request)
+        if region is None:
+            return Response({"detail": "region must be a digit prefix"}, status=400)
+        return Response({
+            "region": region,
+            "blocks": [
+                {"prefix": prefix, "assigned_count": assigned, "cells": cells}
+                for prefix, assigned, cells in heatmap(region_blocks(self.get_queryset(), region))
+            ],
+        })
+
+    @action(detail=False, url_path="free-run")
+    def free_run(self, request):
+        """Largest contiguous run of unassigned numbers in the 1M-number ``region``."""
+        region = self._region(request)
+        if region is None:
+            return Response({"detail": "region must be a digit prefix"}, status=400)
+        run = largest_free_run(region_blocks(self.get_queryset(), region))
+        if run is None:
+            return Response({"region": region, "first": None, "last": None, "length": 0})
+        first, last, length = run
+        return Response({"region": region, "first": first, "last": last, "length": length})
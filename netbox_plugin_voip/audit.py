@@ -0,0 +1,138 @@
+"""Parallel, resumable integrity audit of DIDNumbers.
+
+The table is split into primary-key chunks that a process pool validates in
+parallel against precompiled rules. Results come back in chunk order, so after
+each chunk its findings are inserted and the run's ``completed_through``
+watermark advances in short autocommit statements; nothing holds a
+transaction open for the length of the audit, and an interrupted run resumes
+from the watermark. Duplicates after normalization span chunks, so they are
+found by one window-function query run alongside the chunks.
+"""
+import multiprocessing
+
+import django_rq
+from django.db import connection, connections
+from django.db.models import Max
+from django.utils import timezone
+
+from .choices import AuditRuleChoices, AuditStatusChoices
+from .models import DIDAuditFinding, DIDAuditRun, DIDNumbers, number_validator
+
+DEFAULT_CHUNK_SIZE = 50000
+# ITU-T E.164: at most 15 digits including the country code; 7 covers the shortest national plans.
+E164_MIN_DIGITS = 7
+E164_MAX_DIGITS = 15
+
+_valid_characters = number_validator.regex
+
+
+def check_did(did, provider_id, provider_pk):
+    """Return ``(rule, detail)`` pairs for every chunk-local rule a DID fails."""
+    findings = []
+    if not _valid_characters.match(did):
+        findings.append((AuditRuleChoices.RULE_INVALID_CHARACTERS, "Contains characters outside the DTMF set"))
+    if did.startswith("+"):
+        digits = did[1:]
+        if not digits.isdigit():
+            findings.append((AuditRuleChoices.RULE_E164_LENGTH, "E.164 numbers may only contain digits"))
+        elif not E164_MIN_DIGITS <= len(digits) <= E164_MAX_DIGITS:
+            findings.append((AuditRuleChoices.RULE_E164_LENGTH, f"{len(digits)} digits"))
+    if provider_id is not None and provider_pk is None:
+        findings.append((AuditRuleChoices.RULE_ORPHANED_PROVIDER, f"Provider #{provider_id} does not exist"))
+    return findings
+
+
+def _audit_chunk(bounds):
+    """Worker: validate the DIDs with ``start < pk <= end``."""
+    start, end = bounds
+    rows = DIDNumbers.objects.filter(pk__gt=start, pk__lte=end).order_by().values_list(
+        "pk", "did", "partition", "provider_id", "provider__id"
+    )
+    count = 0
+    findings = []
+    for pk, did, partition, provider_id, provider_pk in rows.iterator(chunk_size=10000):
+        count += 1
+        for rule, detail in check_did(did, provider_id, provider_pk):
+            findings.append((pk, did, partition, rule, detail))
+    return start, end, count, findings
+
+
+def _find_duplicates(_=None):
+    """Worker: rows whose digits and partition collide with another row once "+" is ignored."""
+    table = DIDNumbers._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id, did, partition FROM ("
+            f"  SELECT id, did, partition,"
+            f"         count(*) OVER (PARTITION BY ltrim(did, '+'), partition) AS copies"
+            f"  FROM {table}"
+            f") AS normalized WHERE copies > 1"
+        )
+        return [
+            (pk, did, partition, AuditRuleChoices.RULE_NORMALIZED_DUPLICATE,
+             f"Same number as another DID in {partition or 'no partition'}")
+            for pk, did, partition in cursor.fetchall()
+        ]
+
+
+def _save_findings(run, findings):
+    DIDAuditFinding.objects.bulk_create(
+        [
+            DIDAuditFinding(run=run, did_pk=pk, did=did, partition=partition, rule=rule, detail=detail[:200])
+            for pk, did, partition, rule, detail in findings
+        ],
+        batch_size=1000,
+    )
+
+
+def start_run(chunk_size=DEFAULT_CHUNK_SIZE):
+    max_pk = DIDNumbers.objects.aggregate(max_pk=Max("pk"))["max_pk"] or 0
+    return DIDAuditRun.objects.create(chunk_size=chunk_size, max_pk=max_pk)
+
+
+def run_audit(run_pk, workers=None, progress=None):
+    """Run or resume an audit. ``progress`` is called with the run after every chunk."""
+    run = DIDAuditRun.objects.get(pk=run_pk)
+    # Drop partial results of chunks past the watermark; they are about to be redone.
+    run.findings.filter(did_pk__gt=run.completed_through).exclude(
+        rule=AuditRuleChoices.RULE_NORMALIZED_DUPLICATE
+    ).delete()
+    run.status = AuditStatusChoices.STATUS_RUNNING
+    run.save()
+
+    chunks = [
+        (start, min(start + run.chunk_size, run.max_pk))
+        for start in range(run.completed_through, run.max_pk, run.chunk_size)
+    ]
+    # Forked workers must open their own database connections.
+    connections.close_all()
+    context = multiprocessing.get_context("fork")
+    try:
+        with context.Pool(workers or multiprocessing.cpu_count()) as pool:
+            duplicates = None if run.duplicates_checked else pool.apply_async(_find_duplicates)
+            for start, end, count, findings in pool.imap(_audit_chunk, chunks):
+                _save_findings(run, findings)
+                run.completed_through = end
+                run.rows_checked += count
+                DIDAuditRun.objects.filter(pk=run.pk).update(
+                    completed_through=run.completed_through, rows_checked=run.rows_checked
+                )
+                if progress:
+                    progress(run)
+            if duplicates is not None:
+                _save_findings(run, duplicates.get())
+                run.duplicates_checked = True
+    except Exception:
+        run.status = AuditStatusChoices.STATUS_FAILED
+        run.save()
+        raise
+
+    run.status = AuditStatusChoices.STATUS_COMPLETED
+    run.finished = timezone.now()
+    run.save()
+    return run
+
+
+def enqueue_audit(run, workers=None):
+    """Run the audit as a background job on NetBox's RQ queue."""
+    return django_rq.get_queue("default").enqueue(run_audit, run.pk, workers, job_timeout=24 * 3600)
@@ -0,0 +1,282 @@
+"""Online, batched data migrations for plugin models.
+
+A schema change that needs existing rows rewritten (a new normalized column, a
+value moved into a foreign key) ships its schema migration without the data
+step. The data step is a ``Backfill`` subclass registered here, and it runs
+through ``voip_backfill`` while the table stays in use:
+
+* rows are read in primary-key order, ``batch_size`` at a time, with keyset
+  pagination (``pk > last_pk``), so each batch is an index range scan no matter
+  how far the backfill has progressed;
+* each batch is locked, migrated and checkpointed in one short transaction, so
+  an interrupted backfill resumes after the last committed batch;
+* between batches the runner sleeps, waits while replicas lag, and stops when
+  the backfill has been paused from another process;
+* a run claims the backfill before starting and advances the checkpoint only from
+  the value it last wrote, so two runs never process the same rows.
+
+Backfills write derived data with ``bulk_update``, bypassing model signals and
+the changelog. Backfills of DIDs send ``dids_bulk_updated`` for each batch, so
+version counters, change events and history still follow the new values.
+"""
+import time
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .choices import BackfillStatusChoices
+from .formatting import FORMAT_FIELDS, format_did
+from .history import sync as sync_history
+from .models import BackfillState, DIDNumbers
+from .paginator import estimate_queryset_rows
+from .signals import dids_bulk_updated
+from .utils import get_plugin_setting
+
+registry = {}
+
+
+class BackfillError(Exception):
+    pass
+
+
+class BackfillClaimLost(BackfillError):
+    """Another run claimed the backfill (``--force``) while this one was working."""
+
+
+class Backfill:
+    """Base class for a registered backfill.
+
+    Subclasses set ``name`` and ``model`` and either implement ``update_row``
+    (returning True when it changed the row; the changed ``fields`` are then
+    saved with one ``bulk_update`` per batch) or override ``process`` entirely.
+    """
+    name = None
+    model = None
+    description = ""
+    fields = ()
+
+    def get_queryset(self):
+        """Rows the backfill visits; narrow it with ``only()`` to the fields it reads."""
+        return self.model._default_manager.all()
+
+    def update_row(self, row):
+        raise NotImplementedError
+
+    def process(self, rows):
+        """Migrate one locked batch and return how many rows changed."""
+        changed = [row for row in rows if self.update_row(row)]
+        if changed:
+            self.model._default_manager.bulk_update(changed, self.fields)
+            if self.model is DIDNumbers:
+                dids_bulk_updated.send(
+                    sender=DIDNumbers, pks=[row.pk for row in changed],
+                    partitions={row.partition for row in changed}, changes=None,
+                )
+        return len(changed)
+
+
+def register(cls):
+    """Class decorator adding a Backfill subclass to the registry."""
+    if cls.name in registry:
+        raise BackfillError(f"Backfill {cls.name!r} is already registered")
+    registry[cls.name] = cls
+    return cls
+
+
+def get_backfill(name):
+    try:
+        return registry[name]()
+    except KeyError:
+        raise BackfillError(f"Unknown backfill {name!r}; choose from: {', '.join(sorted(registry)) or 'none'}")
+
+
+def replica_lag(using="default"):
+    """Return the largest replay lag of any streaming replica in seconds, or 0 without replicas.
+
+    Roles without pg_monitor see NULL lag and therefore never wait.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(max(EXTRACT(EPOCH FROM replay_lag)), 0) FROM pg_stat_replication")
+        return float(cursor.fetchone()[0])
+
+
+def pause_backfill(name):
+    """Ask a running backfill to stop after its current batch; returns False if it was not running."""
+    return bool(
+        BackfillState.objects.filter(name=name, status=BackfillStatusChoices.STATUS_RUNNING).update(
+            status=BackfillStatusChoices.STATUS_PAUSED
+        )
+    )
+
+
+def reset_backfill(name):
+    """Forget a backfill's checkpoint so the next run starts from the first row."""
+    BackfillState.objects.filter(name=name).update(
+        status=BackfillStatusChoices.STATUS_PENDING, last_pk=0, rows_processed=0, rows_changed=0,
+        started=None, updated=None, finished=None, last_error="",
+    )
+
+
+class Progress:
+    """Throughput and lag figures handed to the progress callback after every batch."""
+
+    def __init__(self, state, remaining):
+        self.state = state
+        self.remaining = remaining
+        self.rows = 0
+        self.lag = 0.0
+        self.started = time.monotonic()
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+    @property
+    def eta_seconds(self):
+        """Estimated seconds left, from the planner's estimate of unvisited rows."""
+        rate = self.rows_per_second
+        if not rate or self.remaining is None:
+            return None
+        return max(self.remaining - self.rows, 0) / rate
+
+
+def _wait_for_replicas(max_lag, progress):
+    if max_lag is None:
+        return
+    progress.lag = replica_lag()
+    while progress.lag > max_lag:
+        time.sleep(min(progress.lag - max_lag, 5))
+        progress.lag = replica_lag()
+
+
+def _claim(name, force):
+    """Mark a backfill running and return its state, or None when it is already complete.
+
+    Refuses while another run holds it, unless ``force`` takes over a run that died without
+    leaving the running state.
+    """
+    BackfillState.objects.get_or_create(name=name)
+    with transaction.atomic():
+        state = BackfillState.objects.select_for_update().get(name=name)
+        if state.status == BackfillStatusChoices.STATUS_COMPLETED:
+            return None
+        if state.status == BackfillStatusChoices.STATUS_RUNNING and not force:
+            raise BackfillError(
+                f"Backfill {name!r} is already running (last batch at {state.updated}); pause it first, "
+                f"or force the run if that process is gone"
+            )
+        state.status = BackfillStatusChoices.STATUS_RUNNING
+        state.started = state.started or timezone.now()
+        state.last_error = ""
+        state.save()
+    return state
+
+
+def run_backfill(name, batch_size=None, sleep=None, max_lag=None, progress=None, force=False):
+    """Run or resume a backfill until it completes or is paused; returns its BackfillState."""
+    backfill = get_backfill(name)
+    batch_size = batch_size or get_plugin_setting("backfill_batch_size")
+    sleep = get_plugin_setting("backfill_sleep") if sleep is None else sleep
+    max_lag = get_plugin_setting("backfill_max_replica_lag") if max_lag is None else max_lag
+
+    state = _claim(name, force)
+    if state is None:
+        return BackfillState.objects.get(name=name)
+
+    # Joins would make FOR UPDATE lock related rows too; only the migrated table is locked.
+    queryset = backfill.get_queryset().order_by("pk").select_for_update(of=("self",))
+    report = Progress(state, estimate_queryset_rows(backfill.get_queryset().filter(pk__gt=state.last_pk)))
+    try:
+        while True:
+            if BackfillState.objects.filter(pk=state.pk, status=BackfillStatusChoices.STATUS_PAUSED).exists():
+                state.status = BackfillStatusChoices.STATUS_PAUSED
+                return state
+            _wait_for_replicas(max_lag, report)
+
+            with transaction.atomic():
+                rows = list(queryset.filter(pk__gt=state.last_pk)[:batch_size])
+                if not rows:
+                    break
+                changed = backfill.process(rows)
+                updated = timezone.now()
+                # Only from our own checkpoint: if another run took over, this batch is rolled back.
+                advanced = BackfillState.objects.filter(
+                    pk=state.pk, last_pk=state.last_pk, status=BackfillStatusChoices.STATUS_RUNNING,
+                ).update(
+                    last_pk=rows[-1].pk,
+                    rows_processed=F("rows_processed") + len(rows),
+                    rows_changed=F("rows_changed") + changed,
+                    updated=updated,
+                )
+                if not advanced:
+                    current = BackfillState.objects.get(pk=state.pk)
+                    if current.status == BackfillStatusChoices.STATUS_PAUSED and current.last_pk == state.last_pk:
+                        transaction.set_rollback(True)
+                        state.status = current.status
+                        return state
+                    raise BackfillClaimLost(f"Backfill {name!r} was taken over by another run")
+                state.last_pk = rows[-1].pk
+                state.rows_processed += len(rows)
+                state.rows_changed += changed
+                state.updated = updated
+
+            report.rows += len(rows)
+            if progress:
+                progress(report)
+            if sleep:
+                time.sleep(sleep)
+    except BaseException as exc:
+        # KeyboardInterrupt pauses; anything else marks the backfill failed. Either way it resumes
+        # after the last committed batch. A lost claim leaves the state to the run that took over.
+        if isinstance(exc, BackfillClaimLost):
+            raise
+        if isinstance(exc, KeyboardInterrupt):
+            state.status = BackfillStatusChoices.STATUS_PAUSED
+        else:
+            state.status = BackfillStatusChoices.STATUS_FAILED
+            state.last_error = f"{type(exc).__name__}: {exc}"
+        BackfillState.objects.filter(pk=state.pk).update(status=state.status, last_error=state.last_error)
+        raise
+
+    state.status = BackfillStatusChoices.STATUS_COMPLETED
+    state.finished = timezone.now()
+    BackfillState.objects.filter(pk=state.pk).update(status=state.status, finished=state.finished)
+    return state
+
+
+@register
+class DIDFormatsBackfill(Backfill):
+    """Recompute the stored display formats, e.g. after installing phonenumbers or changing default_region."""
+    name = "did-formats"
+    model = DIDNumbers
+    description = "Fill the E.164, national and international display formats of every DID"
+    fields = FORMAT_FIELDS
+
+    def get_queryset(self):
+        return DIDNumbers.objects.only("pk", "did", "partition", *FORMAT_FIELDS)
+
+    def update_row(self, row):
+        formats = format_did(row.did)
+        if all(getattr(row, name) == value for name, value in formats.items()):
+            return False
+        row.__dict__.update(formats)
+        return True
+
+
+@register
+class DIDHistoryBackfill(Backfill):
+    """Open a history period for every DID that has none, e.g. DIDs created before history was tracked."""
+    name = "did-history"
+    model = DIDNumbers
+    description = "Start the ownership history of existing DIDs at their creation date"
+
+    def get_queryset(self):
+        return DIDNumbers.objects.only("pk")
+
+    def process(self, rows):
+        return sync_history([row.pk for row in rows], since_created=True)
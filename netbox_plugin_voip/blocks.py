@@ -0,0 +1,165 @@
+"""Number-block utilization bitmaps.
+
+Each NumberBlock holds one bit per number in a 10k block, so utilization,
+fragmentation and free-run questions never touch DIDNumbers rows. Bit N lives in
+byte N // 8 at position N % 8 (least significant first), which matches
+PostgreSQL's get_bit()/set_bit() on bytea.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from .didsets import did_digits
+from .models import DIDNumbers, NumberBlock
+
+BLOCK_DIGITS = 4
+BLOCK_SIZE = 10 ** BLOCK_DIGITS
+BITMAP_BYTES = BLOCK_SIZE // 8
+# Heatmap cells each summarize this many consecutive numbers.
+CELL_SIZE = 100
+# A heatmap region is 1M numbers: 100 blocks of 10k.
+REGION_DIGITS = BLOCK_DIGITS + 2
+BATCH_SIZE = 1000
+
+
+def split_did(did):
+    """Return ``(prefix, offset)`` of the block a DID falls in, or None for non-numeric or too-short DIDs."""
+    digits = did_digits(did)
+    if digits is None or len(digits) <= BLOCK_DIGITS:
+        return None
+    return digits[:-BLOCK_DIGITS], int(digits[-BLOCK_DIGITS:])
+
+
+def _group_by_block(dids):
+    by_block = defaultdict(set)
+    for did in dids:
+        location = split_did(did)
+        if location is not None:
+            by_block[location[0]].add(location[1])
+    return by_block
+
+
+def _still_assigned(dids):
+    """Return the digit strings among ``dids`` that some DIDNumbers row (in any partition) still uses."""
+    digits = {did_digits(did) for did in dids} - {None}
+    candidates = list(digits) + [f"+{d}" for d in digits]
+    remaining = set()
+    for i in range(0, len(candidates), BATCH_SIZE):
+        remaining.update(
+            did_digits(did) for did in
+            DIDNumbers.objects.filter(did__in=candidates[i:i + BATCH_SIZE]).values_list("did", flat=True)
+        )
+    return remaining
+
+
+def update_blocks(assigned=(), released=()):
+    """Set the bits for ``assigned`` DIDs and clear them for ``released`` DIDs that no row uses any more.
+
+    Touched blocks are locked in prefix order and rewritten with one bulk UPDATE.
+    """
+    released = set(released) - set(assigned)
+    if released:
+        remaining = _still_assigned(released)
+        released = {did for did in released if did_digits(did) not in remaining}
+    to_set = _group_by_block(assigned)
+    to_clear = _group_by_block(released)
+    prefixes = sorted(set(to_set) | set(to_clear))
+    if not prefixes:
+        return
+
+    with transaction.atomic():
+        NumberBlock.objects.bulk_create(
+            [NumberBlock(prefix=prefix, bitmap=bytes(BITMAP_BYTES)) for prefix in to_set],
+            ignore_conflicts=True,
+        )
+        blocks = list(NumberBlock.objects.filter(prefix__in=prefixes).order_by("prefix").select_for_update())
+        for block in blocks:
+            bitmap = bytearray(block.bitmap)
+            for offset in to_set.get(block.prefix, ()):
+                bitmap[offset >> 3] |= 1 << (offset & 7)
+            for offset in to_clear.get(block.prefix, ()):
+                bitmap[offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+            block.bitmap = bytes(bitmap)
+            block.assigned_count = popcount(bitmap)
+        NumberBlock.objects.bulk_update(blocks, ["bitmap", "assigned_count"], batch_size=BATCH_SIZE)
+
+
+def rebuild_blocks():
+    """Recompute every block from DIDNumbers in one pass. Returns the number of blocks written."""
+    bitmaps = defaultdict(lambda: bytearray(BITMAP_BYTES))
+    for did in DIDNumbers.objects.order_by().values_list("did", flat=True).iterator(chunk_size=10000):
+        location = split_did(did)
+        if location is not None:
+            prefix, offset = location
+            bitmaps[prefix][offset >> 3] |= 1 << (offset & 7)
+
+    with transaction.atomic():
+        NumberBlock.objects.all().delete()
+        NumberBlock.objects.bulk_create(
+            [
+                NumberBlock(prefix=prefix, bitmap=bytes(bitmap), assigned_count=popcount(bitmap))
+                for prefix, bitmap in bitmaps.items()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    return len(bitmaps)
+
+
+def popcount(bitmap):
+    """Return the number of set bits in a bitmap."""
+    return bin(int.from_bytes(bitmap, "little")).count("1")
+
+
+def bit_string(bitmap):
+    """Return a block as a string of "0"/"1" characters indexed by number offset."""
+    return format(int.from_bytes(bitmap, "little"), f"0{BLOCK_SIZE}b")[::-1]
+
+
+def cell_counts(bitmap, cell_size=CELL_SIZE):
+    """Return the number of assigned numbers in each run of ``cell_size`` numbers of a block."""
+    bits = bit_string(bitmap)
+    return [bits.count("1", start, start + cell_size) for start in range(0, BLOCK_SIZE, cell_size)]
+
+
+def region_blocks(queryset, region):
+    """Return every block prefix of a 1M-number region with its bitmap (None where nothing is assigned)."""
+    if not region.isdigit():
+        raise ValueError("A region must be given as a digit prefix")
+    prefixes = [f"{region}{i:02d}" for i in range(100)]
+    found = {
+        prefix: bytes(bitmap) for prefix, bitmap in
+        queryset.filter(prefix__in=prefixes).values_list("prefix", "bitmap")
+    }
+    return [(prefix, found.get(prefix)) for prefix in prefixes]
+
+
+def heatmap(blocks):
+    """Return rows of ``(prefix, assigned_count, [per-cell counts])`` for the ``region_blocks()`` of a region."""
+    rows = []
+    empty = [0] * (BLOCK_SIZE // CELL_SIZE)
+    for prefix, bitmap in blocks:
+        if bitmap is None:
+            rows.append((prefix, 0, empty))
+        else:
+            rows.append((prefix, popcount(bitmap), cell_counts(bitmap)))
+    return rows
+
+
+def largest_free_run(blocks):
+    """Return ``(first, last, length)`` of the longest run of unassigned numbers in the ``region_blocks()``
+    of a 1M-number region.
+
+    Runs may span block boundaries. Returns None if every number is assigned.
+    """
+    region = blocks[0][0][:-2]
+    bits = "".join("0" * BLOCK_SIZE if bitmap is None else bit_string(bitmap) for _, bitmap in blocks)
+    best_start, best_length, position = 0, 0, 0
+    for segment in bits.split("1"):
+        if len(segment) > best_length:
+            best_start, best_length = position, len(segment)
+        position += len(segment) + 1
+    if not best_length:
+        return None
+    first = region + str(best_start).zfill(REGION_DIGITS)
+    last = region + str(best_start + best_length - 1).zfill(REGION_DIGITS)
+    return first, last, best_length
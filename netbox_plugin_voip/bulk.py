@@ -0,0 +1,92 @@
+"""Set-based bulk write paths for DIDNumbers.
+
+NetBox's generic bulk views save or delete one object at a time. These helpers
+issue a single UPDATE or DELETE for the whole selection and record the matching
+ObjectChange rows with one bulk INSERT.
+"""
+from django.db import models, transaction
+
+from extras.choices import ObjectChangeActionChoices
+from extras.models import ObjectChange
+
+from .models import DIDNumbers
+from .signals import dids_bulk_deleted, dids_bulk_updated
+
+CHANGELOG_BATCH_SIZE = 1000
+
+
+def _record_changes(objects, action, user=None, request_id=None):
+    """Bulk-insert ObjectChange rows for objects already snapshotted or updated in memory."""
+    changes = []
+    for obj in objects:
+        objectchange = obj.to_objectchange(action)
+        objectchange.user = user
+        objectchange.user_name = user.username if user is not None else ""
+        objectchange.request_id = request_id
+        objectchange.object_repr = objectchange.object_repr or str(obj)[:200]
+        changes.append(objectchange)
+    ObjectChange.objects.bulk_create(changes, batch_size=CHANGELOG_BATCH_SIZE)
+
+
+def _clear_dependents(pk_list):
+    """Apply on_delete for rows pointing at the DIDs being deleted, one statement per relation."""
+    for relation in DIDNumbers._meta.related_objects:
+        field = relation.field
+        related = relation.related_model._base_manager.filter(**{f"{field.name}__in": pk_list})
+        if field.remote_field.on_delete == models.CASCADE:
+            related._raw_delete(related.db)
+        elif field.remote_field.on_delete == models.SET_NULL:
+            related.update(**{field.name: None})
+
+
+def bulk_update_dids(queryset, changes, user=None, request_id=None):
+    """Apply a dict of field changes to every DID in ``queryset`` with one UPDATE.
+
+    Returns the number of rows updated.
+    """
+    pk_list = list(queryset.values_list("pk", flat=True))
+    if not pk_list or not changes:
+        return 0
+
+    with transaction.atomic():
+        objects = list(DIDNumbers.objects.filter(pk__in=pk_list).select_for_update())
+        partitions = {obj.partition for obj in objects}
+        if "partition" in changes:
+            partitions.add(changes["partition"])
+        for obj in objects:
+            obj.snapshot()
+            for name, value in changes.items():
+                setattr(obj, name, value)
+        count = DIDNumbers.objects.filter(pk__in=pk_list).update(**changes)
+        _record_changes(objects, ObjectChangeActionChoices.ACTION_UPDATE, user, request_id)
+        dids_bulk_updated.send(sender=DIDNumbers, pks=pk_list, partitions=partitions, changes=changes)
+
+    return count
+
+
+def bulk_delete_dids(queryset, user=None, request_id=None):
+    """Delete every DID in ``queryset`` with one DELETE, bypassing per-object signals.
+
+    Returns the number of rows deleted.
+    """
+    with transaction.atomic():
+        # Reload full rows: the caller's queryset may defer columns the changelog snapshot needs.
+        objects = list(DIDNumbers.objects.filter(pk__in=queryset.values("pk")).select_related("provider"))
+        if not objects:
+            return 0
+        for obj in objects:
+            obj.snapshot()
+        pk_list = [obj.pk for obj in objects]
+        # Dependents are handled per relation, so the collector can be skipped entirely.
+        _clear_dependents(pk_list)
+        delete_qs = DIDNumbers.objects.filter(pk__in=pk_list)
+        count = delete_qs._raw_delete(delete_qs.db)
+        _record_changes(objects, ObjectChangeActionChoices.ACTION_DELETE, user, request_id)
+        dids_bulk_deleted.send(
+            sender=DIDNumbers,
+            pks=pk_list,
+            partitions={obj.partition for obj in objects},
+            dids=[obj.did for obj in objects],
+        )
+
+    return count
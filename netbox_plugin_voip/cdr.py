@@ -0,0 +1,219 @@
+"""Streaming CDR ingestion into per-DID daily usage counters.
+
+CSV call records flow through a generator pipeline (files -> rows -> keyed
+records) and are aggregated in memory per (called number, date). Each flush
+resolves the distinct numbers to DIDNumbers rows with one IN query per batch
+and adds the totals with a single INSERT ... ON CONFLICT DO UPDATE, so the
+per-record cost is a CSV parse, two slices and a dict update.
+
+Called numbers are matched on their digits alone ("+1 555-0100" and "15550100"
+are the same key). A number present in several partitions is counted against
+each of them.
+"""
+import csv
+import os
+import re
+import shutil
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+from psycopg2.extras import execute_values
+
+from .models import DIDNumbers, DIDUsage
+from .utils import get_plugin_setting
+
+FLUSH_RECORDS = 100000
+LOOKUP_BATCH_SIZE = 1000
+PROCESSED_DIR = "processed"
+
+_non_digits = re.compile(r"[^0-9]")
+
+
+def normalize_number(value):
+    """Return the digits of a called number, dropping "+", separators and URI decoration."""
+    return _non_digits.sub("", value)
+
+
+def cdr_files(path):
+    """Yield the CSV files to ingest: ``path`` itself, or every ``*.csv`` directly inside it."""
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            full_path = os.path.join(path, name)
+            if name.lower().endswith(".csv") and os.path.isfile(full_path):
+                yield full_path
+    else:
+        yield path
+
+
+def read_rows(paths):
+    """Yield CSV rows (lists) from each file, with the header row resolved to column indexes first."""
+    columns = get_plugin_setting("cdr_columns")
+    for path in paths:
+        with open(path, newline="") as stream:
+            reader = csv.reader(stream)
+            try:
+                header = next(reader)
+            except StopIteration:
+                continue
+            try:
+                indexes = tuple(header.index(columns[name]) for name in ("called", "start", "duration"))
+            except ValueError:
+                raise ValueError(f"{path}: header must contain the columns {columns}")
+            yield indexes
+            yield from reader
+
+
+def parse_records(rows, counts=None):
+    """Yield ``(digits, iso_date, seconds)`` for each CSV row, skipping malformed records.
+
+    Start times are expected to begin with an ISO date (``YYYY-MM-DD...``), so the
+    date is a slice; each distinct slice is validated once. Durations must be finite
+    and not negative. Each skipped row increments ``counts.invalid`` when given.
+    """
+    called_i = start_i = duration_i = None
+    days = {}
+    for row in rows:
+        if isinstance(row, tuple):
+            called_i, start_i, duration_i = row
+            continue
+        try:
+            called, start, duration = row[called_i], row[start_i], row[duration_i]
+        except IndexError:
+            if counts is not None:
+                counts.invalid += 1
+            continue
+        if called.isdigit():
+            digits = called
+        else:
+            digits = normalize_number(called)
+            if not digits:
+                if counts is not None:
+                    counts.invalid += 1
+                continue
+        day = start[:10]
+        if day not in days:
+            try:
+                date.fromisoformat(day)
+                days[day] = True
+            except ValueError:
+                days[day] = False
+        try:
+            seconds = int(duration) if duration.isdigit() else int(float(duration or 0))
+        except (ValueError, OverflowError):
+            seconds = -1
+        if not days[day] or seconds < 0:
+            if counts is not None:
+                counts.invalid += 1
+            continue
+        yield digits, day, seconds
+
+
+class CDRIngester:
+    """Aggregate parsed records and upsert them into DIDUsage in batches."""
+
+    def __init__(self, flush_records=FLUSH_RECORDS):
+        self.flush_records = flush_records
+        self.records = 0
+        self.matched = 0
+        self.unmatched = 0
+        self.invalid = 0
+        self._pending = defaultdict(lambda: [0, 0])
+        self._pending_records = 0
+
+    def ingest(self, records):
+        pending = self._pending
+        count = self._pending_records
+        for digits, day, seconds in records:
+            counters = pending[(digits, day)]
+            counters[0] += 1
+            counters[1] += seconds
+            count += 1
+            if count >= self.flush_records:
+                self._pending_records = count
+                self.flush()
+                pending, count = self._pending, 0
+        self._pending_records = count
+        self.flush()
+
+    def _resolve(self, numbers):
+        """Map digit strings to the pks of every DIDNumbers row carrying that number."""
+        pks = defaultdict(list)
+        numbers = list(numbers)
+        for i in range(0, len(numbers), LOOKUP_BATCH_SIZE):
+            batch = numbers[i:i + LOOKUP_BATCH_SIZE]
+            candidates = batch + [f"+{number}" for number in batch]
+            for pk, did in DIDNumbers.objects.filter(did__in=candidates).values_list("pk", "did"):
+                pks[did.lstrip("+")].append(pk)
+        return pks
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, defaultdict(lambda: [0, 0])
+        self.records += self._pending_records
+        self._pending_records = 0
+
+        pks = self._resolve({digits for digits, _ in pending})
+        rows = defaultdict(lambda: [0, 0])
+        for (digits, day), (calls, seconds) in pending.items():
+            if digits not in pks:
+                self.unmatched += calls
+                continue
+            self.matched += calls
+            for pk in pks[digits]:
+                counters = rows[(pk, day)]
+                counters[0] += calls
+                counters[1] += seconds
+        if not rows:
+            return
+
+        table = DIDUsage._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            execute_values(
+                cursor,
+                f"INSERT INTO {table} (did_id, date, calls, seconds) VALUES %s "
+                f"ON CONFLICT (did_id, date) DO UPDATE SET "
+                f"calls = {table}.calls + EXCLUDED.calls, seconds = {table}.seconds + EXCLUDED.seconds",
+                [(pk, day, calls, seconds) for (pk, day), (calls, seconds) in sorted(rows.items())],
+                page_size=LOOKUP_BATCH_SIZE,
+            )
+
+
+def ingest_path(path, keep=False):
+    """Ingest a CSV file or every CSV in a drop directory; returns the CDRIngester with its totals.
+
+    Each file is ingested in its own transaction. Files taken from a drop directory are
+    moved into its ``processed`` subdirectory as soon as theirs commits, unless ``keep``
+    is set, so a re-run after a failure neither skips nor double-counts a file.
+    """
+    ingester = CDRIngester()
+    processed = None
+    if os.path.isdir(path) and not keep:
+        processed = os.path.join(path, PROCESSED_DIR)
+        os.makedirs(processed, exist_ok=True)
+    for file_path in cdr_files(path):
+        with transaction.atomic():
+            ingester.ingest(parse_records(read_rows([file_path]), ingester))
+        if processed is not None:
+            shutil.move(file_path, os.path.join(processed, os.path.basename(file_path)))
+    return ingester
+
+
+def idle_dids(queryset, days):
+    """Filter ``queryset`` to DIDs without any recorded call in the last ``days`` days."""
+    since = date.today() - timedelta(days=days)
+    recent = DIDUsage.objects.filter(did=OuterRef("pk"), date__gte=since)
+    return queryset.filter(~Exists(recent))
+
+
+def idle_report(queryset, days):
+    """Count idle DIDs per provider and partition."""
+    return (
+        idle_dids(queryset, days)
+        .order_by()
+        .values("provider__name", "partition")
+        .annotate(idle=Count("pk"))
+        .order_by("provider__name", "partition")
+    )
@@ -0,0 +1,310 @@
+"""Staged DID change sets, applied in one batch at cutover.
+
+Carrier ports and renumbering projects change thousands of DIDs at one moment.
+Instead of editing them live, the changes are staged ahead of time:
+
+1. ``stage_changes`` records each change as a StagedChange: create a DID,
+   update fields of one (including renumbering it or moving it to another
+   partition), or delete one. Targets are named by number and partition.
+2. ``validate_changeset`` resolves every target and provider with one IN-list
+   query each, cleans each value with the model field (so number_validator
+   applies), and rejects changes that touch a DID twice or leave two DIDs with
+   the same number and partition. The result is stored as the plan: the target
+   pk, the column values to write, and the full row as it was.
+3. ``apply_changeset`` locks the targets, checks that none changed since
+   validation, and runs the plan in one transaction: deletes, then one
+   ``UPDATE ... FROM unnest(...)`` per set of changed columns, then a bulk insert.
+4. ``rollback_changeset`` runs the inverse plan (delete what was created,
+   restore the old values, recreate what was deleted) the same way.
+
+Changelog entries are written in bulk, and blocks, version counters and change
+events are kept up to date through the bulk signals. Rolling back a delete
+recreates the DID with its old id, but not its usage history or phone lines.
+"""
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from circuits.models import Provider
+from extras.choices import ObjectChangeActionChoices
+
+from .blocks import update_blocks
+from .bulk import _record_changes, bulk_delete_dids
+from .choices import ChangeSetStatusChoices
+from .formatting import format_did
+from .models import DIDNumbers, StagedChange
+from .signals import dids_bulk_created, dids_bulk_updated
+
+ACTION_CREATE = ObjectChangeActionChoices.ACTION_CREATE
+ACTION_UPDATE = ObjectChangeActionChoices.ACTION_UPDATE
+ACTION_DELETE = ObjectChangeActionChoices.ACTION_DELETE
+
+# Staged field names and the columns they set; "provider" is staged by provider name.
+STAGED_FIELDS = {
+    "did": "did",
+    "partition": "partition",
+    "description": "description",
+    "provider": "provider_id",
+    "route_option": "route_option",
+    "called_party_mask": "called_party_mask",
+}
+EDITABLE_COLUMNS = tuple(STAGED_FIELDS.values())
+UPDATE_CHUNK = 10000
+BATCH_SIZE = 1000
+
+
+class ChangeSetError(Exception):
+    pass
+
+
+def stage_changes(changeset, rows):
+    """Add changes to a change set; each row is {"action", "did", "partition", "data"}.
+
+    Staging returns the change set to draft, so it must be validated again.
+    """
+    if changeset.status not in (ChangeSetStatusChoices.STATUS_DRAFT, ChangeSetStatusChoices.STATUS_INVALID,
+                                ChangeSetStatusChoices.STATUS_VALIDATED):
+        raise ChangeSetError(f"Change set {changeset} is {changeset.status}; stage changes in a new one")
+    changes = StagedChange.objects.bulk_create([
+        StagedChange(
+            changeset=changeset,
+            action=row["action"],
+            did=row["did"],
+            partition=row.get("partition") or "",
+            data=row.get("data") or {},
+        )
+        for row in rows
+    ], batch_size=BATCH_SIZE)
+    changeset.status = ChangeSetStatusChoices.STATUS_DRAFT
+    changeset.save(update_fields=["status"])
+    return len(changes)
+
+
+def _pairs_query(pairs):
+    """DIDs matching any (did, partition) pair; over-selects by the IN-lists, callers match exact pairs."""
+    return DIDNumbers.objects.filter(did__in={did for did, _ in pairs}, partition__in={p for _, p in pairs})
+
+
+def _clean_values(change, providers):
+    """Return the cleaned column values a change writes; raises ValidationError."""
+    unknown = set(change.data) - set(STAGED_FIELDS)
+    if unknown:
+        raise ValidationError(f"unknown fields: {', '.join(sorted(unknown))}")
+    staged = dict(change.data)
+    if change.action == ACTION_CREATE:
+        staged = {"did": change.did, "partition": change.partition, **staged}
+    values = {}
+    for name, value in staged.items():
+        if name == "provider":
+            if value in (None, ""):
+                values["provider_id"] = None
+            elif value not in providers:
+                raise ValidationError(f"provider {value!r} not found")
+            else:
+                values["provider_id"] = providers[value]
+            continue
+        field = DIDNumbers._meta.get_field(name)
+        try:
+            values[name] = field.clean(value, None)
+        except ValidationError as e:
+            raise ValidationError(f"{name}: {' '.join(e.messages)}")
+    return values
+
+
+def validate_changeset(changeset):
+    """Check every staged change and compile the plan; returns the number of invalid changes."""
+    changes = list(changeset.changes.all())
+    targets = {(c.did, c.partition) for c in changes if c.action != ACTION_CREATE}
+    columns = [field.attname for field in DIDNumbers._meta.concrete_fields]
+    rows = {(row["did"], row["partition"]): row for row in _pairs_query(targets).values(*columns)} if targets else {}
+    provider_names = {c.data["provider"] for c in changes if c.data.get("provider")}
+    providers = dict(Provider.objects.filter(name__in=provider_names).values_list("name", "pk"))
+
+    seen, vacated, claimed = set(), set(), {}
+    for change in changes:
+        change.error = ""
+        change.did_pk = change.values = change.before = None
+        try:
+            if change.action not in (ACTION_CREATE, ACTION_UPDATE, ACTION_DELETE):
+                raise ValidationError(f"unknown action {change.action!r}")
+            key = (change.did, change.partition)
+            if change.action == ACTION_DELETE:
+                change.values = {}
+            else:
+                change.values = _clean_values(change, providers)
+            if change.action == ACTION_UPDATE and not change.values:
+                raise ValidationError("no fields to update")
+            if change.action == ACTION_CREATE:
+                claimed.setdefault(key, []).append(change)
+                continue
+            if key not in rows:
+                raise ValidationError(f"DID {change.did} not found in partition {change.partition!r}")
+            if key in seen:
+                raise ValidationError(f"DID {change.did} is changed more than once")
+            seen.add(key)
+            change.before = rows[key]
+            change.did_pk = rows[key]["id"]
+            new_key = (change.values.get("did", change.did), change.values.get("partition", change.partition))
+            if change.action == ACTION_DELETE:
+                vacated.add(key)
+            if change.action == ACTION_UPDATE and new_key != key:
+                claimed.setdefault(new_key, []).append(change)
+        except ValidationError as e:
+            change.error = " ".join(e.messages)[:200]
+
+    # Every number and partition claimed by a create or a renumbering must end up unique. Only
+    # deletes (which run first) free a number: all updates run in one statement, and unique
+    # indexes are checked row by row, so a chain or swap of renumberings could collide midway.
+    existing = set(_pairs_query(claimed).values_list("did", "partition")) if claimed else set()
+    for key, claims in claimed.items():
+        if len(claims) > 1 or (key in existing and key not in vacated):
+            for change in claims:
+                change.error = change.error or f"DID {key[0]} would already exist in partition {key[1]!r}"
+
+    invalid = sum(1 for change in changes if change.error)
+    with transaction.atomic():
+        StagedChange.objects.bulk_update(changes, ["did_pk", "values", "before", "error"], batch_size=BATCH_SIZE)
+        changeset.status = (ChangeSetStatusChoices.STATUS_INVALID if invalid
+                            else ChangeSetStatusChoices.STATUS_VALIDATED)
+        changeset.validated = timezone.now()
+        changeset.last_error = f"{invalid} invalid changes" if invalid else ""
+        changeset.save()
+    return invalid
+
+
+def _lock_and_check(pks, expected, force):
+    """Lock the target rows and fail if any no longer holds the values the plan expects."""
+    objects = {obj.pk: obj for obj in DIDNumbers.objects.filter(pk__in=pks).select_for_update()}
+    drifted = [
+        pk for pk, values in expected.items()
+        if pk not in objects or any(getattr(objects[pk], column) != value for column, value in values.items())
+    ]
+    if drifted and not force:
+        raise ChangeSetError(
+            f"{len(drifted)} DIDs changed since the change set was validated (ids {drifted[:10]}); "
+            f"validate it again"
+        )
+    return objects
+
+
+def _update_rows(columns, rows, now):
+    """Write ``rows`` of ``(pk, values)`` with one UPDATE per chunk, joined to unnested arrays."""
+    meta = DIDNumbers._meta
+    fields = [meta.get_field(column) for column in columns]
+    casts = [f"%s::{meta.pk.rel_db_type(connection)}[]"] + [f"%s::{field.db_type(connection)}[]" for field in fields]
+    assignments = ", ".join(f"{field.column} = staged.{field.column}" for field in fields)
+    sql = (
+        f"UPDATE {meta.db_table} AS dids SET {assignments}, last_updated = %s "
+        f"FROM unnest({', '.join(casts)}) AS staged (id, {', '.join(field.column for field in fields)}) "
+        f"WHERE dids.{meta.pk.column} = staged.id"
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPDATE_CHUNK):
+            chunk = rows[start:start + UPDATE_CHUNK]
+            arrays = [[pk for pk, _ in chunk]] + [[values[column] for _, values in chunk] for column in columns]
+            cursor.execute(sql, [now, *arrays])
+
+
+def _execute(creates, updates, deletes, expected, force, user, request_id):
+    """Run one plan inside the caller's transaction; returns the created DIDs.
+
+    ``creates`` are column dicts (an "id" recreates a DID under its old id), ``updates``
+    maps pks to changed columns, ``deletes`` lists pks, and ``expected`` maps pks to the
+    column values they must still hold.
+    """
+    objects = _lock_and_check({*updates, *deletes}, expected, force)
+
+    if deletes:
+        bulk_delete_dids(DIDNumbers.objects.filter(pk__in=deletes), user=user, request_id=request_id)
+
+    if updates:
+        now = timezone.now()
+        groups, partitions, assigned, released = {}, set(), [], []
+        for pk, values in updates.items():
+            obj = objects[pk]
+            values = dict(values)
+            if "did" in values and values["did"] != obj.did:
+                values.update(format_did(values["did"]))
+                released.append(obj.did)
+                assigned.append(values["did"])
+            partitions.update({obj.partition, values.get("partition", obj.partition)})
+            groups.setdefault(tuple(sorted(values)), []).append((pk, values))
+            obj.snapshot()
+            obj.__dict__.update(values)
+            obj.last_updated = now
+        for columns, rows in groups.items():
+            _update_rows(columns, rows, now)
+        updated = [objects[pk] for pk in updates]
+        _record_changes(updated, ObjectChangeActionChoices.ACTION_UPDATE, user, request_id)
+        if assigned:
+            update_blocks(assigned=assigned, released=released)
+        dids_bulk_updated.send(sender=DIDNumbers, pks=list(updates), partitions=partitions, changes=None)
+
+    created = []
+    if creates:
+        for values in creates:
+            values = {column: DIDNumbers._meta.get_field(column).to_python(value) for column, value in values.items()}
+            values.update(format_did(values["did"]))
+            created.append(DIDNumbers(**values))
+        DIDNumbers.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        _record_changes(created, ObjectChangeActionChoices.ACTION_CREATE, user, request_id)
+        dids_bulk_created.send(
+            sender=DIDNumbers,
+            pks=[obj.pk for obj in created],
+            partitions={obj.partition for obj in created},
+            dids=[obj.did for obj in created],
+        )
+    return created
+
+
+def _editable(row):
+    return {column: row[column] for column in EDITABLE_COLUMNS}
+
+
+def apply_changeset(changeset, force=False, user=None, request_id=None):
+    """Apply a validated change set in one transaction; returns ``(created, updated, deleted)`` counts.
+
+    Fails without changing anything if a target changed since validation, unless ``force``.
+    """
+    if changeset.status != ChangeSetStatusChoices.STATUS_VALIDATED:
+        raise ChangeSetError(f"Change set {changeset} is {changeset.status}; only validated change sets apply")
+    changes = list(changeset.changes.all())
+    creates = [change for change in changes if change.action == ACTION_CREATE]
+    updates = {change.did_pk: change.values for change in changes if change.action == ACTION_UPDATE}
+    deletes = [change.did_pk for change in changes if change.action == ACTION_DELETE]
+    expected = {change.did_pk: _editable(change.before) for change in changes if change.action != ACTION_CREATE}
+
+    with transaction.atomic():
+        created = _execute([change.values for change in creates], updates, deletes, expected, force, user,
+                           request_id)
+        for change, obj in zip(creates, created):
+            change.did_pk = obj.pk
+        StagedChange.objects.bulk_update(creates, ["did_pk"], batch_size=BATCH_SIZE)
+        changeset.status = ChangeSetStatusChoices.STATUS_APPLIED
+        changeset.applied = timezone.now()
+        changeset.save()
+    return len(creates), len(updates), len(deletes)
+
+
+def rollback_changeset(changeset, force=False, user=None, request_id=None):
+    """Undo an applied change set in one transaction; returns ``(created, updated, deleted)`` counts."""
+    if changeset.status != ChangeSetStatusChoices.STATUS_APPLIED:
+        raise ChangeSetError(f"Change set {changeset} is {changeset.status}; only applied change sets roll back")
+    changes = list(changeset.changes.all())
+    creates, updates, deletes, expected = [], {}, [], {}
+    for change in changes:
+        if change.action == ACTION_CREATE:
+            deletes.append(change.did_pk)
+            expected[change.did_pk] = change.values
+        elif change.action == ACTION_UPDATE:
+            updates[change.did_pk] = {column: change.before[column] for column in change.values}
+            expected[change.did_pk] = change.values
+        else:
+            creates.append(change.before)
+
+    with transaction.atomic():
+        _execute(creates, updates, deletes, expected, force, user, request_id)
+        changeset.status = ChangeSetStatusChoices.STATUS_ROLLED_BACK
+        changeset.rolled_back = timezone.now()
+        changeset.save()
+    return len(creates), len(updates), len(deletes)
@@ -0,0 +1,65 @@
+from utilities.choices import ChoiceSet
+
+
+class AuditStatusChoices(ChoiceSet):
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+
+class AuditRuleChoices(ChoiceSet):
+
+    RULE_INVALID_CHARACTERS = "invalid-characters"
+    RULE_E164_LENGTH = "e164-length"
+    RULE_NORMALIZED_DUPLICATE = "normalized-duplicate"
+    RULE_ORPHANED_PROVIDER = "orphaned-provider"
+
+    CHOICES = (
+        (RULE_INVALID_CHARACTERS, "Fails number_validator"),
+        (RULE_E164_LENGTH, "Impossible E.164 length"),
+        (RULE_NORMALIZED_DUPLICATE, "Duplicate after normalization"),
+        (RULE_ORPHANED_PROVIDER, "Orphaned provider"),
+    )
+
+
+class BackfillStatusChoices(ChoiceSet):
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_PAUSED = "paused"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_PAUSED, "Paused"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+
+class ChangeSetStatusChoices(ChoiceSet):
+
+    STATUS_DRAFT = "draft"
+    STATUS_VALIDATED = "validated"
+    STATUS_INVALID = "invalid"
+    STATUS_APPLIED = "applied"
+    STATUS_ROLLED_BACK = "rolled-back"
+
+    CHOICES = (
+        (STATUS_DRAFT, "Draft"),
+        (STATUS_VALIDATED, "Validated"),
+        (STATUS_INVALID, "Invalid"),
+        (STATUS_APPLIED, "Applied"),
+        (STATUS_ROLLED_BACK, "Rolled back"),
+    )
@@ -0,0 +1,254 @@
+"""Set algebra over DID holdings.
+
+DIDs are loaded into sorted, de-duplicated int64 arrays (8 bytes per number) so
+union, intersection and difference run as linear merges instead of Python set or
+spreadsheet work. NumPy is used when installed; otherwise the stdlib ``array``
+module and pure-Python merges are used with the same results.
+
+Only numeric DIDs take part: an optional leading "+" is dropped and the digits
+are keyed as ``int("1" + digits)``, which keeps leading zeros significant and
+keeps numbers of equal length contiguous, so consecutive numbers compress into
+ranges. DIDs containing A-D, # or * are counted as skipped.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+
+from django.db.models import Value
+from django.db.models.functions import Collate, Length, Replace
+from django.http import QueryDict
+
+from .utils import get_plugin_setting
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# int64 holds "1" followed by up to 18 digits.
+MAX_DIGITS = 18
+ITEM_SIZE = 8
+LOAD_CHUNK_SIZE = 10000
+
+
+class DIDSetError(ValueError):
+    """Raised for invalid set selectors or when a set would exceed the memory budget."""
+
+
+def did_digits(did):
+    """Return a DID's digits without the leading "+", or None if it is not purely numeric."""
+    digits = did[1:] if did.startswith("+") else did
+    if not digits or not digits.isdigit():
+        return None
+    return digits
+
+
+def did_key(did):
+    """Return the integer key for a DID, or None if it is not purely numeric."""
+    digits = did_digits(did)
+    if digits is None or len(digits) > MAX_DIGITS:
+        return None
+    return int("1" + digits)
+
+
+def key_to_digits(key):
+    """Return the digit string a key was built from."""
+    return str(key)[1:]
+
+
+def _check_budget(size):
+    limit = get_plugin_setting("didset_memory_limit")
+    if limit and size * ITEM_SIZE > limit:
+        raise DIDSetError(
+            f"A set of {size} numbers needs {size * ITEM_SIZE} bytes, over the didset_memory_limit of {limit}"
+        )
+
+
+def _merge_union(a, b):
+    out = array("q")
+    previous = None
+    for value in heapq.merge(a, b):
+        if value != previous:
+            out.append(value)
+            previous = value
+    return out
+
+
+def _merge_intersection(a, b):
+    out = array("q")
+    i = j = 0
+    len_a, len_b = len(a), len(b)
+    while i < len_a and j < len_b:
+        if a[i] < b[j]:
+            i += 1
+        elif a[i] > b[j]:
+            j += 1
+        else:
+            out.append(a[i])
+            i += 1
+            j += 1
+    return out
+
+
+def _merge_difference(a, b):
+    out = array("q")
+    j = 0
+    len_b = len(b)
+    for value in a:
+        while j < len_b and b[j] < value:
+            j += 1
+        if j == len_b or b[j] != value:
+            out.append(value)
+    return out
+
+
+class DIDSet:
+    """An immutable, sorted set of numeric DIDs backed by an int64 array."""
+
+    def __init__(self, keys, skipped=0):
+        self.keys = keys
+        self.skipped = skipped
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, did):
+        key = did_key(did)
+        if key is None:
+            return False
+        if np is not None:
+            index = np.searchsorted(self.keys, key)
+            return index < len(self.keys) and self.keys[index] == key
+        index = bisect_left(self.keys, key)
+        return index < len(self.keys) and self.keys[index] == key
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        """Load the numeric DIDs of a DIDNumbers queryset, streaming rows from a server-side cursor.
+
+        The database returns them in key order (shorter digit strings first, then bytewise), so
+        the array is built sorted and duplicates, such as a number held in two partitions, are adjacent.
+        """
+        values = array("q")
+        skipped = 0
+        previous = None
+        digits = Replace("did", Value("+"), Value(""))
+        rows = (
+            queryset.order_by(Length(digits), Collate(digits, "C"))
+            .values_list("did", flat=True).iterator(chunk_size=LOAD_CHUNK_SIZE)
+        )
+        for did in rows:
+            key = did_key(did)
+            if key is None:
+                skipped += 1
+                continue
+            if key == previous:
+                continue
+            values.append(key)
+            previous = key
+            if len(values) % LOAD_CHUNK_SIZE == 0:
+                _check_budget(len(values))
+        _check_budget(len(values))
+        if np is not None:
+            return cls(np.frombuffer(values, dtype=np.int64), skipped=skipped)
+        return cls(values, skipped=skipped)
+
+    @classmethod
+    def from_range(cls, start, end):
+        """Build the set of every number from ``start`` to ``end`` inclusive (equal-length digit strings)."""
+        start_key, end_key = did_key(start), did_key(end)
+        if start_key is None or end_key is None or len(start.lstrip("+")) != len(end.lstrip("+")):
+            raise DIDSetError("Range bounds must be numeric DIDs of equal length")
+        if end_key < start_key:
+            raise DIDSetError("Range end must not be lower than its start")
+        _check_budget(end_key - start_key + 1)
+        if np is not None:
+            return cls(np.arange(start_key, end_key + 1, dtype=np.int64))
+        return cls(array("q", range(start_key, end_key + 1)))
+
+    def union(self, other):
+        if np is not None:
+            keys = np.union1d(self.keys, other.keys)
+        else:
+            keys = _merge_union(self.keys, other.keys)
+        return DIDSet(keys, skipped=self.skipped + other.skipped)
+
+    def intersection(self, other):
+        if np is not None:
+            keys = np.intersect1d(self.keys, other.keys, assume_unique=True)
+        else:
+            keys = _merge_intersection(self.keys, other.keys)
+        return DIDSet(keys, skipped=self.skipped + other.skipped)
+
+    def difference(self, other):
+        if np is not None:
+            keys = np.setdiff1d(self.keys, other.keys, assume_unique=True)
+        else:
+            keys = _merge_difference(self.keys, other.keys)
+        return DIDSet(keys, skipped=self.skipped + other.skipped)
+
+    def ranges(self):
+        """Return the set as a list of ``(first, last)`` digit-string pairs covering consecutive numbers."""
+        if not len(self.keys):
+            return []
+        if np is not None:
+            breaks = np.flatnonzero(np.diff(self.keys) != 1)
+            starts = np.concatenate(([self.keys[0]], self.keys[breaks + 1]))
+            ends = np.concatenate((self.keys[breaks], [self.keys[-1]]))
+            pairs = zip(starts.tolist(), ends.tolist())
+        else:
+            pairs = []
+            first = last = self.keys[0]
+            for key in self.keys[1:]:
+                if key != last + 1:
+                    pairs.append((first, last))
+                    first = key
+                last = key
+            pairs.append((first, last))
+        return [(key_to_digits(first), key_to_digits(last)) for first, last in pairs]
+
+
+OPERATIONS = {
+    "union": DIDSet.union,
+    "intersection": DIDSet.intersection,
+    "difference": DIDSet.difference,
+}
+
+
+def load_selector(selector, queryset, filterset_class):
+    """Load a DIDSet from an API selector.
+
+    A selector is either ``{"range": [start, end]}`` or a dict of filter parameters
+    understood by ``filterset_class`` (for example ``{"provider": ["a"]}`` or
+    ``{"partition": ["x"]}``), applied to ``queryset``.
+    """
+    if not isinstance(selector, dict) or not selector:
+        raise DIDSetError("Each set must be a non-empty object")
+    if "range" in selector:
+        bounds = selector["range"]
+        if not isinstance(bounds, (list, tuple)) or len(bounds) != 2:
+            raise DIDSetError("A range set must be given as [start, end]")
+        return DIDSet.from_range(str(bounds[0]), str(bounds[1]))
+    unknown = sorted(set(selector) - set(filterset_class.base_filters))
+    if unknown:
+        # The filterset would ignore them and select every DID.
+        raise DIDSetError(f"Unknown filters: {', '.join(unknown)}")
+    data = QueryDict(mutable=True)
+    for name, value in selector.items():
+        data.setlist(name, [str(v) for v in value] if isinstance(value, (list, tuple)) else [str(value)])
+    filterset = filterset_class(data, queryset)
+    if not filterset.is_valid():
+        raise DIDSetError(f"Invalid filter: {dict(filterset.errors)}")
+    return DIDSet.from_queryset(filterset.qs)
+
+
+def evaluate(operation, selectors, queryset, filterset_class):
+    """Fold ``operation`` left to right over the sets described by ``selectors``."""
+    if operation not in OPERATIONS:
+        raise DIDSetError(f"Unknown operation {operation!r}; choose from {', '.join(OPERATIONS)}")
+    if not isinstance(selectors, list) or len(selectors) < 2:
+        raise DIDSetError("At least two sets are required")
+    result = load_selector(selectors[0], queryset, filterset_class)
+    for selector in selectors[1:]:
+        result = OPERATIONS[operation](result, load_selector(selector, queryset, filterset_class))
+    return result
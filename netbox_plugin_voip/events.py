@@ -0,0 +1,240 @@
+"""Coalesced, batched change events for DIDs.
+
+The receivers in signals.py buffer every committed DIDNumbers change in Redis,
+keyed by DID id: one hash remembers the first action seen for each DID and
+another the latest. Edits made to one DID within a window therefore collapse
+into a single event: create then update is a create, anything then delete is
+a delete, and a DID created and deleted in the same window is dropped.
+
+``voip_event_dispatcher`` flushes the buffer once per ``event_window``
+seconds. It moves the buffered keys aside atomically and loads the current
+state of every surviving DID in bulk. The events are then POSTed in batches of
+``event_batch_size`` to each URL in ``event_endpoints``, over a pooled HTTP
+session with at most ``event_concurrency`` requests in flight.
+
+Failed requests are retried with exponential backoff, honouring Retry-After.
+Batches that still fail go back into the buffer, where they coalesce with newer
+edits, so delivery is at-least-once. While a flush is running nothing more is
+taken, and the buffer grows with the number of distinct DIDs changed rather than
+the number of edits. That is the backpressure.
+"""
+import hashlib
+import hmac
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django_rq
+import requests
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import DIDNumbers
+from .routers import use_primary
+from .utils import get_plugin_setting
+
+KEY_PREFIX = "netbox_plugin_voip:events"
+FIRST_KEY = f"{KEY_PREFIX}:first"
+LAST_KEY = f"{KEY_PREFIX}:last"
+DELETED_KEY = f"{KEY_PREFIX}:deleted"
+METRICS_KEY = f"{KEY_PREFIX}:metrics"
+BUFFER_KEYS = (FIRST_KEY, LAST_KEY, DELETED_KEY)
+PROCESSING_SUFFIX = ":processing"
+
+ACTION_CREATE = "create"
+ACTION_UPDATE = "update"
+ACTION_DELETE = "delete"
+
+EVENT_FIELDS = ("id", "did", "did_e164", "partition", "provider_id", "route_option", "called_party_mask",
+                "description")
+PIPELINE_CHUNK = 10000
+
+# Renames the buffer aside in one step, so no change recorded meanwhile is lost or half-taken.
+_TAKE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('RENAME', key, key .. ARGV[1])
+    end
+end
+"""
+
+
+def enabled():
+    return bool(get_plugin_setting("event_endpoints"))
+
+
+def _redis():
+    return django_rq.get_connection("default")
+
+
+def record(action, pks, deleted=None):
+    """Buffer ``action`` for each DID id in ``pks``. ``deleted`` maps ids to their last known fields."""
+    connection = _redis()
+    pks = list(pks)
+    for start in range(0, len(pks), PIPELINE_CHUNK):
+        pipe = connection.pipeline(transaction=False)
+        for pk in pks[start:start + PIPELINE_CHUNK]:
+            pipe.hsetnx(FIRST_KEY, pk, action)
+            pipe.hset(LAST_KEY, pk, action)
+        pipe.execute()
+    pipe = connection.pipeline(transaction=False)
+    if deleted:
+        pipe.hset(DELETED_KEY, mapping={pk: json.dumps(fields) for pk, fields in deleted.items()})
+    pipe.hincrby(METRICS_KEY, "recorded", len(pks))
+    pipe.execute()
+
+
+def record_on_commit(action, pks, deleted=None):
+    """Buffer the change once the current transaction commits; a no-op without event endpoints."""
+    if enabled():
+        pks = list(pks)
+        transaction.on_commit(lambda: record(action, pks, deleted))
+
+
+def coalesce(first, last):
+    """Collapse the first and latest action seen for a DID into one, or None if they cancel out."""
+    if first == ACTION_CREATE:
+        return None if last == ACTION_DELETE else ACTION_CREATE
+    return ACTION_DELETE if last == ACTION_DELETE else ACTION_UPDATE
+
+
+def _decode(mapping):
+    return {int(key): value.decode() if isinstance(value, bytes) else value for key, value in mapping.items()}
+
+
+def build_events(first, last, deleted):
+    """Turn buffered actions into event dicts, loading live DIDs' current fields in bulk."""
+    actions = {pk: coalesce(first.get(pk), action) for pk, action in last.items()}
+    live = sorted(pk for pk, action in actions.items() if action in (ACTION_CREATE, ACTION_UPDATE))
+    rows = {}
+    # A replica may not have replayed the commits that buffered these changes yet.
+    with use_primary():
+        for start in range(0, len(live), PIPELINE_CHUNK):
+            for row in DIDNumbers.objects.filter(pk__in=live[start:start + PIPELINE_CHUNK]).values(*EVENT_FIELDS):
+                rows[row["id"]] = row
+
+    events = []
+    for pk, action in sorted(actions.items()):
+        if action == ACTION_DELETE:
+            events.append({"action": action, "id": pk, **json.loads(deleted.get(pk, "{}"))})
+        elif action is not None and pk in rows:
+            # A DID missing here was deleted after the flush began; its delete is already buffered.
+            events.append({"action": action, **rows[pk]})
+    return events
+
+
+def metrics():
+    """Return the delivery counters plus the number of DIDs currently buffered.
+
+    ``recorded`` counts buffered edits and ``events_delivered`` the events sent for
+    them; the gap is what coalescing saved.
+    """
+    connection = _redis()
+    values = {key.decode(): float(value) for key, value in connection.hgetall(METRICS_KEY).items()}
+    values = {key: int(value) if value.is_integer() else value for key, value in values.items()}
+    values["pending"] = connection.hlen(LAST_KEY)
+    values["in_flight"] = connection.hlen(LAST_KEY + PROCESSING_SUFFIX)
+    return values
+
+
+class Dispatcher:
+    """Flushes the buffer to the configured endpoints over one pooled HTTP session."""
+
+    def __init__(self, endpoints=None, concurrency=None, batch_size=None, max_retries=None, timeout=None):
+        self.endpoints = endpoints or get_plugin_setting("event_endpoints")
+        self.concurrency = concurrency or get_plugin_setting("event_concurrency")
+        self.batch_size = batch_size or get_plugin_setting("event_batch_size")
+        self.max_retries = get_plugin_setting("event_max_retries") if max_retries is None else max_retries
+        self.timeout = timeout or get_plugin_setting("event_timeout")
+        self.secret = get_plugin_setting("event_secret")
+        self.redis = _redis()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+    def _headers(self, body):
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            headers["X-Voip-Signature"] = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+        return headers
+
+    def send(self, url, body):
+        """POST one batch, retrying connection errors, 429 and 5xx; returns True once accepted."""
+        for attempt in range(self.max_retries + 1):
+            delay = min(2 ** attempt, 60) * (0.5 + random.random() / 2)
+            try:
+                response = self.session.post(url, data=body, headers=self._headers(body), timeout=self.timeout)
+                if response.status_code < 300:
+                    return True
+                if response.status_code != 429 and response.status_code < 500:
+                    return False
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = int(retry_after)
+            except requests.RequestException:
+                pass
+            if attempt < self.max_retries:
+                self.redis.hincrby(METRICS_KEY, "retries", 1)
+                time.sleep(delay)
+        return False
+
+    def _take(self):
+        """Return the buffered actions, resuming a flush interrupted before it finished."""
+        processing = [key + PROCESSING_SUFFIX for key in BUFFER_KEYS]
+        if not self.redis.exists(processing[1]):
+            self.redis.eval(_TAKE_SCRIPT, len(BUFFER_KEYS), *BUFFER_KEYS, PROCESSING_SUFFIX)
+        first, last, deleted = (_decode(self.redis.hgetall(key)) for key in processing)
+        return first, last, deleted
+
+    def _requeue(self, events, first):
+        """Put undelivered events back; the oldest first action wins, newer buffered edits are kept."""
+        pipe = self.redis.pipeline(transaction=False)
+        for event in events:
+            pk = event["id"]
+            pipe.hset(FIRST_KEY, pk, first.get(pk, event["action"]))
+            pipe.hsetnx(LAST_KEY, pk, event["action"])
+            if event["action"] == ACTION_DELETE:
+                pipe.hsetnx(DELETED_KEY, pk, json.dumps({k: v for k, v in event.items() if k not in ("action", "id")}))
+        pipe.execute()
+
+    def flush(self):
+        """Deliver everything buffered; returns ``(events_delivered, batches_failed)``."""
+        started = time.monotonic()
+        first, last, deleted = self._take()
+        events = build_events(first, last, deleted)
+        batches = [events[i:i + self.batch_size] for i in range(0, len(events), self.batch_size)]
+        sent_at = timezone.now().isoformat()
+        futures = []
+        for batch in batches:
+            body = json.dumps({"sent": sent_at, "events": batch}, cls=DjangoJSONEncoder).encode()
+            for url in self.endpoints:
+                futures.append((batch, self.executor.submit(self.send, url, body)))
+
+        results = [(batch, future.result()) for batch, future in futures]
+        sent = sum(1 for _, accepted in results if accepted)
+        # A batch any endpoint rejected is requeued whole; endpoints that took it may see it again.
+        failed = {id(batch): batch for batch, accepted in results if not accepted}
+        for batch in failed.values():
+            self._requeue(batch, first)
+        delivered = len(events) - sum(len(batch) for batch in failed.values())
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(*[key + PROCESSING_SUFFIX for key in BUFFER_KEYS])
+        pipe.hincrby(METRICS_KEY, "flushes", 1)
+        pipe.hincrby(METRICS_KEY, "events_delivered", delivered)
+        pipe.hincrby(METRICS_KEY, "batches_sent", sent)
+        pipe.hincrby(METRICS_KEY, "batches_failed", len(results) - sent)
+        # DIDs created and deleted within one window produce no event at all.
+        pipe.hincrby(METRICS_KEY, "cancelled", len(last) - len(events))
+        pipe.hset(METRICS_KEY, "last_flush_seconds", round(time.monotonic() - started, 3))
+        pipe.execute()
+        return delivered, len(failed)
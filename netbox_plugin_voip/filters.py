@@ -0,0 +1,87 @@
+import django_filters
+from django.db.models import Q
+
+from circuits.models import Provider
+from dcim.models import Site
+from netbox.filters import BaseFilterSet
+
+from .cdr import idle_dids
+from .history import as_of, timeline
+from .models import DIDHistory, DIDNumbers
+from .sites import site_condition
+
+
+class DIDNumbersFilterSet(BaseFilterSet):
+    q = django_filters.CharFilter(
+        method="search",
+        label="Search",
+    )
+    provider_id = django_filters.ModelMultipleChoiceFilter(
+        queryset=Provider.objects.all(),
+        label="Provider (ID)",
+    )
+    provider = django_filters.ModelMultipleChoiceFilter(
+        field_name="provider__slug",
+        queryset=Provider.objects.all(),
+        to_field_name="slug",
+        label="Provider (slug)",
+    )
+    site_id = django_filters.ModelMultipleChoiceFilter(
+        queryset=Site.objects.all(),
+        label="Site override (ID)",
+    )
+    effective_site_id = django_filters.ModelMultipleChoiceFilter(
+        queryset=Site.objects.all(),
+        method="filter_effective_site",
+        label="Site, set on the DID or inherited from its prefix (ID)",
+    )
+    idle_days = django_filters.NumberFilter(
+        method="filter_idle_days",
+        label="No calls in the last N days",
+    )
+
+    class Meta:
+        model = DIDNumbers
+        fields = ["id", "did", "partition", "route_option", "called_party_mask"]
+
+    def search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return queryset.filter(
+            Q(did__startswith=value.strip()) |
+            Q(description__icontains=value) |
+            Q(partition__iexact=value.strip())
+        )
+
+    def filter_effective_site(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(site_condition([site.pk for site in value]))
+
+    def filter_idle_days(self, queryset, name, value):
+        return idle_dids(queryset, int(value))
+
+
+class DIDHistoryFilterSet(BaseFilterSet):
+    number = django_filters.CharFilter(
+        method="filter_number",
+        label="Number, with or without leading +",
+    )
+    at = django_filters.IsoDateTimeFilter(
+        method="filter_at",
+        label="Periods containing this time",
+    )
+    provider_id = django_filters.ModelMultipleChoiceFilter(
+        queryset=Provider.objects.all(),
+        label="Provider (ID)",
+    )
+
+    class Meta:
+        model = DIDHistory
+        fields = ["id", "did_pk", "partition"]
+
+    def filter_number(self, queryset, name, value):
+        return timeline(value.strip(), queryset=queryset)
+
+    def filter_at(self, queryset, name, value):
+        return as_of(value, queryset=queryset)
@@ -0,0 +1,47 @@
+"""Display formats for DIDs, computed once on write instead of on every render.
+
+The E.164, national and international forms plus the country calling code and
+region are stored on each DIDNumbers row. With the optional ``phonenumbers``
+package every numeric DID that parses as a possible number gets all five;
+without it only "+"-prefixed numbers get their E.164 and international form.
+Numbers without "+" are parsed against the ``default_region`` plugin setting.
+"""
+from .didsets import did_digits
+from .utils import get_plugin_setting
+
+try:
+    import phonenumbers
+except ImportError:  # pragma: no cover
+    phonenumbers = None
+
+FORMAT_FIELDS = ("did_e164", "did_national", "did_international", "country_code", "region_code")
+
+
+def format_did(did):
+    """Return a dict of FORMAT_FIELDS for a DID; fields that do not apply are None."""
+    formats = dict.fromkeys(FORMAT_FIELDS)
+    if did_digits(did) is None:
+        return formats
+    if phonenumbers is None:
+        if did.startswith("+"):
+            formats["did_e164"] = formats["did_international"] = did
+        return formats
+
+    try:
+        number = phonenumbers.parse(did, get_plugin_setting("default_region"))
+    except phonenumbers.NumberParseException:
+        return formats
+    if not phonenumbers.is_possible_number(number):
+        return formats
+    region_code = phonenumbers.region_code_for_number(number)
+    # Non-geographic numbers (+800, +808, +870, +882, ...) have the pseudo-region "001", not an ISO region.
+    if region_code == phonenumbers.REGION_CODE_FOR_NON_GEO_ENTITY:
+        region_code = None
+    formats.update(
+        did_e164=phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164),
+        did_national=phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.NATIONAL),
+        did_international=phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.INTERNATIONAL),
+        country_code=number.country_code,
+        region_code=region_code,
+    )
+    return formats
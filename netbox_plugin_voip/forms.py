@@ -0,0 +1,79 @@
+from django import forms
+
+from circuits.models import Provider
+from dcim.models import Location, Site
+from utilities.forms import (
+    BootstrapMixin, BulkEditForm, BulkEditNullBooleanSelect, DynamicModelChoiceField,
+    DynamicModelMultipleChoiceField,
+)
+
+from .models import DIDNumbers
+
+
+class DIDNumbersFilterForm(BootstrapMixin, forms.Form):
+    model = DIDNumbers
+    q = forms.CharField(
+        required=False,
+        label="Search",
+    )
+    provider_id = DynamicModelMultipleChoiceField(
+        queryset=Provider.objects.all(),
+        required=False,
+        label="Provider",
+    )
+    partition = forms.CharField(
+        required=False,
+    )
+    effective_site_id = DynamicModelMultipleChoiceField(
+        queryset=Site.objects.all(),
+        required=False,
+        label="Site",
+    )
+    idle_days = forms.IntegerField(
+        required=False,
+        min_value=1,
+        label="Idle for (days)",
+    )
+
+
+class DIDNumbersBulkEditForm(BootstrapMixin, BulkEditForm):
+    pk = forms.ModelMultipleChoiceField(
+        queryset=DIDNumbers.objects.only("pk"),
+        widget=forms.MultipleHiddenInput,
+    )
+    description = forms.CharField(
+        max_length=200,
+        required=False,
+    )
+    provider = DynamicModelChoiceField(
+        queryset=Provider.objects.all(),
+        required=False,
+    )
+    partition = forms.CharField(
+        max_length=200,
+        required=False,
+    )
+    route_option = forms.NullBooleanField(
+        required=False,
+        widget=BulkEditNullBooleanSelect,
+        label="Route Option Enabled",
+    )
+    called_party_mask = forms.IntegerField(
+        required=False,
+    )
+    site = DynamicModelChoiceField(
+        queryset=Site.objects.all(),
+        required=False,
+        label="Site override",
+    )
+    location = DynamicModelChoiceField(
+        queryset=Location.objects.all(),
+        required=False,
+        query_params={"site_id": "$site"},
+        label="Location override",
+    )
+
+    class Meta:
+        nullable_fields = [
+            "description", "provider", "partition", "route_option", "called_party_mask", "site", "location",
+        ]
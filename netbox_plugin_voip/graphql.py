@@ -0,0 +1,215 @@
+"""GraphQL types for DIDs, phones and lines.
+
+NetBox 3.0 and later load this module through the plugin's ``graphql_schema``
+and add ``Query`` to the root query type; earlier versions ignore it.
+
+Related objects are never loaded one row at a time. The list resolvers read the
+requested fields from the query and, before running it, join every requested
+forward relation (``select_related``) and prefetch every requested list of lines
+in one query per level. A query therefore costs a fixed number of SQL queries
+however many DIDs it returns. ``graphql_max_results`` caps the rows per list,
+``graphql_max_nested`` the lines loaded under each DID or phone, and
+``graphql_max_depth`` the nesting of a query.
+"""
+import graphene
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from graphql import GraphQLError
+
+from circuits.graphql.types import ProviderType
+from dcim.graphql.types import DeviceType, InterfaceType
+from netbox.graphql.types import BaseObjectType
+
+from .models import DIDNumbers, Line, Phone
+from .utils import get_plugin_setting
+
+# Reverse relations whose resolvers below return the prefetched rows, and their ordering.
+PREFETCHED = {(DIDNumbers, "lines"): ("phone_id", "position"), (Phone, "lines"): ("position",)}
+
+
+def _selections(info):
+    """Return the requested fields below the current one as a nested dict, with fragments inlined."""
+
+    def walk(selection_set):
+        tree = {}
+        for selection in selection_set.selections if selection_set else ():
+            kind = type(selection).__name__
+            if kind.startswith("FragmentSpread"):
+                fragment = info.fragments[selection.name.value]
+                _merge(tree, walk(fragment.selection_set))
+            elif kind.startswith("InlineFragment"):
+                _merge(tree, walk(selection.selection_set))
+            else:
+                _merge(tree, {selection.name.value: walk(selection.selection_set)})
+        return tree
+
+    nodes = getattr(info, "field_nodes", None) or info.field_asts
+    tree = {}
+    for node in nodes:
+        _merge(tree, walk(node.selection_set))
+    return tree
+
+
+def _merge(tree, other):
+    for name, children in other.items():
+        _merge(tree.setdefault(name, {}), children)
+
+
+def _depth(tree):
+    return 1 + max((_depth(children) for children in tree.values()), default=0) if tree else 0
+
+
+def _optimize(queryset, tree, user, model=None, prefix=""):
+    """Join the requested forward relations below ``prefix`` and prefetch the requested lines."""
+    model = model or queryset.model
+    for name, children in tree.items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        path = f"{prefix}{name}"
+        if field.many_to_one or field.one_to_one:
+            queryset = queryset.select_related(path)
+            queryset = _optimize(queryset, children, user, field.related_model, f"{path}__")
+        elif field.one_to_many and (model, name) in PREFETCHED:
+            related = _optimize(_capped(field, PREFETCHED[(model, name)], user), children, user)
+            queryset = queryset.prefetch_related(Prefetch(path, queryset=related))
+    return queryset
+
+
+def _capped(relation, ordering, user):
+    """Rows of a reverse relation, at most ``graphql_max_nested`` per parent.
+
+    Prefetch querysets cannot be sliced, so each row is kept only if it is among the first
+    rows of its own parent (a LIMIT subquery on the foreign key index).
+    """
+    model, parent = relation.related_model, relation.field.attname
+    queryset = model.objects.restrict(user, "view")
+    cap = get_plugin_setting("graphql_max_nested")
+    if cap is None:
+        return queryset
+    first = queryset.filter(**{parent: OuterRef(parent)}).order_by(*ordering, "pk").values("pk")[:cap]
+    return queryset.filter(pk__in=Subquery(first))
+
+
+def _check_limits(info, limit):
+    max_depth = get_plugin_setting("graphql_max_depth")
+    if max_depth is not None and _depth(_selections(info)) > max_depth:
+        raise GraphQLError(f"Query is nested deeper than {max_depth} levels below {info.field_name}")
+    max_results = get_plugin_setting("graphql_max_results")
+    if limit is None:
+        return max_results
+    if limit < 0 or (max_results is not None and limit > max_results):
+        raise GraphQLError(f"limit must be between 0 and {max_results}")
+    return limit
+
+
+def _list(queryset, info, limit, offset):
+    limit = _check_limits(info, limit)
+    queryset = _optimize(queryset.restrict(info.context.user, "view"), _selections(info), info.context.user)
+    offset = max(offset or 0, 0)
+    return queryset[offset:offset + limit] if limit is not None else queryset[offset:]
+
+
+class DIDNumbersType(BaseObjectType):
+    provider = graphene.Field(ProviderType)
+    lines = graphene.List(graphene.NonNull(lambda: LineType))
+
+    class Meta:
+        model = DIDNumbers
+        fields = (
+            "id", "did", "did_e164", "did_national", "did_international", "country_code", "region_code",
+            "description", "provider", "partition", "route_option", "called_party_mask", "created",
+            "last_updated", "lines",
+        )
+
+    def resolve_provider(root, info):
+        return root.provider
+
+    def resolve_lines(root, info):
+        return root.lines.all()[:get_plugin_setting("graphql_max_nested")]
+
+
+class PhoneType(BaseObjectType):
+    device = graphene.Field(DeviceType)
+    lines = graphene.List(graphene.NonNull(lambda: LineType))
+
+    class Meta:
+        model = Phone
+        fields = ("id", "device", "description", "created", "last_updated", "lines")
+
+    def resolve_device(root, info):
+        return root.device
+
+    def resolve_lines(root, info):
+        return root.lines.all()[:get_plugin_setting("graphql_max_nested")]
+
+
+class LineType(BaseObjectType):
+    phone = graphene.Field(PhoneType)
+    did = graphene.Field(DIDNumbersType)
+    interface = graphene.Field(InterfaceType)
+
+    class Meta:
+        model = Line
+        fields = ("id", "phone", "position", "did", "interface", "label", "created", "last_updated")
+
+    def resolve_phone(root, info):
+        return root.phone
+
+    def resolve_did(root, info):
+        return root.did
+
+    def resolve_interface(root, info):
+        return root.interface
+
+
+class PartitionType(graphene.ObjectType):
+    name = graphene.String()
+    did_count = graphene.Int()
+
+
+class Query(graphene.ObjectType):
+    did = graphene.Field(DIDNumbersType, id=graphene.Int(required=True))
+    did_list = graphene.List(
+        graphene.NonNull(DIDNumbersType),
+        partition=graphene.String(),
+        provider=graphene.String(description="Provider name"),
+        did__startswith=graphene.String(),
+        limit=graphene.Int(),
+        offset=graphene.Int(),
+    )
+    phone_list = graphene.List(graphene.NonNull(PhoneType), limit=graphene.Int(), offset=graphene.Int())
+    line_list = graphene.List(graphene.NonNull(LineType), limit=graphene.Int(), offset=graphene.Int())
+    partition_list = graphene.List(graphene.NonNull(PartitionType))
+
+    def resolve_did(root, info, id):
+        _check_limits(info, None)
+        queryset = DIDNumbers.objects.restrict(info.context.user, "view")
+        return _optimize(queryset, _selections(info), info.context.user).filter(pk=id).first()
+
+    def resolve_did_list(root, info, limit=None, offset=None, **filters):
+        queryset = DIDNumbers.objects.all()
+        if "partition" in filters:
+            queryset = queryset.filter(partition=filters["partition"])
+        if "provider" in filters:
+            queryset = queryset.filter(provider__name=filters["provider"])
+        if "did__startswith" in filters:
+            queryset = queryset.filter(did__startswith=filters["did__startswith"])
+        return _list(queryset, info, limit, offset)
+
+    def resolve_phone_list(root, info, limit=None, offset=None):
+        return _list(Phone.objects.all(), info, limit, offset)
+
+    def resolve_line_list(root, info, limit=None, offset=None):
+        return _list(Line.objects.all(), info, limit, offset)
+
+    def resolve_partition_list(root, info):
+        rows = (
+            DIDNumbers.objects.restrict(info.context.user, "view").order_by("partition")
+            .values("partition").annotate(did_count=Count("pk"))
+        )
+        return [PartitionType(name=row["partition"], did_count=row["did_count"]) for row in rows]
+
+
+schema = Query
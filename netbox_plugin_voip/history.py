@@ -0,0 +1,87 @@
+"""Point-in-time history of DID number, partition and provider.
+
+Every DID has one open DIDHistory period (``upper_inf(valid)``) holding its
+current number, partition and provider. The write paths call ``sync()`` inside
+their transaction with the DIDs they touched; it closes the open period of each
+DID that no longer matches its row (or no longer exists) at the transaction's
+timestamp and opens a new one, all in two set-based statements. Edits of other
+fields leave the history alone, and a period opened and closed in the same
+transaction is removed rather than kept empty.
+
+``as_of`` and ``timeline`` use the number index and, across numbers, the GiST
+index on ``valid``, so neither reads the changelog.
+"""
+from django.db import connection
+
+from circuits.models import Provider
+
+from .didsets import did_digits
+from .models import DIDHistory, DIDNumbers
+
+# The open period ``h`` still matches DID ``d``.
+_MATCHES = (
+    "d.id = h.did_pk AND d.did = h.did AND d.partition = h.partition "
+    "AND d.provider_id IS NOT DISTINCT FROM h.provider_id"
+)
+
+
+def sync(pks=None, since_created=False):
+    """Bring the open periods of the DIDs in ``pks`` (every DID when None) in line with their rows.
+
+    New periods start at the transaction timestamp. With ``since_created``, a DID without any
+    history yet (one that predates it) starts at its ``created`` date instead. Returns the
+    number of periods opened.
+    """
+    history, dids, providers = DIDHistory._meta.db_table, DIDNumbers._meta.db_table, Provider._meta.db_table
+    params = [] if pks is None else [list(pks)]
+    if params and not params[0]:
+        return 0
+    where = "" if pks is None else "AND h.did_pk = ANY(%s)"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {history} h WHERE upper_inf(h.valid) AND lower(h.valid) >= now() {where} "
+            f"AND NOT EXISTS (SELECT 1 FROM {dids} d WHERE {_MATCHES})",
+            params,
+        )
+        cursor.execute(
+            f"UPDATE {history} h SET valid = tstzrange(lower(h.valid), now()) WHERE upper_inf(h.valid) {where} "
+            f"AND NOT EXISTS (SELECT 1 FROM {dids} d WHERE {_MATCHES})",
+            params,
+        )
+        start = "now()"
+        if since_created:
+            start = (
+                f"CASE WHEN EXISTS (SELECT 1 FROM {history} o WHERE o.did_pk = d.id) "
+                f"THEN now() ELSE d.created::timestamptz END"
+            )
+        cursor.execute(
+            f"INSERT INTO {history} (did_pk, did, partition, provider_id, provider_name, valid) "
+            f"SELECT d.id, d.did, d.partition, d.provider_id, coalesce(p.name, ''), tstzrange({start}, NULL) "
+            f"FROM {dids} d LEFT JOIN {providers} p ON p.id = d.provider_id "
+            f"WHERE {'TRUE' if pks is None else 'd.id = ANY(%s)'} "
+            f"AND NOT EXISTS (SELECT 1 FROM {history} h WHERE h.did_pk = d.id AND upper_inf(h.valid))",
+            params,
+        )
+        return cursor.rowcount
+
+
+def _numbers(number):
+    digits = did_digits(number)
+    return [number] if digits is None else [digits, f"+{digits}"]
+
+
+def timeline(number, partition=None, queryset=None):
+    """Every period of a number (with or without "+"), oldest first."""
+    queryset = DIDHistory.objects.all() if queryset is None else queryset
+    queryset = queryset.filter(did__in=_numbers(number))
+    if partition is not None:
+        queryset = queryset.filter(partition=partition)
+    return queryset.order_by("valid")
+
+
+def as_of(at, number=None, queryset=None):
+    """Periods containing the instant ``at``: who held ``number``, or every number, at that time."""
+    queryset = DIDHistory.objects.all() if queryset is None else queryset
+    if number is not None:
+        queryset = queryset.filter(did__in=_numbers(number))
+    return queryset.filter(valid__contains=at)
@@ -0,0 +1,203 @@
+"""Bulk assignment of DIDs to phone lines.
+
+An assignment row names everything by its natural key: the phone's device (by
+``device`` name or ``serial``), the line ``position``, the ``did`` number with
+an optional ``partition``, and optionally an ``interface`` name and ``label``.
+
+``assign_lines`` resolves every reference of a whole batch with one IN-list
+query per kind (devices, phones, DIDs, interfaces, existing lines), so the
+query count does not grow with the number of rows. It then writes new lines with
+``bulk_create`` and changed ones with ``bulk_update``, and records the
+changelog with one bulk INSERT. A batch containing any invalid row is rejected
+whole.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from dcim.models import Device, Interface
+from extras.choices import ObjectChangeActionChoices
+
+from .bulk import _record_changes
+from .models import DIDNumbers, Line, Phone
+
+LINE_FIELDS = ("did", "interface", "label")
+# Largest value of Line.position, a PositiveSmallIntegerField.
+MAX_POSITION = 32767
+
+
+class LineAssignmentError(Exception):
+    """Raised with ``errors``, a list of ``(row_index, message)`` for every invalid row."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(
+            message if index is None else f"row {index}: {message}" for index, message in errors
+        ))
+
+
+def _restrict(queryset, user):
+    return queryset.restrict(user, "view") if user is not None else queryset
+
+
+def _unique_map(pairs):
+    """Map keys to values, mapping keys seen with more than one value to None (ambiguous)."""
+    result = {}
+    for key, value in pairs:
+        result[key] = value if result.get(key, value) == value else None
+    return result
+
+
+def _resolve_devices(rows, user):
+    names = {row["device"] for row in rows if row.get("device")}
+    serials = {row["serial"] for row in rows if row.get("serial")}
+    devices = {
+        device.pk: device
+        for device in _restrict(Device.objects.filter(Q(name__in=names) | Q(serial__in=serials)), user)
+    }
+    by_name = _unique_map((device.name, pk) for pk, device in devices.items())
+    by_serial = _unique_map((device.serial, pk) for pk, device in devices.items() if device.serial)
+    return devices, by_name, by_serial
+
+
+def _resolve_dids(rows, user):
+    numbers = {row["did"] for row in rows if row.get("did")}
+    exact, by_number = {}, []
+    for pk, did, partition in _restrict(DIDNumbers.objects.filter(did__in=numbers), user).values_list(
+        "pk", "did", "partition"
+    ):
+        exact[did, partition] = pk
+        by_number.append((did, pk))
+    # A number without a partition resolves only if it exists in exactly one partition.
+    return exact, _unique_map(by_number)
+
+
+def _resolve_interfaces(rows, device_ids, user):
+    names = {row["interface"] for row in rows if row.get("interface")}
+    if not names:
+        return {}
+    interfaces = _restrict(Interface.objects.filter(device_id__in=device_ids, name__in=names), user)
+    return {(device_id, name): pk for pk, device_id, name in interfaces.values_list("pk", "device_id", "name")}
+
+
+def assign_lines(rows, create_phones=True, user=None, request_id=None):
+    """Create or update the lines described by ``rows``; returns a dict of counts.
+
+    Devices without a Phone get one when ``create_phones`` is set. When ``user`` is
+    given, only devices, DIDs and interfaces the user can view are resolved, and
+    rows changing a line the user may not change are rejected.
+    """
+    rows = list(rows)
+    errors = []
+    devices, by_name, by_serial = _resolve_devices(rows, user)
+    exact_dids, dids_by_number = _resolve_dids(rows, user)
+
+    targets = []
+    for index, row in enumerate(rows):
+        key = row.get("serial") or row.get("device")
+        device_id = (by_serial if row.get("serial") else by_name).get(key, 0)
+        if not key:
+            errors.append((index, "device or serial is required"))
+            continue
+        if device_id is None:
+            errors.append((index, f"device {key!r} is ambiguous; identify it by serial"))
+            continue
+        if not device_id:
+            errors.append((index, f"device {key!r} not found"))
+            continue
+        position = row.get("position")
+        try:
+            position = 1 if position in (None, "") else int(position)
+        except (TypeError, ValueError):
+            errors.append((index, f"position {position!r} is not a number"))
+            continue
+        if not 0 <= position <= MAX_POSITION:
+            errors.append((index, f"position {position} is not between 0 and {MAX_POSITION}"))
+            continue
+
+        did_id = None
+        if row.get("did"):
+            if row.get("partition") is not None:
+                did_id = exact_dids.get((row["did"], row["partition"]))
+            else:
+                did_id = dids_by_number.get(row["did"], 0)
+                if did_id is None:
+                    errors.append((index, f"DID {row['did']} exists in several partitions; give its partition"))
+                    continue
+            if not did_id:
+                errors.append((index, f"DID {row['did']} not found"))
+                continue
+        targets.append((index, device_id, position, did_id, row))
+
+    interfaces = _resolve_interfaces(rows, {device_id for _, device_id, _, _, _ in targets}, user)
+    resolved = {}
+    for index, device_id, position, did_id, row in targets:
+        interface_id = None
+        if row.get("interface"):
+            interface_id = interfaces.get((device_id, row["interface"]))
+            if interface_id is None:
+                errors.append((index, f"interface {row['interface']!r} not found on the device"))
+                continue
+        if (device_id, position) in resolved:
+            errors.append((index, f"line {position} of this device is assigned twice"))
+            continue
+        resolved[device_id, position] = index, {
+            "did_id": did_id, "interface_id": interface_id, "label": row.get("label") or "",
+        }
+    if errors:
+        raise LineAssignmentError(errors)
+
+    with transaction.atomic():
+        device_ids = {device_id for device_id, _ in resolved}
+        phones = {phone.device_id: phone for phone in Phone.objects.filter(device_id__in=device_ids)}
+        new_phones = [Phone(device_id=device_id) for device_id in sorted(device_ids - set(phones))]
+        if new_phones and not create_phones:
+            raise LineAssignmentError([(None, f"{len(new_phones)} devices have no phone")])
+        Phone.objects.bulk_create(new_phones)
+        phones.update((phone.device_id, phone) for phone in new_phones)
+        # Attach the devices already loaded, so changelog reprs need no query per object.
+        for phone in phones.values():
+            phone.device = devices[phone.device_id]
+
+        existing = {
+            (line.phone_id, line.position): line
+            for line in Line.objects.filter(phone__in=list(phones.values())).select_for_update()
+        }
+        created, updated, updated_rows = [], [], []
+        now = timezone.now()
+        for (device_id, position), (index, values) in resolved.items():
+            phone = phones[device_id]
+            line = existing.get((phone.pk, position))
+            if line is None:
+                created.append(Line(phone=phone, position=position, **values))
+            elif any(getattr(line, name) != value for name, value in values.items()):
+                line.phone = phone
+                line.snapshot()
+                line.__dict__.update(values)
+                line.last_updated = now
+                updated.append(line)
+                updated_rows.append(index)
+
+        if user is not None and updated:
+            changeable = set(
+                Line.objects.restrict(user, "change").filter(pk__in=[line.pk for line in updated])
+                .values_list("pk", flat=True)
+            )
+            denied = [
+                (index, f"line {line.position} of this device may not be changed")
+                for index, line in zip(updated_rows, updated) if line.pk not in changeable
+            ]
+            if denied:
+                raise LineAssignmentError(denied)
+
+        Line.objects.bulk_create(created)
+        Line.objects.bulk_update(updated, [*LINE_FIELDS, "last_updated"])
+        _record_changes([*new_phones, *created], ObjectChangeActionChoices.ACTION_CREATE, user, request_id)
+        _record_changes(updated, ObjectChangeActionChoices.ACTION_UPDATE, user, request_id)
+
+    return {
+        "phones_created": len(new_phones),
+        "created": len(created),
+        "updated": len(updated),
+        "unchanged": len(resolved) - len(created) - len(updated),
+    }
@@ -0,0 +1,47 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from netbox_plugin_voip.lines import LineAssignmentError, assign_lines
+
+COLUMNS = ("device", "serial", "position", "did", "partition", "interface", "label")
+
+
+class Command(BaseCommand):
+    help = "Assign DIDs to phone lines from a CSV file with columns: " + ", ".join(COLUMNS)
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file with a header row; unknown columns are ignored")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows resolved and written per batch")
+        parser.add_argument("--no-create-phones", action="store_true",
+                            help="Reject devices that are not phones yet instead of creating them")
+
+    def handle(self, *args, **options):
+        with open(options["path"], newline="") as f:
+            rows = [
+                {name: value for name, value in row.items() if name in COLUMNS and value != ""}
+                for row in csv.DictReader(f)
+            ]
+        started = time.monotonic()
+        totals = {}
+        with CaptureQueriesContext(connection) as queries:
+            for start in range(0, len(rows), options["batch_size"]):
+                try:
+                    counts = assign_lines(
+                        rows[start:start + options["batch_size"]],
+                        create_phones=not options["no_create_phones"],
+                    )
+                except LineAssignmentError as e:
+                    for index, message in e.errors[:20]:
+                        line = "" if index is None else f"line {start + index + 2}: "
+                        self.stderr.write(f"{line}{message}")
+                    raise CommandError(f"{len(e.errors)} invalid rows; batch starting at row {start + 1} not applied")
+                for name, count in counts.items():
+                    totals[name] = totals.get(name, 0) + count
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(rows)} rows in {time.monotonic() - started:.1f}s with {len(queries)} queries: "
+            + ", ".join(f"{name}={count}" for name, count in totals.items())
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_plugin_voip.audit import DEFAULT_CHUNK_SIZE, enqueue_audit, run_audit, start_run
+from netbox_plugin_voip.models import DIDAuditRun
+
+
+class Command(BaseCommand):
+    help = "Audit DIDNumbers for invalid numbers, impossible E.164 lengths, duplicates and orphaned providers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--resume", type=int, metavar="RUN_ID", help="Resume an interrupted audit run")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+        parser.add_argument("--background", action="store_true", help="Enqueue the audit as an RQ job")
+
+    def handle(self, *args, **options):
+        if options["resume"]:
+            try:
+                run = DIDAuditRun.objects.get(pk=options["resume"])
+            except DIDAuditRun.DoesNotExist:
+                raise CommandError(f"Audit run {options['resume']} does not exist")
+        else:
+            run = start_run(chunk_size=options["chunk_size"])
+
+        if options["background"]:
+            job = enqueue_audit(run, workers=options["workers"])
+            self.stdout.write(f"Enqueued {run} as job {job.id}")
+            return
+
+        def progress(run):
+            self.stdout.write(f"{run}: checked through pk {run.completed_through} of {run.max_pk}", ending="\r")
+
+        run = run_audit(run.pk, workers=options["workers"], progress=progress)
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"{run}: {run.rows_checked} DIDs checked, {run.findings.count()} findings"
+        ))
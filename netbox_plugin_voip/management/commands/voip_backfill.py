@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_plugin_voip.backfill import (
+    BackfillError, get_backfill, pause_backfill, registry, reset_backfill, run_backfill,
+)
+from netbox_plugin_voip.models import BackfillState
+
+
+class Command(BaseCommand):
+    help = "Run, resume, pause or list online batched backfills of plugin data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", nargs="?", help="Registered backfill to run")
+        parser.add_argument("--list", action="store_true", help="List registered backfills and their checkpoints")
+        parser.add_argument("--pause", action="store_true", help="Stop a running backfill after its current batch")
+        parser.add_argument("--reset", action="store_true", help="Discard the checkpoint and start over")
+        parser.add_argument("--force", action="store_true",
+                            help="Take over a backfill left running by a process that no longer exists")
+        parser.add_argument("--batch-size", type=int, help="Rows per batch (default: backfill_batch_size)")
+        parser.add_argument("--sleep", type=float, help="Seconds between batches (default: backfill_sleep)")
+        parser.add_argument("--max-lag", type=float,
+                            help="Wait while replica lag exceeds this many seconds (default: backfill_max_replica_lag)")
+
+    def handle(self, *args, **options):
+        if options["list"] or not options["name"]:
+            states = {state.name: state for state in BackfillState.objects.all()}
+            for name in sorted(registry):
+                state = states.get(name)
+                status = f"{state.status}, {state.rows_processed} rows, last pk {state.last_pk}" if state else "not started"
+                self.stdout.write(f"{name}: {registry[name].description} ({status})")
+            return
+
+        name = options["name"]
+        try:
+            get_backfill(name)
+        except BackfillError as e:
+            raise CommandError(e)
+        if options["pause"]:
+            if pause_backfill(name):
+                self.stdout.write(f"Pausing {name} after its current batch")
+            else:
+                self.stdout.write(f"{name} is not running")
+            return
+        if options["reset"]:
+            reset_backfill(name)
+
+        def progress(report):
+            eta = report.eta_seconds
+            self.stdout.write(
+                f"{name}: {report.state.rows_processed} rows ({report.state.rows_changed} changed), "
+                f"last pk {report.state.last_pk}, {report.rows_per_second:.0f} rows/s, "
+                f"replica lag {report.lag:.1f}s" + (f", ~{eta:.0f}s left" if eta is not None else "")
+            )
+
+        try:
+            state = run_backfill(
+                name, batch_size=options["batch_size"], sleep=options["sleep"], max_lag=options["max_lag"],
+                progress=progress, force=options["force"],
+            )
+        except BackfillError as e:
+            raise CommandError(e)
+        except KeyboardInterrupt:
+            self.stdout.write(f"{name} paused; run the command again to resume")
+            return
+        self.stdout.write(self.style.SUCCESS(f"{name}: {state.status} at pk {state.last_pk}"))
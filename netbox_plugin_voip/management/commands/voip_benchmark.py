@@ -0,0 +1,248 @@
+import json
+import platform
+import random
+import resource
+import time
+from datetime import datetime, timezone
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse
+
+from users.models import Token
+
+from netbox_plugin_voip.models import DIDNumbers
+from netbox_plugin_voip.utils import get_plugin_setting
+from netbox_plugin_voip.version import __version__
+
+API_LIST = "plugins-api:netbox_plugin_voip-api:didnumbers-list"
+API_DETAIL = "plugins-api:netbox_plugin_voip-api:didnumbers-detail"
+API_HISTORY = "plugins-api:netbox_plugin_voip-api:didhistory-list"
+# Imported DIDs use numbers outside the seeded range; the whole run is rolled back anyway.
+IMPORT_BASE_NUMBER = 9000000000
+# Nested GraphQL page of 1,000 DIDs (NetBox 3.0+). Its query count must not grow with the rows:
+# anything above the budget means a relation is being loaded per DID.
+GRAPHQL_QUERY = (
+    "query ($offset: Int) { did_list(limit: 1000, offset: $offset) { id did did_e164 partition "
+    "provider { id name } lines { position label phone { device { name } } interface { name } } } }"
+)
+GRAPHQL_QUERY_BUDGET = 10
+# Fast-path list reads (fastpath.py) and the serializer read of the same 1,000-DID page they are compared to.
+PAGE_SIZE = 1000
+FAST_PATH_BASELINE = "page_api_full"
+FAST_PATH_SCENARIOS = ("page_api_brief", "page_api_fields")
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(values, percent):
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the DID list, detail, filter, import, export, lookup and history paths; reports latency "
+        "percentiles, queries per request and peak RSS. All writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--export-rows", type=int, default=10000, help="Rows per export request")
+        parser.add_argument("--import-size", type=int, default=100, help="DIDs per import request")
+        parser.add_argument("--scenario", action="append", help="Run only these scenarios (repeatable)")
+        parser.add_argument("--output", help="Write results as JSON to this file")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def sample(self, count):
+        bounds = DIDNumbers.objects.order_by("pk").values_list("pk", flat=True)
+        first, last = bounds.first(), bounds.last()
+        if first is None:
+            raise CommandError("No DIDs to benchmark; run voip_seed_dids first")
+        pks = random.sample(range(first, last + 1), min(count * 2, last - first + 1))
+        rows = list(DIDNumbers.objects.filter(pk__in=pks).order_by().values_list("pk", "did", "partition")[:count])
+        return first, rows
+
+    def scenarios(self, options):
+        first_pk, rows = self.sample(options["iterations"])
+        partitions = sorted({partition for _, _, partition in rows})
+        numbers = [did.lstrip("+") for _, did, _ in rows]
+        list_url = reverse("plugins:netbox_plugin_voip:didnumbers_list")
+        api_list_url = reverse(API_LIST)
+        history_url = reverse(API_HISTORY)
+        now = datetime.now(timezone.utc).isoformat()
+        export_rows = options["export_rows"]
+        imported = iter(range(IMPORT_BASE_NUMBER, IMPORT_BASE_NUMBER + 10 ** 9, options["import_size"]))
+
+        def page_offset(i):
+            return PAGE_SIZE * (i % 10)
+
+        def import_batch(i):
+            base = next(imported)
+            payload = [
+                {"did": f"+1{base + n}", "partition": "bench-import"} for n in range(options["import_size"])
+            ]
+            return "post", api_list_url, json.dumps(payload)
+
+        scenarios = {
+            "list_ui": lambda i: ("get", list_url, {"page": 1 + i % 100}),
+            "list_api": lambda i: ("get", api_list_url, {"limit": 50, "offset": 50 * (i % 100)}),
+            "detail_ui": lambda i: (
+                "get", reverse("plugins:netbox_plugin_voip:voipview", args=[rows[i % len(rows)][0]]), {}
+            ),
+            FAST_PATH_BASELINE: lambda i: ("get", api_list_url, {"limit": PAGE_SIZE, "offset": page_offset(i)}),
+            "page_api_brief": lambda i: (
+                "get", api_list_url, {"limit": PAGE_SIZE, "offset": page_offset(i), "brief": 1}
+            ),
+            "page_api_fields": lambda i: (
+                "get", api_list_url,
+                {"limit": PAGE_SIZE, "offset": page_offset(i), "fields": "id,url,did,partition,provider,last_updated"},
+            ),
+            "detail_api": lambda i: ("get", reverse(API_DETAIL, args=[rows[i % len(rows)][0]]), {}),
+            "filter_ui": lambda i: ("get", list_url, {"partition": partitions[i % len(partitions)]}),
+            "filter_api": lambda i: (
+                "get", api_list_url, {"partition": partitions[i % len(partitions)], "q": numbers[i % len(numbers)][:6]}
+            ),
+            "export": lambda i: (
+                "get", list_url,
+                {"export": "table", "id__gte": first_pk + i * export_rows, "id__lt": first_pk + (i + 1) * export_rows},
+            ),
+            "import": import_batch,
+            "history_api": lambda i: ("get", history_url, {"number": numbers[i % len(numbers)]}),
+            "as_of_api": lambda i: ("get", history_url, {"number": numbers[i % len(numbers)], "at": now}),
+            "lookup_sync": lambda i: (
+                "get", reverse("plugins:netbox_plugin_voip:resolve_sync", args=[numbers[i % len(numbers)]]), {}
+            ),
+            "lookup_async": lambda i: (
+                "get", reverse("plugins:netbox_plugin_voip:resolve", args=[numbers[i % len(numbers)]]), {}
+            ),
+        }
+        try:
+            graphql_url = reverse("graphql")
+        except NoReverseMatch:
+            # NetBox before 3.0 has no GraphQL API.
+            return scenarios
+        scenarios["graphql_api"] = lambda i: (
+            "post", graphql_url, json.dumps({"query": GRAPHQL_QUERY, "variables": {"offset": 1000 * (i % 10)}})
+        )
+        return scenarios
+
+    def measure(self, client, build, iterations, headers):
+        timings, queries, errors = [], [], 0
+        for i in range(iterations):
+            method, path, data = build(i)
+            kwargs = {"content_type": "application/json"} if method == "post" else {}
+            send = getattr(client, method)
+            if isinstance(client, AsyncClient):
+                # The view runs on an event loop as under an ASGI server. The resolver's sync_to_async calls
+                # are thread-sensitive, so under async_to_sync they run on this thread and its connection:
+                # their queries are captured and rolled back like the others.
+                send = async_to_sync(send)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = send(path, data, **kwargs, **headers)
+                # Streaming responses (exports) are only complete once consumed.
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                timings.append(time.perf_counter() - started)
+            queries.append(len(captured))
+            if response.status_code >= 400:
+                errors += 1
+        timings.sort()
+        return {
+            "iterations": iterations,
+            "errors": errors,
+            "p50_ms": round(_percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(_percentile(timings, 95) * 1000, 3),
+            "p99_ms": round(_percentile(timings, 99) * 1000, 3),
+            "max_ms": round(timings[-1] * 1000, 3),
+            "queries_mean": round(sum(queries) / len(queries), 2),
+            "queries_max": max(queries),
+            # ru_maxrss is in KiB on Linux.
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT version()")
+            database = cursor.fetchone()[0]
+        results = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "dids": DIDNumbers.objects.count(),
+                "partitions": DIDNumbers.objects.order_by().values("partition").distinct().count(),
+                "plugin_version": __version__,
+                "netbox_version": settings.VERSION,
+                "python": platform.python_version(),
+                "database": database,
+                "iterations": options["iterations"],
+            },
+            "scenarios": {},
+        }
+
+        try:
+            with transaction.atomic():
+                user = User.objects.create_superuser("voip-benchmark", password=None)
+                token = Token.objects.create(user=user)
+                ui_client, api_client = Client(), Client()
+                ui_client.force_login(user)
+                api_headers = {"HTTP_AUTHORIZATION": f"Token {token.key}", "HTTP_ACCEPT": "application/json"}
+                resolve_token = get_plugin_setting("resolve_token")
+                lookup_headers = {"HTTP_X_RESOLVE_TOKEN": resolve_token} if resolve_token else {}
+
+                for name, build in self.scenarios(options).items():
+                    if options["scenario"] and name not in options["scenario"]:
+                        continue
+                    iterations = options["iterations"]
+                    if name in ("export", "import"):
+                        iterations = max(iterations // 20, 3)
+                    if name.endswith("_api") or name == "import":
+                        client, headers = api_client, api_headers
+                    elif name == "lookup_async":
+                        # AsyncClient takes plain header names rather than WSGI environ keys.
+                        client = AsyncClient()
+                        headers = {"x-resolve-token": resolve_token} if resolve_token else {}
+                    elif name.startswith("lookup"):
+                        client, headers = api_client, lookup_headers
+                    else:
+                        client, headers = ui_client, {}
+                    results["scenarios"][name] = self.measure(client, build, iterations, headers)
+                    if not options["json"]:
+                        self.stderr.write(f"{name} done")
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        baseline = results["scenarios"].get(FAST_PATH_BASELINE)
+        if baseline:
+            results["fast_path_speedup"] = {
+                name: round(baseline["p50_ms"] / results["scenarios"][name]["p50_ms"], 2)
+                for name in FAST_PATH_SCENARIOS if results["scenarios"].get(name, {}).get("p50_ms")
+            }
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+        graphql_queries = results["scenarios"].get("graphql_api", {}).get("queries_max", 0)
+        if graphql_queries > GRAPHQL_QUERY_BUDGET:
+            raise CommandError(
+                f"graphql_api ran {graphql_queries} queries for one page, over its budget of "
+                f"{GRAPHQL_QUERY_BUDGET}: a relation is being loaded per DID"
+            )
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{results['meta']['dids']} DIDs, {results['meta']['partitions']} partitions")
+        for name, result in results["scenarios"].items():
+            self.stdout.write(
+                f"{name:<15} p50 {result['p50_ms']:>9} ms  p95 {result['p95_ms']:>9} ms  p99 {result['p99_ms']:>9} ms  "
+                f"{result['queries_mean']:>6} queries  {result['peak_rss_mb']:>7} MB  ({result['errors']} errors)"
+            )
+        for name, speedup in results.get("fast_path_speedup", {}).items():
+            self.stdout.write(f"{name} is {speedup}x faster than {FAST_PATH_BASELINE} at p50")
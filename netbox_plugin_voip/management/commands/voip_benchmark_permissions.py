@@ -0,0 +1,90 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from users.models import ObjectPermission
+from utilities.querysets import RestrictedQuerySet
+
+from netbox_plugin_voip.models import DIDNumbers
+from netbox_plugin_voip.tables import DIDNumbersTable
+
+PAGE_SIZE = 50
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DID list latency for constrained and unconstrained users, with NetBox's "
+        "RestrictedQuerySet.restrict() and with the plugin's cached permission filters"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument(
+            "--constraints", type=int, default=20,
+            help="Partition constraints granted to the constrained user, one ObjectPermission each",
+        )
+
+    def make_user(self, name, constraint_sets):
+        user = User.objects.create(username=name)
+        content_type = ContentType.objects.get_for_model(DIDNumbers)
+        for i, constraints in enumerate(constraint_sets):
+            permission = ObjectPermission.objects.create(name=f"{name}-{i}", actions=["view"], constraints=constraints)
+            permission.object_types.add(content_type)
+            permission.users.add(user)
+        # Fresh instance, so neither path starts with NetBox's per-request permission cache.
+        return User.objects.get(pk=user.pk)
+
+    def measure(self, restrict, user, iterations):
+        timings, queries = [], 0
+        for _ in range(iterations):
+            fresh_user = User.objects.get(pk=user.pk)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                queryset = restrict(fresh_user).select_related("provider").only(*DIDNumbersTable.queryset_fields)
+                list(queryset[:PAGE_SIZE])
+                timings.append(time.perf_counter() - started)
+            queries = len(captured)
+        timings.sort()
+        return {
+            "p50_ms": round(statistics.median(timings) * 1000, 2),
+            "p95_ms": round(timings[int(len(timings) * 0.95) - 1] * 1000, 2),
+            "queries": queries,
+        }
+
+    def handle(self, *args, **options):
+        partitions = list(
+            DIDNumbers.objects.order_by().values_list("partition", flat=True).distinct()[:options["constraints"]]
+        )
+        results = {}
+        try:
+            with transaction.atomic():
+                users = {
+                    "unconstrained": self.make_user("voip-bench-unconstrained", [None]),
+                    "constrained": self.make_user(
+                        "voip-bench-constrained", [{"partition": partition} for partition in partitions] or [{"pk": 0}]
+                    ),
+                }
+                paths = {
+                    "netbox": lambda user: RestrictedQuerySet.restrict(DIDNumbers.objects.all(), user, "view"),
+                    "cached": lambda user: DIDNumbers.objects.restrict(user, "view"),
+                }
+                for user_name, user in users.items():
+                    for path_name, restrict in paths.items():
+                        results[f"{user_name}/{path_name}"] = self.measure(restrict, user, options["iterations"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<28} p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  {result['queries']} queries"
+            )
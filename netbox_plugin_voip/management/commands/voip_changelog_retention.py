@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from netbox_plugin_voip.retention import compact_changes, purge_changes
+
+
+class Command(BaseCommand):
+    help = "Compact and purge the plugin's changelog according to its retention settings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--compact-after", type=int, help="Days (default: changelog_compact_after_days)")
+        parser.add_argument("--retention", type=int, help="Days (default: changelog_retention_days)")
+        parser.add_argument("--batch-size", type=int, help="Default: changelog_batch_size")
+        parser.add_argument("--sleep", type=float, default=0, help="Seconds to pause between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would go")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        kwargs = {"batch_size": options["batch_size"], "sleep": options["sleep"], "dry_run": options["dry_run"]}
+        # Purge first, so compaction does not rewrite rows that are about to be deleted.
+        purged = purge_changes(days=options["retention"], **kwargs)
+        compacted = compact_changes(days=options["compact_after"], **kwargs)
+        verb = "Would remove" if options["dry_run"] else "Removed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {purged} expired and {compacted} compacted changes in {time.monotonic() - started:.1f}s"
+        ))
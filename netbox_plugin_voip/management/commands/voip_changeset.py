@@ -0,0 +1,94 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_plugin_voip.changesets import (
+    STAGED_FIELDS, ChangeSetError, apply_changeset, rollback_changeset, stage_changes, validate_changeset,
+)
+from netbox_plugin_voip.models import ChangeSet
+
+# CSV columns naming the target; the new number and partition of an update go in new_did and new_partition.
+TARGET_COLUMNS = ("action", "did", "partition")
+RENAMED_COLUMNS = {"new_did": "did", "new_partition": "partition"}
+
+
+def _read_rows(path):
+    """Read staged changes from CSV; an empty cell leaves that field unchanged."""
+    rows = []
+    with open(path, newline="") as f:
+        for record in csv.DictReader(f):
+            data = {}
+            for column, value in record.items():
+                name = RENAMED_COLUMNS.get(column, column)
+                if column not in TARGET_COLUMNS and name in STAGED_FIELDS and value != "":
+                    data[name] = value
+            rows.append({"action": record["action"], "did": record["did"], "partition": record.get("partition"),
+                         "data": data})
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stage DID changes ahead of a maintenance window and apply them in one batch. "
+        "Steps: stage, validate, apply; rollback undoes an applied change set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=("stage", "validate", "apply", "rollback", "show"))
+        parser.add_argument("name", help="Change set name; stage creates it if needed")
+        parser.add_argument(
+            "path", nargs="?",
+            help="CSV for stage, with columns action (create, update, delete), did, partition and any of "
+                 "new_did, new_partition, description, provider (name), route_option, called_party_mask",
+        )
+        parser.add_argument("--description", default="")
+        parser.add_argument("--force", action="store_true",
+                            help="Apply or roll back even if targets changed since validation")
+
+    def handle(self, *args, **options):
+        action, name = options["action"], options["name"]
+        started = time.monotonic()
+        try:
+            if action == "stage":
+                if not options["path"]:
+                    raise CommandError("stage needs a CSV path")
+                changeset, _ = ChangeSet.objects.get_or_create(
+                    name=name, defaults={"description": options["description"]}
+                )
+                count = stage_changes(changeset, _read_rows(options["path"]))
+                self.stdout.write(f"Staged {count} changes in {name}; now run: voip_changeset validate {name}")
+                return
+            try:
+                changeset = ChangeSet.objects.get(name=name)
+            except ChangeSet.DoesNotExist:
+                raise CommandError(f"No change set named {name!r}")
+
+            if action == "validate":
+                invalid = validate_changeset(changeset)
+                for change in changeset.changes.exclude(error="")[:20]:
+                    self.stderr.write(f"{change.action} {change.did} ({change.partition}): {change.error}")
+                if invalid:
+                    raise CommandError(f"{invalid} invalid changes; fix them and stage a new change set")
+                self.stdout.write(self.style.SUCCESS(
+                    f"{changeset.changes.count()} changes valid in {time.monotonic() - started:.1f}s"
+                ))
+            elif action in ("apply", "rollback"):
+                run = apply_changeset if action == "apply" else rollback_changeset
+                created, updated, deleted = run(changeset, force=options["force"])
+                self.stdout.write(self.style.SUCCESS(
+                    f"Created {created}, updated {updated} and deleted {deleted} DIDs "
+                    f"in {time.monotonic() - started:.1f}s"
+                ))
+            else:
+                counts = {}
+                for change_action in changeset.changes.values_list("action", flat=True):
+                    counts[change_action] = counts.get(change_action, 0) + 1
+                self.stdout.write(f"{changeset.name}: {changeset.status}")
+                for label, value in (("validated", changeset.validated), ("applied", changeset.applied),
+                                     ("rolled back", changeset.rolled_back)):
+                    if value:
+                        self.stdout.write(f"  {label} {value:%Y-%m-%d %H:%M:%S}")
+                self.stdout.write("  " + ", ".join(f"{count} {label}" for label, count in sorted(counts.items())))
+        except ChangeSetError as e:
+            raise CommandError(e)
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_plugin_voip.events import Dispatcher, metrics
+from netbox_plugin_voip.utils import get_plugin_setting
+
+
+class Command(BaseCommand):
+    help = "Deliver coalesced DID change events to the configured event_endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Flush the buffer once and exit")
+        parser.add_argument("--window", type=float, help="Seconds between flushes (default: event_window)")
+        parser.add_argument("--concurrency", type=int, help="Concurrent POSTs (default: event_concurrency)")
+        parser.add_argument("--batch-size", type=int, help="Events per POST (default: event_batch_size)")
+
+    def handle(self, *args, **options):
+        if not get_plugin_setting("event_endpoints"):
+            raise CommandError("No event_endpoints are configured; nothing is being buffered")
+        window = options["window"] or get_plugin_setting("event_window")
+        dispatcher = Dispatcher(concurrency=options["concurrency"], batch_size=options["batch_size"])
+        try:
+            while True:
+                started = time.monotonic()
+                delivered, failed = dispatcher.flush()
+                if delivered or failed or options["verbosity"] > 1:
+                    style = self.style.WARNING if failed else self.style.SUCCESS
+                    self.stdout.write(style(
+                        f"Delivered {delivered} events, {failed} batches requeued "
+                        f"in {time.monotonic() - started:.2f}s"
+                    ))
+                if options["once"]:
+                    break
+                time.sleep(max(window - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.close()
+        self.stdout.write(", ".join(f"{name}={value}" for name, value in sorted(metrics().items())))
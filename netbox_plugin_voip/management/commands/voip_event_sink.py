@@ -0,0 +1,78 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.events = 0
+        self.rejected = 0
+        self.actions = {}
+
+
+def _handler(stats, fail_rate, delay, stdout):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if delay:
+                time.sleep(delay)
+            if random.random() < fail_rate:
+                with stats.lock:
+                    stats.rejected += 1
+                self._reply(503, b'{"detail": "unavailable"}')
+                return
+            events = json.loads(body)["events"]
+            with stats.lock:
+                stats.batches += 1
+                stats.events += len(events)
+                for event in events:
+                    stats.actions[event["action"]] = stats.actions.get(event["action"], 0) + 1
+                summary = f"batch of {len(events)}: {stats.events} events in {stats.batches} batches"
+            stdout.write(summary)
+            self._reply(204, b"")
+
+        def _reply(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = "Run a local HTTP endpoint that accepts DID change events, for testing voip_event_dispatcher"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8099)
+        parser.add_argument("--fail-rate", type=float, default=0, help="Fraction of POSTs answered with 503")
+        parser.add_argument("--delay", type=float, default=0, help="Seconds to wait before answering")
+
+    def handle(self, *args, **options):
+        stats = _Stats()
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", options["port"]),
+            _handler(stats, options["fail_rate"], options["delay"], self.stdout),
+        )
+        self.stdout.write(f"Accepting events on http://127.0.0.1:{options['port']}/ (Ctrl-C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        actions = ", ".join(f"{action}={count}" for action, count in sorted(stats.actions.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Received {stats.events} events in {stats.batches} batches, rejected {stats.rejected} ({actions})"
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from netbox_plugin_voip.cdr import ingest_path
+
+
+class Command(BaseCommand):
+    help = "Ingest CSV call detail records into per-DID daily usage counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="A CSV file, or a drop directory of *.csv files")
+        parser.add_argument(
+            "--keep", action="store_true",
+            help="Leave ingested files in a drop directory instead of moving them to processed/",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        ingester = ingest_path(options["path"], keep=options["keep"])
+        elapsed = time.monotonic() - started
+        rate = ingester.records / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {ingester.records} records ({ingester.matched} matched, {ingester.unmatched} unmatched, "
+            f"{ingester.invalid} invalid) in {elapsed:.1f}s, {rate:.0f} records/s"
+        ))
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from netbox_plugin_voip.models import DIDNumbers
+
+
+async def _fetch(reader, writer, host, path, headers):
+    """Send one keep-alive GET and return the status code."""
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n{headers}Connection: keep-alive\r\n\r\n"
+    writer.write(request.encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return status
+
+
+async def _worker(base_url, paths, headers, latencies, errors):
+    url = urlsplit(base_url)
+    port = url.port or (443 if url.scheme == "https" else 80)
+    reader, writer = await asyncio.open_connection(url.hostname, port, ssl=url.scheme == "https")
+    try:
+        for path in paths:
+            started = time.perf_counter()
+            status = await _fetch(reader, writer, url.netloc, path, headers)
+            latencies.append(time.perf_counter() - started)
+            if status >= 500:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def _run(base_url, paths, concurrency, headers):
+    latencies, errors = [], []
+    chunks = [paths[i::concurrency] for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker(base_url, chunk, headers, latencies, errors) for chunk in chunks if chunk))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3) if latencies else None,
+    }
+
+
+class Command(BaseCommand):
+    help = "Load test the async resolve view against the synchronous per-request lookup"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--async-url", default="http://127.0.0.1:8001",
+                            help="Base URL of a NetBox served under ASGI (e.g. uvicorn netbox.asgi:application)")
+        parser.add_argument("--sync-url", default="http://127.0.0.1:8000",
+                            help="Base URL of a NetBox served under WSGI or runserver")
+        parser.add_argument("--requests", type=int, default=10000)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--numbers", type=int, default=1000, help="Distinct DIDs to sample and cycle through")
+        parser.add_argument("--token", default="", help="Value for the X-Resolve-Token header")
+        parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+
+    def sample_numbers(self, count):
+        bounds = DIDNumbers.objects.order_by("pk").values_list("pk", flat=True)
+        first, last = bounds.first(), bounds.last()
+        if first is None:
+            raise CommandError("No DIDs to resolve; seed some data first")
+        pks = random.sample(range(first, last + 1), min(count * 2, last - first + 1))
+        numbers = list(DIDNumbers.objects.filter(pk__in=pks).values_list("did", flat=True)[:count])
+        return [number.lstrip("+") for number in numbers]
+
+    def handle(self, *args, **options):
+        numbers = self.sample_numbers(options["numbers"])
+        headers = f"X-Resolve-Token: {options['token']}\r\n" if options["token"] else ""
+        results = {}
+        for name, view, base_url in (
+            ("sync", "plugins:netbox_plugin_voip:resolve_sync", options["sync_url"]),
+            ("async", "plugins:netbox_plugin_voip:resolve", options["async_url"]),
+        ):
+            paths = [reverse(view, args=[numbers[i % len(numbers)]]) for i in range(options["requests"])]
+            # One warm-up pass fills the async index the way steady SBC traffic would.
+            asyncio.run(_run(base_url, paths[:len(numbers)], options["concurrency"], headers))
+            results[name] = asyncio.run(_run(base_url, paths, options["concurrency"], headers))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:>5}: {result['requests_per_second']:>9} req/s  p50 {result['p50_ms']} ms  "
+                f"p99 {result['p99_ms']} ms  ({result['errors']} errors)"
+            )
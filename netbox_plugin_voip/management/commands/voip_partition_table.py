@@ -0,0 +1,56 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_plugin_voip.partitioning import (
+    BACKFILL_NAME, STRATEGY_KEYS, PartitioningError, abort, add_partition, drop_old_table, is_partitioned,
+    prepare, retire_partition, swap,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Migrate the DID table to PostgreSQL declarative partitioning and manage its partitions. "
+        "Steps: prepare, copy, swap, then drop-old once satisfied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action", choices=("status", "prepare", "copy", "swap", "drop-old", "abort", "add", "retire"),
+        )
+        parser.add_argument("partition", nargs="?", help="Route partition for add and retire")
+        parser.add_argument("--strategy", choices=sorted(STRATEGY_KEYS), default="list",
+                            help="list: one child per route partition; hash: by did")
+        parser.add_argument("--modulus", type=int, default=16, help="Child tables for the hash strategy")
+        parser.add_argument("--no-verify", action="store_true", help="Skip the row count check when swapping")
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument("--sleep", type=float)
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        if action in ("add", "retire") and options["partition"] is None:
+            raise CommandError(f"{action} needs a partition name")
+        try:
+            if action == "status":
+                self.stdout.write("partitioned" if is_partitioned() else "not partitioned")
+            elif action == "prepare":
+                prepare(options["strategy"], modulus=options["modulus"])
+                self.stdout.write("Staging table ready and mirroring writes; now run: voip_partition_table copy")
+            elif action == "copy":
+                call_command(
+                    "voip_backfill", BACKFILL_NAME, batch_size=options["batch_size"], sleep=options["sleep"],
+                    stdout=self.stdout, stderr=self.stderr,
+                )
+            elif action == "swap":
+                swap(verify=not options["no_verify"])
+                self.stdout.write(self.style.SUCCESS("The DID table is now partitioned"))
+            elif action == "drop-old":
+                drop_old_table()
+            elif action == "abort":
+                abort()
+            elif action == "add":
+                self.stdout.write(f"Created {add_partition(options['partition'])}")
+            elif action == "retire":
+                count = retire_partition(options["partition"])
+                self.stdout.write(self.style.SUCCESS(f"Dropped {count} DIDs in {options['partition']!r}"))
+        except PartitioningError as e:
+            raise CommandError(e)
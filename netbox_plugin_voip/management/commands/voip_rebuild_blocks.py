@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from netbox_plugin_voip.blocks import rebuild_blocks
+
+
+class Command(BaseCommand):
+    help = "Recompute all number-block utilization bitmaps from DIDNumbers"
+
+    def handle(self, *args, **options):
+        count = rebuild_blocks()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} number blocks"))
@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from circuits.models import Provider
+
+from netbox_plugin_voip import history
+from netbox_plugin_voip.backfill import reset_backfill, run_backfill
+from netbox_plugin_voip.blocks import rebuild_blocks
+from netbox_plugin_voip.bulk import _clear_dependents
+from netbox_plugin_voip.models import DIDNumbers
+from netbox_plugin_voip.versioning import bump_versions
+
+PARTITION_PREFIX = "bench-"
+PROVIDER_PREFIX = "bench-provider-"
+# Seeded numbers are +1 followed by BASE_NUMBER + n, i.e. +12000000000 upwards.
+BASE_NUMBER = 2000000000
+INSERT_BATCH = 1000000
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic DIDNumbers spread across partitions and providers for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000)
+        parser.add_argument("--partitions", type=int, default=20)
+        parser.add_argument("--providers", type=int, default=10)
+        parser.add_argument("--reset", action="store_true", help="Delete previously seeded DIDs first")
+        parser.add_argument("--skip-formats", action="store_true",
+                            help="Leave the display formats empty instead of running the did-formats backfill")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Seeding uses generate_series and needs PostgreSQL")
+        if options["partitions"] < 1 or options["providers"] < 1:
+            raise CommandError("--partitions and --providers must be at least 1")
+        started = time.monotonic()
+        seeded = DIDNumbers.objects.filter(partition__startswith=PARTITION_PREFIX)
+
+        if options["reset"]:
+            with transaction.atomic():
+                _clear_dependents(seeded.values("pk"))
+                deleted = seeded._raw_delete(seeded.db)
+            self.stdout.write(f"Deleted {deleted} seeded DIDs")
+
+        provider_pks = [
+            Provider.objects.get_or_create(name=f"{PROVIDER_PREFIX}{i}", defaults={"slug": f"{PROVIDER_PREFIX}{i}"})[0].pk
+            for i in range(options["providers"])
+        ]
+        # Continue numbering after existing seeded rows so repeated runs without --reset top up.
+        start = seeded.count()
+        stop = start + options["count"]
+        table = DIDNumbers._meta.db_table
+        with connection.cursor() as cursor:
+            for batch_start in range(start, stop, INSERT_BATCH):
+                batch_stop = min(batch_start + INSERT_BATCH, stop)
+                cursor.execute(
+                    f"INSERT INTO {table} "
+                    f"(created, last_updated, did, description, partition, provider_id, route_option, called_party_mask) "
+                    f"SELECT now()::date, now(), '+1' || (%s + n)::text, '', %s || (n %% %s)::text, "
+                    f"       (%s::int[])[1 + n %% %s], n %% 3 = 0, NULL "
+                    f"FROM generate_series(%s, %s) AS n",
+                    [BASE_NUMBER, PARTITION_PREFIX, options["partitions"], provider_pks, len(provider_pks),
+                     batch_start, batch_stop - 1],
+                )
+                self.stdout.write(f"Inserted {batch_stop - start} of {options['count']}", ending="\r")
+            cursor.execute(f"ANALYZE {table}")
+        self.stdout.write("")
+
+        if not options["skip_formats"]:
+            reset_backfill("did-formats")
+            run_backfill("did-formats", batch_size=10000, sleep=0)
+        blocks = rebuild_blocks()
+        with transaction.atomic():
+            history.sync()
+        bump_versions([f"{PARTITION_PREFIX}{i}" for i in range(options["partitions"])])
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['count']} DIDs across {options['partitions']} partitions and "
+            f"{options['providers']} providers ({blocks} number blocks) in {time.monotonic() - started:.1f}s"
+        ))
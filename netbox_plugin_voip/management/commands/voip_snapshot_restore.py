@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_plugin_voip.snapshot import SnapshotError, restore_snapshot
+
+
+class Command(BaseCommand):
+    help = "Restore plugin data from a snapshot written by voip_snapshot_export"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Snapshot file to load")
+        parser.add_argument("--replace", action="store_true", help="Truncate the plugin tables before loading")
+        parser.add_argument("--create-providers", action="store_true",
+                            help="Create providers missing locally instead of loading their DIDs without one")
+        parser.add_argument("--maintenance-work-mem", default="1GB",
+                            help="maintenance_work_mem for rebuilding indexes after the load")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            manifest, missing = restore_snapshot(
+                options["path"],
+                replace=options["replace"],
+                create_providers=options["create_providers"],
+                maintenance_work_mem=options["maintenance_work_mem"],
+            )
+        except SnapshotError as e:
+            raise CommandError(e)
+        for table in manifest["tables"]:
+            self.stdout.write(f"{table['model']}: {table['rows']} rows")
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f"Providers not found locally, DIDs loaded without a provider: {', '.join(sorted(missing))}"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored snapshot from {manifest['created']} in {time.monotonic() - started:.1f}s"
+        ))
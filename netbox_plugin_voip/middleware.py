@@ -0,0 +1,12 @@
+from .routers import SAFE_METHODS, request_scope
+
+
+class ReplicaPinningMiddleware:
+    """Scope read-replica pinning to one request; non-safe methods read from the primary throughout."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_scope(pinned=request.method not in SAFE_METHODS):
+            return self.get_response(request)
@@ -1,18 +1,44 @@
 from django.db import models
+from django.contrib.postgres.fields import DateTimeRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
 from django.db.models.deletion import SET_NULL
 from django.urls import reverse
 
 from netbox.models import PrimaryModel 
+from extras.choices import ObjectChangeActionChoices
 from extras.utils import extras_features
 from netbox.models import ChangeLoggedModel
+from utilities.permissions import permission_is_exempt
 from utilities.querysets import RestrictedQuerySet
 
+from .choices import AuditRuleChoices, AuditStatusChoices, BackfillStatusChoices, ChangeSetStatusChoices
+from .formatting import FORMAT_FIELDS, format_did
+from .permissions import DENIED, UNCONSTRAINED, get_permission_filter
+
 number_validator = RegexValidator(
     r"^\+?[0-9A-D\#\*]*$",
     "DIDs can only contain: leading +, digits 0-9; chars A, B, C, D; # and *"
 )
 
+class DIDNumbersQuerySet(RestrictedQuerySet):
+    """RestrictedQuerySet whose restrict() uses the cached, compiled DID permission filters."""
+
+    def restrict(self, user, action="view"):
+        permission_required = f"{self.model._meta.app_label}.{action}_{self.model._meta.model_name}"
+        if user.is_superuser or permission_is_exempt(permission_required):
+            return self
+        if not user.is_authenticated or not user.is_active:
+            return self.none()
+        compiled = get_permission_filter(user, self.model, action)
+        if compiled == DENIED:
+            return self.none()
+        if compiled == UNCONSTRAINED:
+            return self
+        return self.filter(compiled)
+
+
 class DIDNumbers(ChangeLoggedModel):
     """A DID represents a single telephone number of an arbitrary format.
     A DID can contain only valid DTMF characters and leading plus sign for E.164 support:
@@ -25,21 +51,315 @@ class DIDNumbers(ChangeLoggedModel):
     Partition is a mandatory option representing a number partition. DID and Partition are globally unique.
     A DID can optionally be assigned with Provider and Region relations.
     A DID can contain an optional Description.
+    A DID's Site and Location normally come from the SiteAssignment of its longest matching
+    number prefix; setting them on the DID overrides that (see sites.py).
     A DID can optionally be tagged with Tags.
     """
-    #site = models.ForeignKey(to="dcim.Site", on_delete=models.SET_NULL, blank=True, null=True)
     did = models.CharField(max_length=32,validators=[number_validator])
     description = models.CharField(max_length=200, blank=True)
     provider = models.ForeignKey(to="circuits.Provider",on_delete=models.SET_NULL,blank=True,null=True,related_name="provider_set")
     partition = models.CharField(max_length=200,blank=True)
     route_option = models.BooleanField(blank=True,null=True)
     called_party_mask = models.IntegerField(blank=True,null=True)
+    # Display formats, maintained by save() and the did-formats backfill (see formatting.py).
+    did_e164 = models.CharField(max_length=32, blank=True, null=True, editable=False, verbose_name="E.164")
+    did_national = models.CharField(max_length=40, blank=True, null=True, editable=False)
+    did_international = models.CharField(max_length=40, blank=True, null=True, editable=False)
+    country_code = models.PositiveSmallIntegerField(blank=True, null=True, editable=False)
+    region_code = models.CharField(max_length=2, blank=True, null=True, editable=False)
+    # Per-DID overrides of the site and location inherited from SiteAssignment prefixes.
+    site = models.ForeignKey(
+        to="dcim.Site", on_delete=models.SET_NULL, blank=True, null=True, related_name="voip_dids"
+    )
+    location = models.ForeignKey(
+        to="dcim.Location", on_delete=models.SET_NULL, blank=True, null=True, related_name="voip_dids"
+    )
 
     class Meta:
+        ordering = ("did", "partition")
         unique_together = ("did","partition",)
+        indexes = [
+            # Lets did__startswith (LIKE 'prefix%') range-scan whatever the database collation.
+            models.Index(fields=["did"], name="voip_did_prefix_idx", opclasses=["varchar_pattern_ops"]),
+        ]
     
+    objects = DIDNumbersQuerySet.as_manager()
+
+    def __str__(self):
+        return self.did
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored number and partition so post_save can tell what moved.
+        instance._loaded_values = {name: instance.__dict__.get(name) for name in ("did", "partition")}
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding or getattr(self, "_loaded_values", {}).get("did") != self.did:
+            self.__dict__.update(format_did(self.did))
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], *FORMAT_FIELDS}
+        super().save(*args, **kwargs)
+        # post_save receivers have compared against the old values by now.
+        self._loaded_values = {"did": self.did, "partition": self.partition}
+
+    def get_absolute_url(self):
+        return reverse("plugins:netbox_plugin_voip:voipview", args=[self.pk])
+
+
+class SiteAssignment(ChangeLoggedModel):
+    """Site and optional location of every DID whose digits start with ``prefix``.
+
+    The longest matching prefix wins, so a block can be carved out of a larger
+    range. ``prefix`` is digits only; DIDs match with or without their leading "+".
+    """
+    prefix = models.CharField(
+        max_length=32, unique=True, validators=[RegexValidator(r"^[0-9]+$", "Prefixes contain digits only")]
+    )
+    site = models.ForeignKey(to="dcim.Site", on_delete=models.CASCADE, related_name="voip_site_assignments")
+    location = models.ForeignKey(
+        to="dcim.Location", on_delete=models.SET_NULL, blank=True, null=True,
+        related_name="voip_site_assignments",
+    )
+    description = models.CharField(max_length=200, blank=True)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("prefix",)
+
+    def __str__(self):
+        return self.prefix
+
+
+class Phone(ChangeLoggedModel):
+    """A dcim.Device used as a phone. Its lines are the DIDs it answers, one per button position."""
+    device = models.OneToOneField(to="dcim.Device", on_delete=models.CASCADE, related_name="voip_phone")
+    description = models.CharField(max_length=200, blank=True)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("device",)
+
+    def __str__(self):
+        return str(self.device)
+
+
+class Line(ChangeLoggedModel):
+    """One line appearance on a phone: the DID at a button position, optionally bound to an interface.
+
+    Several phones may share a DID (shared lines). Deleting the DID leaves the line unassigned.
+    """
+    phone = models.ForeignKey(to=Phone, on_delete=models.CASCADE, related_name="lines")
+    position = models.PositiveSmallIntegerField(default=1)
+    did = models.ForeignKey(to=DIDNumbers, on_delete=models.SET_NULL, blank=True, null=True, related_name="lines")
+    interface = models.ForeignKey(
+        to="dcim.Interface", on_delete=models.SET_NULL, blank=True, null=True, related_name="voip_lines"
+    )
+    label = models.CharField(max_length=100, blank=True)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("phone", "position")
+        unique_together = ("phone", "position")
+
+    def __str__(self):
+        return f"{self.phone} line {self.position}"
+
+
+class NumberBlock(models.Model):
+    """Precomputed assignment bitmap for one block of 10,000 consecutive numbers.
+
+    ``prefix`` is the DID digits (without "+") minus the last four; bit N of
+    ``bitmap`` is set when number ``prefix + "%04d" % N`` exists in any partition.
+    Blocks are maintained from the DID write paths, see blocks.py.
+    """
+    prefix = models.CharField(max_length=32, unique=True)
+    bitmap = models.BinaryField()
+    assigned_count = models.PositiveIntegerField(default=0)
+
     objects = RestrictedQuerySet.as_manager()
 
+    class Meta:
+        ordering = ("prefix",)
+
+    def __str__(self):
+        return self.prefix
+
+
+class DIDUsage(models.Model):
+    """Daily call counters for one DID, fed by the CDR ingester (see cdr.py)."""
+    did = models.ForeignKey(to=DIDNumbers, on_delete=models.CASCADE, related_name="usage")
+    date = models.DateField()
+    calls = models.PositiveIntegerField(default=0)
+    seconds = models.PositiveBigIntegerField(default=0)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("did", "-date")
+        unique_together = ("did", "date")
+
+    def __str__(self):
+        return f"{self.did} {self.date}"
+
+
+class DIDAuditRun(models.Model):
+    """One integrity audit over DIDNumbers, resumable from ``completed_through``.
+
+    Every DID with a pk up to ``completed_through`` has been checked and its
+    findings recorded; chunks above it may be partially done and are redone on resume.
+    """
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(blank=True, null=True)
+    status = models.CharField(max_length=30, choices=AuditStatusChoices, default=AuditStatusChoices.STATUS_PENDING)
+    chunk_size = models.PositiveIntegerField()
+    max_pk = models.BigIntegerField(default=0)
+    completed_through = models.BigIntegerField(default=0)
+    duplicates_checked = models.BooleanField(default=False)
+    rows_checked = models.BigIntegerField(default=0)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("-created",)
+
+    def __str__(self):
+        return f"DID audit #{self.pk}"
+
+
+class DIDAuditFinding(models.Model):
+    """A DID that failed an audit rule. ``did_pk`` is not a foreign key so findings survive fixes."""
+    run = models.ForeignKey(to=DIDAuditRun, on_delete=models.CASCADE, related_name="findings")
+    did_pk = models.BigIntegerField(db_index=True)
+    did = models.CharField(max_length=32)
+    partition = models.CharField(max_length=200, blank=True)
+    rule = models.CharField(max_length=30, choices=AuditRuleChoices)
+    detail = models.CharField(max_length=200, blank=True)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("run", "did_pk")
+
+    def __str__(self):
+        return f"{self.did} ({self.rule})"
+
+
+class BackfillState(models.Model):
+    """Checkpoint of a registered backfill (see backfill.py).
+
+    Every row with a pk up to ``last_pk`` has been migrated; the checkpoint is
+    written in the same transaction as the batch it covers.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    status = models.CharField(
+        max_length=30, choices=BackfillStatusChoices, default=BackfillStatusChoices.STATUS_PENDING
+    )
+    last_pk = models.BigIntegerField(default=0)
+    rows_processed = models.BigIntegerField(default=0)
+    rows_changed = models.BigIntegerField(default=0)
+    started = models.DateTimeField(blank=True, null=True)
+    updated = models.DateTimeField(blank=True, null=True)
+    finished = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("name",)
+
+    def __str__(self):
+        return self.name
+
+
+class ChangeSet(models.Model):
+    """A batch of DID changes staged ahead of a maintenance window (see changesets.py).
+
+    Validation compiles every change into the values it writes and the row state it
+    expects; apply runs that plan in one transaction, and rollback runs its inverse.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    description = models.CharField(max_length=200, blank=True)
+    status = models.CharField(
+        max_length=30, choices=ChangeSetStatusChoices, default=ChangeSetStatusChoices.STATUS_DRAFT
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    validated = models.DateTimeField(blank=True, null=True)
+    applied = models.DateTimeField(blank=True, null=True)
+    rolled_back = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("-created",)
+
+    def __str__(self):
+        return self.name
+
+
+class StagedChange(models.Model):
+    """One staged change to a DID.
+
+    ``did`` and ``partition`` identify the target, or the new DID for a create, and
+    ``data`` holds the fields to set as staged. Validation fills ``did_pk``, the
+    cleaned column ``values`` and, for updates and deletes, the full ``before`` row.
+    ``did_pk`` is not a foreign key, so it survives the DID being deleted.
+    """
+    changeset = models.ForeignKey(to=ChangeSet, on_delete=models.CASCADE, related_name="changes")
+    action = models.CharField(max_length=30, choices=ObjectChangeActionChoices)
+    did = models.CharField(max_length=32)
+    partition = models.CharField(max_length=200, blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    did_pk = models.BigIntegerField(blank=True, null=True)
+    values = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    before = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    error = models.CharField(max_length=200, blank=True)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("changeset", "pk")
+
+    def __str__(self):
+        return f"{self.action} {self.did}"
+
+
+class DIDHistory(models.Model):
+    """One period during which a DID had the same number, partition and provider (see history.py).
+
+    ``valid`` is the period as a tstzrange, open-ended while it is current. Neither ``did_pk``
+    nor ``provider`` is a database constraint, and the provider's name is copied, so closed
+    periods are never rewritten when a DID or provider is deleted.
+    """
+    did_pk = models.BigIntegerField(db_index=True)
+    did = models.CharField(max_length=32)
+    partition = models.CharField(max_length=200, blank=True)
+    provider = models.ForeignKey(
+        to="circuits.Provider", on_delete=models.DO_NOTHING, db_constraint=False, blank=True, null=True,
+        related_name="+",
+    )
+    provider_name = models.CharField(max_length=100, blank=True)
+    valid = DateTimeRangeField()
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("did", "valid")
+        verbose_name_plural = "DID history"
+        indexes = [
+            models.Index(fields=["did"], name="voip_did_history_did_idx"),
+            # Answers "which periods contain time T" (valid @> T) across all numbers.
+            GistIndex(fields=["valid"], name="voip_did_history_valid_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.did} {self.valid}"
+
 
 # @extras_features('custom_fields', 'custom_links', 'export_templates', 'tags', 'webhooks')
 # class RoutePartition(PrimaryModel):
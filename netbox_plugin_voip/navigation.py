@@ -21,4 +21,12 @@ menu_items = (
         link="plugins:netbox_plugin_voip:voice-main-page",
         link_text="Voice Plugin",
     ),
+    PluginMenuItem(
+        link="plugins:netbox_plugin_voip:didnumbers_list",
+        link_text="DIDs",
+    ),
+    PluginMenuItem(
+        link="plugins:netbox_plugin_voip:numberblock_heatmap",
+        link_text="Number Blocks",
+    ),
 )
@@ -0,0 +1,102 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from netbox.api.pagination import OptionalLimitOffsetPagination
+from utilities.paginator import EnhancedPaginator
+
+from .utils import get_plugin_setting
+
+
+def estimate_table_rows(model, using="default"):
+    """Return PostgreSQL's row estimate for a model's table, or None if no statistics exist yet.
+
+    A partitioned table has no statistics of its own, so its partitions' estimates are summed.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN parent.relkind = 'p' THEN ("
+            "  SELECT sum(greatest(child.reltuples, 0))::bigint FROM pg_inherits"
+            "  JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid"
+            "  WHERE pg_inherits.inhparent = parent.oid"
+            ") ELSE parent.reltuples::bigint END "
+            "FROM pg_class AS parent WHERE parent.oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def estimate_queryset_rows(queryset):
+    """Return the planner's row estimate for a queryset.
+
+    Unfiltered querysets use the table's reltuples; filtered ones use the top-level
+    "Plan Rows" of EXPLAIN, which never executes the query.
+    """
+    if not queryset.query.where:
+        return estimate_table_rows(queryset.model, using=queryset.db)
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_queryset(queryset):
+    """Return ``(count, estimated)`` for a queryset.
+
+    Result sets the planner expects to stay under the configured threshold are counted
+    exactly; larger ones return the estimate with ``estimated`` set.
+    """
+    threshold = get_plugin_setting("estimated_count_threshold")
+    if threshold is not None and connections[queryset.db].vendor == "postgresql":
+        estimate = estimate_queryset_rows(queryset)
+        if estimate is not None and estimate > threshold:
+            return estimate, True
+    return queryset.count(), False
+
+
+def _unwrap_queryset(object_list):
+    """Return the QuerySet behind a paginator's object_list (django-tables2 wraps it in TableData)."""
+    queryset = getattr(object_list, "data", object_list)
+    return queryset if hasattr(queryset, "query") else None
+
+
+class EstimatedCountMixin:
+    """Paginator mixin replacing the exact count with a planner estimate on large result sets."""
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = _unwrap_queryset(self.object_list)
+        if queryset is None:
+            return super().count
+        count, self.estimated = count_queryset(queryset)
+        return count
+
+
+class EstimatedCountPaginator(EstimatedCountMixin, EnhancedPaginator):
+    """EnhancedPaginator for the plugin's list views."""
+
+
+class EstimatedCountAdminPaginator(EstimatedCountMixin, Paginator):
+    """Paginator for DIDVoipAdmin."""
+
+
+class EstimatedCountLimitOffsetPagination(OptionalLimitOffsetPagination):
+    """REST API pagination reporting an estimated count, flagged in the response, on large result sets."""
+
+    estimated = False
+
+    def get_count(self, queryset):
+        if not hasattr(queryset, "query"):
+            return len(queryset)
+        count, self.estimated = count_queryset(queryset)
+        return count
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_estimated"] = self.estimated
+        return response
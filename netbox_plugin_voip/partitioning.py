@@ -0,0 +1,264 @@
+"""Declarative PostgreSQL partitioning of the DIDNumbers table.
+
+The table can be partitioned by LIST on ``partition`` (one child per route
+partition plus a DEFAULT child) or by HASH on ``did``. Django keeps addressing
+rows by ``id``; only the database knows the table is partitioned. A filter on
+``partition`` (list) or ``did`` (hash) prunes to the matching children, and a
+retired route partition is dropped by detaching and dropping its child table.
+
+HASH partitioning keys on the raw ``did`` rather than a normalized number on
+purpose. Unique constraints of a partitioned table must include its key, so only
+``did`` keeps ``(did, partition)`` unique. ``did_e164`` may also be NULL, which
+a primary key column cannot be, and every lookup filters on ``did``. A lookup by
+number (``did IN (digits, +digits)``) therefore reads at most two children.
+
+Migrating an existing table runs online, in three steps:
+
+1. ``prepare`` creates the partitioned table next to the live one and installs
+   a trigger mirroring every insert, update and delete into it;
+2. the ``did-partitioning`` backfill copies the existing rows in locked,
+   keyset-ordered batches (resumable and throttled like any backfill);
+3. ``swap`` takes a brief exclusive lock, checks the row counts and renames the
+   tables. The old table is kept as ``<table>_unpartitioned`` until dropped.
+
+PostgreSQL cannot enforce a foreign key to a partitioned table unless it
+includes the partition key, so DIDUsage's constraint is dropped in the swap.
+The ORM still cascades deletes, and bulk.py clears dependents explicitly.
+Requires PostgreSQL 11 or later.
+"""
+import hashlib
+
+from django.db import connection, transaction
+
+from .backfill import Backfill, register
+from .bulk import _clear_dependents
+from .choices import BackfillStatusChoices
+from .models import BackfillState, DIDNumbers
+from .signals import dids_bulk_deleted
+
+STRATEGY_LIST = "list"
+STRATEGY_HASH = "hash"
+STRATEGY_KEYS = {STRATEGY_LIST: "partition", STRATEGY_HASH: "did"}
+BACKFILL_NAME = "did-partitioning"
+TRIGGER_NAME = "voip_partition_mirror"
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def _table():
+    return DIDNumbers._meta.db_table
+
+
+def _staging_table():
+    return f"{_table()}_partitioned"
+
+
+def _old_table():
+    return f"{_table()}_unpartitioned"
+
+
+def _list_child(value):
+    # Partition names are free text; a digest keeps child names valid and under 63 characters.
+    return f"{_table()}_l_{hashlib.sha1(value.encode()).hexdigest()[:12]}"
+
+
+def _default_child():
+    return f"{_table()}_default"
+
+
+def _check_server():
+    if connection.vendor != "postgresql" or connection.pg_version < 110000:
+        raise PartitioningError("Partitioning the DID table requires PostgreSQL 11 or later")
+
+
+def _relkind(cursor, name):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [name])
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        return _relkind(cursor, _table()) == "p"
+
+
+def _create_list_child(cursor, parent, value):
+    child = _list_child(value)
+    cursor.execute(f"CREATE TABLE {child} PARTITION OF {parent} FOR VALUES IN (%s)", [value])
+    cursor.execute(f"COMMENT ON TABLE {child} IS %s", [f"DIDs in partition {value!r}"])
+    return child
+
+
+def prepare(strategy, modulus=16):
+    """Create the partitioned staging table and start mirroring writes into it."""
+    _check_server()
+    if strategy not in STRATEGY_KEYS:
+        raise PartitioningError(f"Unknown strategy {strategy!r}")
+    table, staging, key = _table(), _staging_table(), STRATEGY_KEYS[strategy]
+    with transaction.atomic(), connection.cursor() as cursor:
+        if _relkind(cursor, table) == "p":
+            raise PartitioningError(f"{table} is already partitioned")
+        if _relkind(cursor, staging) is not None:
+            raise PartitioningError(f"{staging} already exists; a migration is in progress")
+
+        cursor.execute(
+            f"CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY {strategy.upper()} ({key})"
+        )
+        if strategy == STRATEGY_LIST:
+            for value in DIDNumbers.objects.order_by("partition").values_list("partition", flat=True).distinct():
+                _create_list_child(cursor, staging, value)
+            cursor.execute(f"CREATE TABLE {_default_child()} PARTITION OF {staging} DEFAULT")
+        else:
+            for remainder in range(modulus):
+                cursor.execute(
+                    f"CREATE TABLE {table}_h{remainder} PARTITION OF {staging} "
+                    f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+                )
+
+        # Unique constraints on a partitioned table must include the partition key.
+        cursor.execute(f"ALTER TABLE {staging} ADD CONSTRAINT {table}_part_pkey PRIMARY KEY (id, {key})")
+        cursor.execute(f"ALTER TABLE {staging} ADD CONSTRAINT {table}_part_did_partition UNIQUE (did, partition)")
+        cursor.execute(f"CREATE INDEX {table}_part_did_prefix ON {staging} (did varchar_pattern_ops)")
+        for column, referenced in (("provider_id", "circuits_provider"), ("site_id", "dcim_site"),
+                                   ("location_id", "dcim_location")):
+            cursor.execute(f"CREATE INDEX {table}_part_{column} ON {staging} ({column})")
+            cursor.execute(
+                f"ALTER TABLE {staging} ADD CONSTRAINT {table}_part_{column}_fk FOREIGN KEY ({column}) "
+                f"REFERENCES {referenced} (id) DEFERRABLE INITIALLY DEFERRED"
+            )
+
+        cursor.execute(
+            f"CREATE FUNCTION {TRIGGER_NAME}() RETURNS trigger AS $$ "
+            f"BEGIN "
+            f"  IF TG_OP IN ('UPDATE', 'DELETE') THEN DELETE FROM {staging} WHERE id = OLD.id; END IF; "
+            f"  IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+            f"    INSERT INTO {staging} VALUES (NEW.*) ON CONFLICT DO NOTHING; "
+            f"  END IF; "
+            f"  RETURN NULL; "
+            f"END $$ LANGUAGE plpgsql"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {TRIGGER_NAME} AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE PROCEDURE {TRIGGER_NAME}()"
+        )
+    BackfillState.objects.filter(name=BACKFILL_NAME).delete()
+
+
+@register
+class PartitionCopyBackfill(Backfill):
+    """Copy existing rows into the staging table.
+
+    The runner locks each batch FOR UPDATE, so a concurrent update or delete waits
+    for the copy to commit and its trigger then sees, and replaces, the copied row.
+    """
+    name = BACKFILL_NAME
+    model = DIDNumbers
+    description = "Copy DIDNumbers into the partitioned table created by voip_partition_table prepare"
+
+    def get_queryset(self):
+        return DIDNumbers.objects.only("pk")
+
+    def process(self, rows):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {_staging_table()} SELECT * FROM {_table()} WHERE id = ANY(%s) ON CONFLICT DO NOTHING",
+                [[row.pk for row in rows]],
+            )
+            return cursor.rowcount
+
+
+def swap(verify=True):
+    """Replace the live table with the fully copied partitioned one."""
+    _check_server()
+    table, staging, old = _table(), _staging_table(), _old_table()
+    state = BackfillState.objects.filter(name=BACKFILL_NAME).first()
+    if state is None or state.status != BackfillStatusChoices.STATUS_COMPLETED:
+        raise PartitioningError(f"Run the {BACKFILL_NAME} backfill to completion before swapping")
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if _relkind(cursor, staging) != "p":
+            raise PartitioningError(f"{staging} does not exist; run prepare first")
+        cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        if verify:
+            cursor.execute(f"SELECT (SELECT count(*) FROM {table}), (SELECT count(*) FROM {staging})")
+            live, copied = cursor.fetchone()
+            if live != copied:
+                raise PartitioningError(f"{table} has {live} rows but {staging} has {copied}; not swapping")
+
+        cursor.execute(f"DROP TRIGGER {TRIGGER_NAME} ON {table}")
+        cursor.execute(f"DROP FUNCTION {TRIGGER_NAME}()")
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        for referencing, name in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT "{name}"')
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        cursor.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+        # The old table owns the id sequence; hand it over so dropping the old table keeps it.
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+
+
+def drop_old_table():
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {_old_table()}")
+
+
+def abort():
+    """Undo ``prepare``: stop mirroring and drop the staging table."""
+    table, staging = _table(), _staging_table()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON {table}")
+        cursor.execute(f"DROP FUNCTION IF EXISTS {TRIGGER_NAME}()")
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+    BackfillState.objects.filter(name=BACKFILL_NAME).delete()
+
+
+def _require_list_partitioned(cursor):
+    cursor.execute("SELECT partstrat FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [_table()])
+    row = cursor.fetchone()
+    if row is None or row[0] != "l":
+        raise PartitioningError(f"{_table()} is not partitioned by list")
+
+
+def add_partition(value):
+    """Give a route partition its own child table, moving its rows out of the DEFAULT child."""
+    table, default = _table(), _default_child()
+    with transaction.atomic(), connection.cursor() as cursor:
+        _require_list_partitioned(cursor)
+        if _relkind(cursor, _list_child(value)) is not None:
+            raise PartitioningError(f"Partition {value!r} already has its own table")
+        # Rows for the value may already sit in DEFAULT, which would block the new child.
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {default}")
+        child = _create_list_child(cursor, table, value)
+        cursor.execute(f"INSERT INTO {child} SELECT * FROM {default} WHERE partition = %s", [value])
+        cursor.execute(f"DELETE FROM {default} WHERE partition = %s", [value])
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+    return child
+
+
+def retire_partition(value):
+    """Drop every DID of a route partition by detaching and dropping its child table.
+
+    Returns the number of DIDs removed. Like the other bulk paths this skips
+    per-object signals; blocks and version counters are updated through
+    dids_bulk_deleted, but no changelog entries are written.
+    """
+    child = _list_child(value)
+    with transaction.atomic(), connection.cursor() as cursor:
+        _require_list_partitioned(cursor)
+        if _relkind(cursor, child) is None:
+            raise PartitioningError(f"Partition {value!r} has no table of its own; add_partition it first")
+        cursor.execute(f"SELECT id, did FROM {child}")
+        rows = cursor.fetchall()
+        pk_list = [pk for pk, _ in rows]
+        _clear_dependents(DIDNumbers.objects.filter(partition=value).values("pk"))
+        cursor.execute(f"ALTER TABLE {_table()} DETACH PARTITION {child}")
+        cursor.execute(f"DROP TABLE {child}")
+        dids_bulk_deleted.send(sender=DIDNumbers, pks=pk_list, partitions={value}, dids=[did for _, did in rows])
+    return len(rows)
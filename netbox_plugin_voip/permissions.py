@@ -0,0 +1,97 @@
+"""Cached object-permission filters for DIDNumbers.
+
+NetBox's RestrictedQuerySet.restrict() loads the user's ObjectPermissions and
+ORs every constraint into a fresh Q on each call. For DIDs the compiled Q is
+cached per user and action in the shared cache, and constraints that only pin
+one field to a value (typically ``{"partition": "x"}``) are merged into a
+single ``field__in`` lookup, which keeps the SQL simple for users holding many
+of them.
+
+Cache entries are keyed by a permissions version that the receivers in
+signals.py bump whenever an ObjectPermission, its assignments or a user's
+group membership changes, so stale filters are never read.
+"""
+import time
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Q
+
+from users.models import ObjectPermission
+
+VERSION_KEY = "netbox_plugin_voip:perm-version"
+CACHE_TIMEOUT = 3600
+# Stored in place of a Q when a permission has no constraints, i.e. grants every DID.
+UNCONSTRAINED = "all"
+# Stored when the user holds no permission for the action.
+DENIED = "none"
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Drop every cached DID permission filter."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000000), timeout=None)
+
+
+def compile_constraints(constraint_sets):
+    """OR a list of ObjectPermission constraints into one Q, or return UNCONSTRAINED.
+
+    Single-field equality constraints on the same field collapse into one ``__in`` lookup.
+    """
+    in_values = defaultdict(set)
+    other = []
+    for constraints in constraint_sets:
+        if not constraints:
+            return UNCONSTRAINED
+        for constraint in constraints if isinstance(constraints, list) else [constraints]:
+            if not constraint:
+                return UNCONSTRAINED
+            if len(constraint) == 1:
+                (field, value), = constraint.items()
+                if "__" not in field and isinstance(value, (str, int)):
+                    in_values[field].add(value)
+                    continue
+            other.append(constraint)
+
+    compiled = Q()
+    for field, values in sorted(in_values.items()):
+        compiled |= Q(**{f"{field}__in": sorted(values)}) if len(values) > 1 else Q(**{field: values.pop()})
+    for constraint in other:
+        compiled |= Q(**constraint)
+    return compiled
+
+
+def _load(user, model, action):
+    content_type = ContentType.objects.get_for_model(model)
+    constraint_sets = list(
+        ObjectPermission.objects.filter(
+            Q(users=user) | Q(groups__user=user),
+            object_types=content_type,
+            actions__contains=[action],
+            enabled=True,
+        ).distinct().values_list("constraints", flat=True)
+    )
+    if not constraint_sets:
+        return DENIED
+    return compile_constraints(constraint_sets)
+
+
+def get_permission_filter(user, model, action):
+    """Return the cached filter for ``user`` performing ``action`` on ``model``: a Q, UNCONSTRAINED or DENIED."""
+    key = f"netbox_plugin_voip:perm:{_version()}:{model._meta.label_lower}:{user.pk}:{action}"
+    compiled = cache.get(key)
+    if compiled is None:
+        compiled = _load(user, model, action)
+        cache.set(key, compiled, timeout=CACHE_TIMEOUT)
+    return compiled
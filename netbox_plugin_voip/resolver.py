@@ -0,0 +1,168 @@
+"""Number lookup for high-rate clients such as SBCs.
+
+``resolve_did`` is an async view: under ASGI it answers from an in-process LRU
+index without a database connection, and only a miss runs the lookup in a
+worker thread. The index is flushed whenever the global DID or the provider
+version counter (see versioning.py) moves, since records carry the provider
+name; the counters are read at most once per ``resolve_refresh_interval``
+seconds, so the hot path does no I/O at all.
+
+Lookups read from the read replica, if any, once it has replayed the latest
+version counter bump, and from the primary until then, so the index never holds
+rows older than the version it is filed under.
+
+Callers present the ``resolve_token``; without one configured, NetBox's view
+permission for DIDs applies. Only callers allowed to see every DID are answered
+from the shared index; users with constrained object permissions query their
+own rows on every request.
+
+``resolve_did_sync`` is the equivalent synchronous view, querying on every
+request as VOIPView does; it serves WSGI deployments and is the load-test
+baseline.
+"""
+import hmac
+import json
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed
+from django.views.decorators.http import require_GET
+from utilities.permissions import permission_is_exempt
+
+from .didsets import did_digits
+from .models import DIDNumbers
+from .permissions import DENIED, UNCONSTRAINED, get_permission_filter
+from .routers import use_primary
+from .utils import get_plugin_setting
+from .versioning import PROVIDERS, get_version, replica_current
+
+VIEW_PERMISSION = "netbox_plugin_voip.view_didnumbers"
+RESOLVE_FIELDS = ("did", "did_e164", "partition", "provider__name", "route_option", "called_party_mask")
+
+
+class ResolveIndex:
+    """Bounded LRU of digit strings to their matching DID records (an empty tuple caches a miss)."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._version = None
+        self._checked = 0.0
+
+    def check_due(self):
+        """Return True (once per refresh interval) when the version counter should be re-read."""
+        now = time.monotonic()
+        if now - self._checked < get_plugin_setting("resolve_refresh_interval"):
+            return False
+        self._checked = now
+        return True
+
+    def set_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, digits):
+        entry = self._entries.get(digits)
+        if entry is not None:
+            self._entries.move_to_end(digits)
+        return entry
+
+    def put(self, digits, records):
+        self._entries[digits] = records
+        self._entries.move_to_end(digits)
+        if len(self._entries) > get_plugin_setting("resolve_index_size"):
+            self._entries.popitem(last=False)
+
+
+index = ResolveIndex()
+
+
+def lookup(digits, queryset=None):
+    """Fetch every DID row in ``queryset`` carrying ``digits`` (with or without "+") as a tuple of dicts."""
+    queryset = DIDNumbers.objects.all() if queryset is None else queryset
+    with nullcontext() if replica_current() else use_primary():
+        return tuple(queryset.filter(did__in=[digits, f"+{digits}"]).order_by("partition").values(*RESOLVE_FIELDS))
+
+
+def _index_version():
+    return get_version()[0], get_version(PROVIDERS)[0]
+
+
+def _access(request):
+    """Return True if the caller may resolve every DID, the queryset of DIDs its object permissions
+    allow, or None if it may not resolve numbers at all."""
+    token = get_plugin_setting("resolve_token")
+    if token:
+        return hmac.compare_digest(request.headers.get("X-Resolve-Token", ""), token) or None
+    user = request.user
+    if settings.LOGIN_REQUIRED and not user.is_authenticated:
+        return None
+    if user.is_superuser or permission_is_exempt(VIEW_PERMISSION):
+        return True
+    if not user.is_authenticated or not user.is_active:
+        return None
+    compiled = get_permission_filter(user, DIDNumbers, "view")
+    if compiled == DENIED:
+        return None
+    if compiled == UNCONSTRAINED:
+        return True
+    return DIDNumbers.objects.filter(compiled)
+
+
+def _render(records, partition):
+    if partition is not None:
+        records = [record for record in records if record["partition"] == partition]
+    if not records:
+        return HttpResponse(b'{"detail": "Not found."}', status=404, content_type="application/json")
+    return HttpResponse(
+        json.dumps([
+            {
+                "did": record["did"],
+                "e164": record["did_e164"],
+                "partition": record["partition"],
+                "provider": record["provider__name"],
+                "route_option": record["route_option"],
+                "called_party_mask": record["called_party_mask"],
+            }
+            for record in records
+        ]),
+        content_type="application/json",
+    )
+
+
+async def resolve_did(request, number):
+    """Resolve a number to its DIDs, optionally narrowed with ?partition=."""
+    # Django's method decorators are sync-only here, so the GET check is inline.
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    # The user is loaded from the session on first access, so this runs off the event loop too.
+    access = await sync_to_async(_access)(request)
+    if access is None:
+        return HttpResponseForbidden()
+    digits = did_digits(number)
+    if digits is None:
+        raise Http404
+    if access is not True:
+        return _render(await sync_to_async(lookup)(digits, access), request.GET.get("partition"))
+    if index.check_due():
+        index.set_version(await sync_to_async(_index_version)())
+    records = index.get(digits)
+    if records is None:
+        records = await sync_to_async(lookup)(digits)
+        index.put(digits, records)
+    return _render(records, request.GET.get("partition"))
+
+
+@require_GET
+def resolve_did_sync(request, number):
+    """Synchronous resolve; one query per request."""
+    access = _access(request)
+    if access is None:
+        return HttpResponseForbidden()
+    digits = did_digits(number)
+    if digits is None:
+        raise Http404
+    return _render(lookup(digits, None if access is True else access), request.GET.get("partition"))
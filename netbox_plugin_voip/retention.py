@@ -0,0 +1,119 @@
+"""Changelog retention for plugin objects.
+
+Sync jobs touch the same DIDs over and over, so the plugin's ObjectChange rows
+grow much faster than NetBox's global CHANGELOG_RETENTION is tuned for. Two
+plugin-scoped passes keep them in check:
+
+* compaction: once changes are ``changelog_compact_after_days`` old, every
+  run of them for one object is collapsed into its latest row, which keeps the
+  prechange data of the first and the postchange data of the last (a run ending
+  in a delete keeps the state the object was deleted in, and a run from create
+  to delete is dropped altogether);
+* purge: changes older than ``changelog_retention_days`` are deleted.
+
+Both work in batches of ``changelog_batch_size``, each in its own short
+transaction, so they can run against a live changelog.
+"""
+import time
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from extras.choices import ObjectChangeActionChoices
+from extras.models import ObjectChange
+
+from .utils import get_plugin_setting
+
+APP_LABEL = "netbox_plugin_voip"
+
+
+def plugin_changes():
+    return ObjectChange.objects.filter(changed_object_type__in=ContentType.objects.filter(app_label=APP_LABEL))
+
+
+def _summarize(changes):
+    """Fold a time-ordered run of changes for one object into its last row.
+
+    Returns that row, or None when the run created and then deleted the object and nothing is left to keep.
+    """
+    first, last = changes[0], changes[-1]
+    created = first.action == ObjectChangeActionChoices.ACTION_CREATE
+    if last.action == ObjectChangeActionChoices.ACTION_DELETE:
+        # The delete's own prechange data is the object's final state.
+        return None if created else last
+    if created:
+        last.action = ObjectChangeActionChoices.ACTION_CREATE
+    last.prechange_data = first.prechange_data
+    return last
+
+
+def compact_changes(days=None, batch_size=None, sleep=0, dry_run=False):
+    """Collapse each object's changes older than ``days`` into one; returns the number of rows removed."""
+    days = get_plugin_setting("changelog_compact_after_days") if days is None else days
+    batch_size = batch_size or get_plugin_setting("changelog_batch_size")
+    if days is None:
+        return 0
+    old = plugin_changes().filter(time__lt=timezone.now() - timedelta(days=days))
+    candidates = (
+        old.order_by()
+        .values("changed_object_type", "changed_object_id")
+        .annotate(changes=Count("pk"))
+        .filter(changes__gt=1)
+        .values_list("changed_object_type", "changed_object_id", "changes")
+    )
+    if dry_run:
+        return sum(changes - 1 for _, _, changes in candidates)
+
+    removed = 0
+    candidates = list(candidates)
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
+        object_ids = {(content_type, object_id) for content_type, object_id, _ in batch}
+        with transaction.atomic():
+            runs = {}
+            rows = old.filter(
+                changed_object_type__in={content_type for content_type, _ in object_ids},
+                changed_object_id__in={object_id for _, object_id in object_ids},
+            ).order_by("changed_object_type", "changed_object_id", "time", "pk").select_for_update()
+            for change in rows:
+                key = (change.changed_object_type_id, change.changed_object_id)
+                if key in object_ids:
+                    runs.setdefault(key, []).append(change)
+            summaries, obsolete = [], []
+            for changes in runs.values():
+                if len(changes) > 1:
+                    summary = _summarize(changes)
+                    if summary is None:
+                        obsolete.extend(change.pk for change in changes)
+                        continue
+                    summaries.append(summary)
+                    obsolete.extend(change.pk for change in changes[:-1])
+            ObjectChange.objects.bulk_update(summaries, ["action", "prechange_data"], batch_size=batch_size)
+            ObjectChange.objects.filter(pk__in=obsolete).delete()
+        removed += len(obsolete)
+        if sleep:
+            time.sleep(sleep)
+    return removed
+
+
+def purge_changes(days=None, batch_size=None, sleep=0, dry_run=False):
+    """Delete plugin changes older than ``days`` in batches; returns the number of rows deleted."""
+    days = get_plugin_setting("changelog_retention_days") if days is None else days
+    batch_size = batch_size or get_plugin_setting("changelog_batch_size")
+    if days is None:
+        return 0
+    expired = plugin_changes().filter(time__lt=timezone.now() - timedelta(days=days))
+    if dry_run:
+        return expired.count()
+
+    deleted = 0
+    while True:
+        pks = list(expired.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += ObjectChange.objects.filter(pk__in=pks).delete()[0]
+        if sleep:
+            time.sleep(sleep)
@@ -0,0 +1,159 @@
+"""Optional read-replica routing for DIDNumbers.
+
+When the ``replica_database`` setting names a DATABASES alias, ready() installs
+ReplicaRouter ahead of any configured DATABASE_ROUTERS. Reads of DIDNumbers
+then go to the replica, except:
+
+* once the current request (or, outside requests, the current thread) has written
+  anything, so a request always reads its own writes;
+* during non-safe HTTP requests and inside ``use_primary()``, which ETag-conditional
+  views and resolve lookups enter while the replica has not yet replayed the
+  latest version counter bump (see versioning.py);
+* inside a transaction on the primary, where locks and uncommitted rows live;
+* while the replica lags more than ``replica_max_lag`` seconds behind, or cannot be
+  reached. Lag is measured on the replica at most once per
+  ``replica_lag_check_interval`` seconds per process.
+
+Writes are left to any other DATABASE_ROUTERS, and otherwise go to the primary.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .models import DIDNumbers
+from .utils import get_plugin_setting
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_state = threading.local()
+_lag_lock = threading.Lock()
+_lag = {"checked": None, "healthy": False}
+_replayed = {"lsn": 0}
+
+
+def _pinned():
+    return getattr(_state, "pinned", False) or getattr(_state, "forced", 0) > 0
+
+
+def pin():
+    """Send this request's (or thread's) remaining DID reads to the primary."""
+    _state.pinned = True
+
+
+@contextmanager
+def use_primary():
+    """Read DIDs from the primary inside the block, e.g. right after another process committed them."""
+    _state.forced = getattr(_state, "forced", 0) + 1
+    try:
+        yield
+    finally:
+        _state.forced -= 1
+
+
+@contextmanager
+def request_scope(pinned=False):
+    """Reset pinning around one request; used by ReplicaPinningMiddleware."""
+    _state.pinned = pinned
+    try:
+        yield
+    finally:
+        _state.pinned = False
+
+
+def replica_lag(alias):
+    """Seconds the replica's replay is behind, 0 when it has replayed all it received, None if unknown."""
+    with connections[alias].cursor() as cursor:
+        # An idle primary sends nothing, so replay timestamps age without any real lag.
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+            "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        lag = cursor.fetchone()[0]
+    return None if lag is None else float(lag)
+
+
+def replica_healthy(alias):
+    now = time.monotonic()
+    with _lag_lock:
+        if _lag["checked"] is not None and now - _lag["checked"] < get_plugin_setting("replica_lag_check_interval"):
+            return _lag["healthy"]
+        _lag["checked"] = now
+        try:
+            lag = replica_lag(alias)
+        except DatabaseError:
+            connections[alias].close()
+            lag = None
+        _lag["healthy"] = lag is not None and lag <= get_plugin_setting("replica_max_lag")
+        return _lag["healthy"]
+
+
+def _lsn(text):
+    high, low = text.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def primary_lsn():
+    """Return the primary's current WAL position, or None when no replica is configured."""
+    if not get_plugin_setting("replica_database"):
+        return None
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute("SELECT pg_current_wal_lsn()::text")
+        return _lsn(cursor.fetchone()[0])
+
+
+def replica_replayed(lsn):
+    """Return True if the replica has replayed the primary's WAL up to ``lsn`` (always when ``lsn`` is None).
+
+    The replay position only moves forward, so once it is known to be past ``lsn`` no query is needed.
+    """
+    alias = get_plugin_setting("replica_database")
+    if lsn is None or not alias or _replayed["lsn"] >= lsn:
+        return True
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn()::text")
+            recovering, replayed = cursor.fetchone()
+    except DatabaseError:
+        connections[alias].close()
+        return False
+    if not recovering:
+        # Not a standby, e.g. the primary under a second alias in development.
+        return True
+    replayed = _lsn(replayed) if replayed else 0
+    with _lag_lock:
+        _replayed["lsn"] = max(_replayed["lsn"], replayed)
+    return replayed >= lsn
+
+
+class ReplicaRouter:
+
+    def __init__(self):
+        self.replica = get_plugin_setting("replica_database")
+        if self.replica not in connections.databases:
+            raise ImproperlyConfigured(f"replica_database {self.replica!r} is not in DATABASES")
+
+    def db_for_read(self, model, **hints):
+        if model is not DIDNumbers:
+            return None
+        if _pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block or not replica_healthy(self.replica):
+            return DEFAULT_DB_ALIAS
+        return self.replica
+
+    def db_for_write(self, model, **hints):
+        # Any write, not just to DIDs, pins: later reads may join the rows it touched. The database
+        # is left to the next router (or the default), so configured DATABASE_ROUTERS still apply.
+        pin()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, self.replica}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == self.replica:
+            return False
+        return None
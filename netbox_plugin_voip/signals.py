@@ -0,0 +1,142 @@
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from circuits.models import Provider
+from users.models import ObjectPermission
+
+from . import events, history, permissions
+from .blocks import update_blocks
+from .models import DIDNumbers, SiteAssignment
+from .versioning import bump_providers_on_commit, bump_sites_on_commit, bump_versions_on_commit
+
+# Sent by the set-based write paths in bulk.py and changesets.py, which bypass per-object
+# model signals. Receivers get ``pks`` and ``partitions`` (every partition touched, before
+# and after), plus ``changes`` (bulk update; None when rows got different values) or
+# ``dids`` (bulk create and delete).
+dids_bulk_created = Signal()
+dids_bulk_updated = Signal()
+dids_bulk_deleted = Signal()
+
+
+def _loaded_value(instance, name):
+    return getattr(instance, "_loaded_values", {}).get(name)
+
+
+@receiver(post_save, sender=DIDNumbers)
+def update_blocks_on_save(instance, created, **kwargs):
+    previous = _loaded_value(instance, "did")
+    if created or previous is None:
+        update_blocks(assigned=[instance.did])
+    elif previous != instance.did:
+        update_blocks(assigned=[instance.did], released=[previous])
+
+
+@receiver(post_save, sender=DIDNumbers)
+def bump_versions_on_save(instance, **kwargs):
+    bump_versions_on_commit({instance.partition, _loaded_value(instance, "partition")} - {None})
+
+
+@receiver(post_delete, sender=DIDNumbers)
+def update_blocks_on_delete(instance, **kwargs):
+    update_blocks(released=[instance.did])
+
+
+@receiver(post_delete, sender=DIDNumbers)
+def bump_versions_on_delete(instance, **kwargs):
+    bump_versions_on_commit({instance.partition})
+
+
+@receiver(dids_bulk_deleted)
+def update_blocks_on_bulk_delete(dids, **kwargs):
+    update_blocks(released=dids)
+
+
+@receiver(dids_bulk_created)
+def update_blocks_on_bulk_create(dids, **kwargs):
+    update_blocks(assigned=dids)
+
+
+@receiver(dids_bulk_created)
+@receiver(dids_bulk_updated)
+@receiver(dids_bulk_deleted)
+def bump_versions_on_bulk_change(partitions, **kwargs):
+    bump_versions_on_commit(partitions)
+
+
+@receiver(post_save, sender=DIDNumbers)
+def record_event_on_save(instance, created, **kwargs):
+    events.record_on_commit(events.ACTION_CREATE if created else events.ACTION_UPDATE, [instance.pk])
+
+
+@receiver(post_delete, sender=DIDNumbers)
+def record_event_on_delete(instance, **kwargs):
+    events.record_on_commit(
+        events.ACTION_DELETE, [instance.pk], {instance.pk: {"did": instance.did, "partition": instance.partition}}
+    )
+
+
+@receiver(dids_bulk_created)
+def record_events_on_bulk_create(pks, **kwargs):
+    events.record_on_commit(events.ACTION_CREATE, pks)
+
+
+@receiver(dids_bulk_updated)
+def record_events_on_bulk_update(pks, **kwargs):
+    events.record_on_commit(events.ACTION_UPDATE, pks)
+
+
+@receiver(dids_bulk_deleted)
+def record_events_on_bulk_delete(pks, dids, **kwargs):
+    events.record_on_commit(events.ACTION_DELETE, pks, {pk: {"did": did} for pk, did in zip(pks, dids)})
+
+
+@receiver(post_save, sender=DIDNumbers)
+@receiver(post_delete, sender=DIDNumbers)
+def sync_history_on_change(instance, **kwargs):
+    history.sync([instance.pk])
+
+
+@receiver(dids_bulk_created)
+@receiver(dids_bulk_updated)
+@receiver(dids_bulk_deleted)
+def sync_history_on_bulk_change(pks, **kwargs):
+    history.sync(pks)
+
+
+@receiver(pre_delete, sender=Provider)
+def collect_history_on_provider_delete(instance, **kwargs):
+    # Deleting the provider clears it on its DIDs without any DID signal; remember them.
+    instance._voip_did_pks = list(DIDNumbers.objects.filter(provider=instance).values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Provider)
+def sync_history_on_provider_delete(instance, **kwargs):
+    # The DIDs have lost their provider by now: close their periods and open provider-less ones.
+    history.sync(getattr(instance, "_voip_did_pks", []))
+
+
+@receiver(post_save, sender=Provider)
+@receiver(post_delete, sender=Provider)
+def bump_versions_on_provider_change(**kwargs):
+    bump_providers_on_commit()
+
+
+@receiver(post_save, sender=SiteAssignment)
+@receiver(post_delete, sender=SiteAssignment)
+def bump_versions_on_site_assignment_change(**kwargs):
+    # Inherited sites (the DID view, ?effective_site_id=) change without any DID being written.
+    bump_sites_on_commit()
+
+
+@receiver(post_save, sender=ObjectPermission)
+@receiver(post_delete, sender=ObjectPermission)
+@receiver(m2m_changed, sender=ObjectPermission.users.through)
+@receiver(m2m_changed, sender=ObjectPermission.groups.through)
+@receiver(m2m_changed, sender=ObjectPermission.object_types.through)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(post_delete, sender=Group)
+def invalidate_permission_filters(**kwargs):
+    # After commit, so a concurrent request can't re-cache the old constraints.
+    transaction.on_commit(permissions.invalidate)
@@ -0,0 +1,127 @@
+"""Site and location of DIDs, inherited from number prefixes.
+
+Sites are assigned to number ranges, not to rows: a SiteAssignment gives every
+DID whose digits start with its ``prefix`` a site (and optionally a location),
+and the longest matching prefix wins. A DID's own ``site`` overrides the
+inherited one. Moving a range to another site is a single-row change.
+
+Prefixes match the leading digits of a DID (after any "+"), as the
+``did__startswith`` scans do, so a DID containing A-D, # or * inherits the site
+of the digits it starts with in both directions.
+
+Both directions are indexed lookups:
+
+* "site for number X" fetches the assignments whose prefix is any leading part
+  of X, a handful of unique-index probes, and keeps the longest;
+* "numbers at site Y" turns Y's prefixes into ``did__startswith`` range scans on
+  the DID prefix index, each minus the longer prefixes assigned inside it.
+"""
+import re
+
+from django.db.models import Q
+
+from .models import DIDNumbers, SiteAssignment
+
+SOURCE_OVERRIDE = "override"
+SOURCE_PREFIX = "prefix"
+_LEADING_DIGITS = re.compile(r"\+?([0-9]*)")
+
+
+def leading_prefixes(digits):
+    return [digits[:length] for length in range(1, len(digits) + 1)]
+
+
+def _leading_digits(number):
+    """The digits a number starts with, after any "+"; the only part an assignment prefix can match."""
+    return _LEADING_DIGITS.match(number).group(1)
+
+
+def _starts_with(prefix):
+    return Q(did__startswith=prefix) | Q(did__startswith=f"+{prefix}")
+
+
+def resolve_sites(dids):
+    """Map each DID's pk to ``(site_id, location_id, source)``, or None when it has no site.
+
+    Resolves any number of DIDs with one query for their candidate prefixes.
+    """
+    digits = {did.pk: _leading_digits(did.did) for did in dids if not did.site_id}
+    candidates = {prefix for value in digits.values() if value for prefix in leading_prefixes(value)}
+    assignments = {
+        prefix: (site_id, location_id)
+        for prefix, site_id, location_id in SiteAssignment.objects.filter(prefix__in=candidates).values_list(
+            "prefix", "site_id", "location_id"
+        )
+    } if candidates else {}
+
+    result = {}
+    for did in dids:
+        if did.site_id:
+            result[did.pk] = (did.site_id, did.location_id, SOURCE_OVERRIDE)
+            continue
+        result[did.pk] = None
+        for prefix in reversed(leading_prefixes(digits[did.pk] or "")):
+            if prefix in assignments:
+                result[did.pk] = (*assignments[prefix], SOURCE_PREFIX)
+                break
+    return result
+
+
+def effective_site(did):
+    """Return ``(site_id, location_id, source)`` for one DID, or None."""
+    return resolve_sites([did])[did.pk]
+
+
+def site_details(did):
+    """Return ``(site, location, assignment)`` objects for a DID's detail view; assignment is None for overrides."""
+    if did.site_id:
+        return did.site, did.location, None
+    assignment = site_for_number(did.did)
+    if assignment is None:
+        return None, None, None
+    return assignment.site, assignment.location, assignment
+
+
+def site_for_number(number):
+    """Return the SiteAssignment covering a number (with or without "+"), or None."""
+    digits = _leading_digits(number)
+    if not digits:
+        return None
+    return (
+        SiteAssignment.objects.filter(prefix__in=leading_prefixes(digits))
+        .select_related("site", "location").order_by("-prefix").first()
+    )
+
+
+def site_condition(site_ids, location_ids=None):
+    """A Q matching every DID whose effective site is in ``site_ids`` (and location, if given).
+
+    Each owned prefix matches its range minus the longest assigned prefixes inside it; those
+    ranges are matched by their own assignment instead.
+    """
+    site_ids = set(site_ids)
+    override = Q(site_id__in=site_ids)
+    if location_ids is not None:
+        override &= Q(location_id__in=location_ids)
+
+    assignments = list(SiteAssignment.objects.values_list("prefix", "site_id", "location_id"))
+    owned = [
+        prefix for prefix, site_id, location_id in assignments
+        if site_id in site_ids and (location_ids is None or location_id in location_ids)
+    ]
+    inherited = Q(pk__in=[])
+    for prefix in owned:
+        inner = [other for other, _, _ in assignments if len(other) > len(prefix) and other.startswith(prefix)]
+        # Prefixes inside another inner prefix are already excluded with it.
+        inner = [other for other in inner if not any(other != o and other.startswith(o) for o in inner)]
+        term = _starts_with(prefix)
+        for other in inner:
+            term &= ~_starts_with(other)
+        inherited |= term
+    return override | (Q(site__isnull=True) & inherited)
+
+
+def dids_at_site(site, location=None, queryset=None):
+    """DIDs whose effective site is ``site`` (and location, if given)."""
+    queryset = DIDNumbers.objects.all() if queryset is None else queryset
+    return queryset.filter(site_condition([site.pk], None if location is None else [location.pk]))
@@ -0,0 +1,307 @@
+"""Binary COPY snapshots of the plugin's tables.
+
+A snapshot is an uncompressed tar holding:
+
+* ``manifest.json``: format version, the columns, row count and SHA-256 of each table;
+* ``providers.json``: the id and name of every provider the DIDs reference;
+* ``sites.json``: the slugs of the sites and locations DIDs override theirs with;
+* one gzip-compressed ``COPY ... (FORMAT binary)`` stream per table.
+
+Export reads every table in one REPEATABLE READ transaction, so the tables are
+consistent with each other. Restore runs in a single transaction:
+
+1. drop the secondary indexes and the unique and foreign-key constraints;
+2. COPY each stream straight into its table, except DIDNumbers, which is
+   loaded into a temporary table so that provider ids can be remapped by name
+   and site and location ids by slug (overrides to unknown sites are cleared);
+3. relink phone lines to their numbers, which the load may have renumbered;
+4. rebuild the indexes and constraints;
+5. reset the sequences and ANALYZE;
+6. close the history periods of DIDs the snapshot changed or dropped and open
+   periods for the DIDs it loaded.
+
+A checksum mismatch or any error rolls the whole restore back.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from circuits.models import Provider
+from dcim.models import Location, Site
+
+from . import history
+from .models import DIDNumbers, DIDUsage, Line, NumberBlock
+from .version import __version__
+from .versioning import bump_versions
+
+FORMAT_VERSION = 1
+# Load order: referenced tables first.
+SNAPSHOT_MODELS = (DIDNumbers, DIDUsage, NumberBlock)
+COPY_BUFFER = 1024 * 1024
+# DIDNumbers foreign keys remapped on restore, and the temporary tables holding old -> new ids.
+ID_MAPS = {"provider_id": "voip_provider_map", "site_id": "voip_site_map", "location_id": "voip_location_map"}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _HashingWriter:
+    """File-like sink for COPY TO that compresses and hashes the stream."""
+
+    def __init__(self, fileobj, compresslevel):
+        self.digest = hashlib.sha256()
+        self.gzip = gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=compresslevel)
+
+    def write(self, data):
+        self.digest.update(data)
+        self.gzip.write(data)
+
+    def close(self):
+        self.gzip.close()
+
+
+class _HashingReader:
+    """File-like source for COPY FROM that decompresses and hashes the stream."""
+
+    def __init__(self, fileobj):
+        self.digest = hashlib.sha256()
+        self.gzip = gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+    def read(self, size=-1):
+        data = self.gzip.read(size)
+        self.digest.update(data)
+        return data
+
+
+def _columns(model):
+    return [field.column for field in model._meta.concrete_fields]
+
+
+def _member_name(model):
+    return f"{model._meta.label_lower}.copy.gz"
+
+
+def _add_bytes(archive, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(timezone.now().timestamp())
+    archive.addfile(info, io.BytesIO(data))
+
+
+def export_snapshot(path, compresslevel=1):
+    """Write a snapshot of every plugin table to ``path`` and return its manifest."""
+    manifest = {
+        "format": FORMAT_VERSION,
+        "plugin_version": __version__,
+        "created": timezone.now().isoformat(),
+        "tables": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir, transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            for model in SNAPSHOT_MODELS:
+                columns = _columns(model)
+                with open(os.path.join(workdir, _member_name(model)), "wb") as output:
+                    writer = _HashingWriter(output, compresslevel)
+                    cursor.copy_expert(
+                        f"COPY (SELECT {', '.join(columns)} FROM {model._meta.db_table} ORDER BY "
+                        f"{model._meta.pk.column}) TO STDOUT WITH (FORMAT binary)",
+                        writer,
+                        size=COPY_BUFFER,
+                    )
+                    writer.close()
+                manifest["tables"].append({
+                    "model": model._meta.label_lower,
+                    "table": model._meta.db_table,
+                    "columns": columns,
+                    "rows": model.objects.count(),
+                    "sha256": writer.digest.hexdigest(),
+                })
+            sites = {
+                "sites": dict(
+                    Site.objects.filter(pk__in=DIDNumbers.objects.exclude(site=None).values("site"))
+                    .values_list("pk", "slug")
+                ),
+                "locations": {
+                    pk: [site_slug, slug] for pk, site_slug, slug in
+                    Location.objects.filter(pk__in=DIDNumbers.objects.exclude(location=None).values("location"))
+                    .values_list("pk", "site__slug", "slug")
+                },
+            }
+            providers = dict(
+                Provider.objects.filter(pk__in=DIDNumbers.objects.exclude(provider=None).values("provider"))
+                .values_list("pk", "name")
+            )
+
+        with tarfile.open(path, "w") as archive:
+            _add_bytes(archive, "manifest.json", json.dumps(manifest, indent=2).encode())
+            _add_bytes(archive, "providers.json", json.dumps(providers).encode())
+            _add_bytes(archive, "sites.json", json.dumps(sites).encode())
+            for model in SNAPSHOT_MODELS:
+                archive.add(os.path.join(workdir, _member_name(model)), arcname=_member_name(model))
+    return manifest
+
+
+def _deferred_ddl(cursor, tables):
+    """Return ``(drop, create)`` statements for the droppable indexes and constraints of ``tables``.
+
+    Primary keys stay, so rows remain addressable; unique and foreign-key constraints
+    and every index not backing a constraint are dropped and recreated after the load.
+    Foreign keys of other tables pointing into ``tables`` are included, so they can be truncated.
+    """
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE (conrelid = ANY(%s::regclass[]) AND contype IN ('u', 'f')) "
+        "OR (confrelid = ANY(%s::regclass[]) AND contype = 'f') ORDER BY contype DESC, conname",
+        [tables, tables],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) FROM pg_index "
+        "WHERE indrelid = ANY(%s::regclass[]) AND NOT indisprimary "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = pg_index.indexrelid)",
+        [tables],
+    )
+    indexes = cursor.fetchall()
+
+    # Foreign keys are dropped first and recreated last (contype DESC puts 'u' before 'f').
+    drop = [f'ALTER TABLE {table} DROP CONSTRAINT "{name}"' for table, name, _ in reversed(constraints)]
+    drop += [f"DROP INDEX {name}" for name, _ in indexes]
+    create = [definition for _, definition in indexes]
+    create += [f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}' for table, name, definition in constraints]
+    return drop, create
+
+
+def _provider_map(providers, create_missing):
+    """Map snapshot provider ids to local ones by name; returns ``(mapping, missing_names)``."""
+    local = dict(Provider.objects.filter(name__in=providers.values()).values_list("name", "pk"))
+    mapping, missing = {}, []
+    for old_pk, name in providers.items():
+        if name not in local and create_missing:
+            local[name] = Provider.objects.create(name=name, slug=slugify(name)[:100]).pk
+        if name in local:
+            mapping[int(old_pk)] = local[name]
+        else:
+            missing.append(name)
+    return mapping, missing
+
+
+def _site_maps(sites):
+    """Map snapshot site and location ids to local ones by slug; unknown ones are left out."""
+    local_sites = dict(Site.objects.filter(slug__in=sites["sites"].values()).values_list("slug", "pk"))
+    site_map = {int(old_pk): local_sites[slug] for old_pk, slug in sites["sites"].items() if slug in local_sites}
+    local_locations = {
+        (site_slug, slug): pk for site_slug, slug, pk in
+        Location.objects.filter(slug__in={slug for _, slug in sites["locations"].values()})
+        .values_list("site__slug", "slug", "pk")
+    }
+    location_map = {
+        int(old_pk): local_locations[tuple(key)] for old_pk, key in sites["locations"].items()
+        if tuple(key) in local_locations
+    }
+    return site_map, location_map
+
+
+def _load_id_map(cursor, table, mapping):
+    cursor.execute(f"CREATE TEMPORARY TABLE {table} (old_id integer PRIMARY KEY, new_id integer) ON COMMIT DROP")
+    if mapping:
+        cursor.execute(
+            f"INSERT INTO {table} (old_id, new_id) SELECT * FROM unnest(%s::int[], %s::int[])",
+            [list(mapping), list(mapping.values())],
+        )
+
+
+def restore_snapshot(path, replace=False, create_providers=False, maintenance_work_mem="1GB"):
+    """Load a snapshot into the plugin tables; returns ``(manifest, missing_provider_names)``."""
+    with tarfile.open(path, "r:") as archive:
+        manifest = json.load(archive.extractfile("manifest.json"))
+        if manifest.get("format") != FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format {manifest.get('format')}")
+        providers = json.load(archive.extractfile("providers.json"))
+        models = {model._meta.label_lower: model for model in SNAPSHOT_MODELS}
+        for table in manifest["tables"]:
+            model = models.get(table["model"])
+            if model is None or table["columns"] != _columns(model):
+                raise SnapshotError(f"Snapshot schema for {table['model']} does not match this plugin version")
+        sites = json.load(archive.extractfile("sites.json"))
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            db_tables = [model._meta.db_table for model in SNAPSHOT_MODELS]
+            if not replace and any(model.objects.exists() for model in SNAPSHOT_MODELS):
+                raise SnapshotError("Plugin tables are not empty; restore with replace to overwrite them")
+            # Lines are not part of the snapshot; they keep their numbers and are relinked after the load.
+            line_dids = list(Line.objects.exclude(did=None).values_list("pk", "did__did", "did__partition"))
+
+            mapping, missing = _provider_map(providers, create_providers)
+            site_map, location_map = _site_maps(sites)
+            for column, ids in (("provider_id", mapping), ("site_id", site_map), ("location_id", location_map)):
+                _load_id_map(cursor, ID_MAPS[column], ids)
+
+            drop, create = _deferred_ddl(cursor, db_tables)
+            for statement in drop:
+                cursor.execute(statement)
+            if replace:
+                cursor.execute(f"TRUNCATE {', '.join(db_tables)}")
+            cursor.execute("SET LOCAL maintenance_work_mem = %s", [maintenance_work_mem])
+
+            for table in manifest["tables"]:
+                model = models[table["model"]]
+                target = model._meta.db_table
+                columns = ", ".join(table["columns"])
+                if model is DIDNumbers:
+                    # Provider, site and location ids differ between databases; stage, then insert with
+                    # remapped ids.
+                    cursor.execute(f"CREATE TEMPORARY TABLE voip_snapshot_dids (LIKE {target}) ON COMMIT DROP")
+                    target = "voip_snapshot_dids"
+                reader = _HashingReader(archive.extractfile(_member_name(model)))
+                cursor.copy_expert(f"COPY {target} ({columns}) FROM STDIN WITH (FORMAT binary)", reader,
+                                   size=COPY_BUFFER)
+                if reader.digest.hexdigest() != table["sha256"]:
+                    raise SnapshotError(f"Checksum mismatch in {table['model']}; the snapshot is corrupt")
+                if model is DIDNumbers:
+                    selected = ", ".join(
+                        f"{ID_MAPS[column]}.new_id" if column in ID_MAPS else f"staged.{column}"
+                        for column in table["columns"]
+                    )
+                    joins = " ".join(
+                        f"LEFT JOIN {id_map} ON {id_map}.old_id = staged.{column}" for column, id_map in ID_MAPS.items()
+                    )
+                    cursor.execute(
+                        f"INSERT INTO {model._meta.db_table} ({columns}) SELECT {selected} "
+                        f"FROM voip_snapshot_dids AS staged {joins}"
+                    )
+
+            if line_dids:
+                line_ids, numbers, partitions = zip(*line_dids)
+                cursor.execute(
+                    f"UPDATE {Line._meta.db_table} AS line SET did_id = relinked.did_id FROM ("
+                    f"SELECT kept.line_id, dids.id AS did_id "
+                    f"FROM unnest(%s::int[], %s::text[], %s::text[]) AS kept (line_id, did, partition) "
+                    f"LEFT JOIN {DIDNumbers._meta.db_table} AS dids "
+                    f"ON dids.did = kept.did AND dids.partition = kept.partition"
+                    f") AS relinked WHERE line.id = relinked.line_id",
+                    [list(line_ids), list(numbers), list(partitions)],
+                )
+
+            for statement in create:
+                cursor.execute(statement)
+            for statement in connection.ops.sequence_reset_sql(no_style(), SNAPSHOT_MODELS):
+                cursor.execute(statement)
+            for table in db_tables:
+                cursor.execute(f"ANALYZE {table}")
+            history.sync()
+
+            partitions = set(DIDNumbers.objects.order_by().values_list("partition", flat=True).distinct())
+            transaction.on_commit(lambda: bump_versions(partitions))
+
+    return manifest, missing
@@ -0,0 +1,37 @@
+import django_tables2 as tables
+
+from utilities.tables import BaseTable, BooleanColumn, ToggleColumn
+
+from .models import DIDNumbers
+from .paginator import EstimatedCountPaginator
+
+
+class DIDNumbersTable(BaseTable):
+    pk = ToggleColumn()
+    did = tables.Column(linkify=True, verbose_name="DID")
+    did_e164 = tables.Column(verbose_name="E.164")
+    did_national = tables.Column(verbose_name="National")
+    did_international = tables.Column(verbose_name="International")
+    country_code = tables.Column(verbose_name="Country Code")
+    region_code = tables.Column(verbose_name="Region")
+    provider = tables.Column(linkify=True)
+    partition = tables.Column()
+    route_option = BooleanColumn(verbose_name="Route Option")
+    called_party_mask = tables.Column(verbose_name="Called Party Mask")
+
+    class Meta(BaseTable.Meta):
+        model = DIDNumbers
+        fields = (
+            "pk", "did", "did_e164", "did_national", "did_international", "country_code", "region_code",
+            "description", "provider", "partition", "route_option", "called_party_mask",
+        )
+        default_columns = ("pk", "did", "did_international", "description", "provider", "partition")
+
+    # Columns a list view needs to load; everything else on the row stays deferred.
+    queryset_fields = ("pk", "did", "did_e164", "did_national", "did_international", "country_code",
+                       "region_code", "description", "partition", "route_option", "called_party_mask",
+                       "provider", "provider__id", "provider__name")
+
+    def paginate(self, paginator_class=EstimatedCountPaginator, *args, **kwargs):
+        # NetBox's ObjectListView always hands us EnhancedPaginator; swap in the estimating one.
+        return super().paginate(EstimatedCountPaginator, *args, **kwargs)
@@ -0,0 +1,155 @@
+import io
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from users.models import Token
+
+from netbox_plugin_voip import events
+from netbox_plugin_voip.management.commands.voip_event_sink import _handler, _Stats
+from netbox_plugin_voip.models import DIDNumbers
+
+# Every key the pipeline writes; cleared around each test in the Redis the tests run against.
+REDIS_KEYS = [
+    *events.BUFFER_KEYS, *[key + events.PROCESSING_SUFFIX for key in events.BUFFER_KEYS], events.METRICS_KEY,
+]
+
+
+class Sink:
+    """voip_event_sink's endpoint on a free local port, recording every batch it accepts."""
+
+    def __init__(self, fail_rate=0):
+        self.stats = _Stats()
+        self.batches = []
+        stats, batches = self.stats, self.batches
+        handler = _handler(stats, fail_rate, 0, io.StringIO())
+
+        class RecordingHandler(handler):
+            def do_POST(self):
+                # Read the body here and hand the stand-in a copy of it.
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                rfile, self.rfile = self.rfile, io.BytesIO(body)
+                accepted = stats.batches
+                try:
+                    super().do_POST()
+                finally:
+                    self.rfile = rfile
+                if stats.batches > accepted:
+                    batches.append(json.loads(body)["events"])
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class EventTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dids = DIDNumbers.objects.bulk_create(
+            DIDNumbers(did=f"+1555000{n:04d}", partition="events") for n in range(4)
+        )
+
+    def setUp(self):
+        self.redis = events._redis()
+        self.redis.delete(*REDIS_KEYS)
+        self.addCleanup(self.redis.delete, *REDIS_KEYS)
+        # Retries back off with real sleeps otherwise.
+        sleep = mock.patch("netbox_plugin_voip.events.time.sleep")
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def dispatcher(self, sink, **kwargs):
+        kwargs.setdefault("max_retries", 0)
+        dispatcher = events.Dispatcher(endpoints=[sink.url], concurrency=2, batch_size=2, **kwargs)
+        self.addCleanup(dispatcher.close)
+        return dispatcher
+
+    def test_edits_within_a_window_are_coalesced(self):
+        created, updated, cancelled, deleted = (did.pk for did in self.dids)
+        events.record(events.ACTION_CREATE, [created, cancelled])
+        events.record(events.ACTION_UPDATE, [created, updated, updated, updated, deleted])
+        events.record(events.ACTION_DELETE, [cancelled, deleted], {deleted: {"did": "+15550000003"}})
+
+        with Sink() as sink:
+            delivered, failed = self.dispatcher(sink).flush()
+
+        self.assertEqual((delivered, failed), (3, 0))
+        self.assertEqual(sink.stats.events, 3)
+        self.assertEqual(sink.stats.actions, {"create": 1, "update": 1, "delete": 1})
+        self.assertTrue(all(len(batch) <= 2 for batch in sink.batches))
+        received = {event["id"]: event for batch in sink.batches for event in batch}
+        self.assertEqual(received[created]["action"], "create")
+        self.assertEqual(received[deleted], {"action": "delete", "id": deleted, "did": "+15550000003"})
+        self.assertNotIn(cancelled, received)
+        self.assertEqual(events.metrics()["cancelled"], 1)
+
+    def test_failed_batches_are_retried_and_requeued(self):
+        pks = [did.pk for did in self.dids]
+        events.record(events.ACTION_UPDATE, pks)
+
+        with Sink(fail_rate=1) as sink:
+            delivered, failed = self.dispatcher(sink, max_retries=2).flush()
+        self.assertEqual((delivered, failed), (0, 2))
+        # Each of the two batches was tried three times.
+        self.assertEqual(sink.stats.rejected, 6)
+        self.assertEqual(events.metrics()["retries"], 4)
+        self.assertEqual(events.metrics()["pending"], len(pks))
+
+        # Requeued events coalesce with edits buffered after the failure.
+        events.record(events.ACTION_DELETE, pks[:1], {pks[0]: {"did": "+15550000000"}})
+        with Sink() as sink:
+            delivered, failed = self.dispatcher(sink).flush()
+        self.assertEqual((delivered, failed), (len(pks), 0))
+        self.assertEqual(sink.stats.actions, {"update": len(pks) - 1, "delete": 1})
+        self.assertEqual(events.metrics()["pending"], 0)
+
+    def test_buffer_is_bounded_by_distinct_dids_and_flushes_do_not_overlap(self):
+        first, second = self.dids[0].pk, self.dids[1].pk
+        for _ in range(100):
+            events.record(events.ACTION_UPDATE, [first])
+        self.assertEqual(events.metrics()["pending"], 1)
+
+        with Sink() as sink:
+            dispatcher = self.dispatcher(sink)
+            # A flush that took the buffer and died: changes recorded meanwhile wait for the next one.
+            dispatcher._take()
+            events.record(events.ACTION_UPDATE, [second])
+            self.assertEqual(events.metrics()["in_flight"], 1)
+            self.assertEqual(dispatcher.flush(), (1, 0))
+            self.assertEqual(events.metrics()["pending"], 1)
+            self.assertEqual(dispatcher.flush(), (1, 0))
+
+        self.assertEqual([[event["id"] for event in batch] for batch in sink.batches], [[first], [second]])
+        self.assertEqual(events.metrics()["recorded"], 101)
+
+
+class EventMetricsViewTestCase(TestCase):
+
+    def test_metrics_are_staff_only(self):
+        url = reverse("plugins-api:netbox_plugin_voip-api:event-metrics")
+        user = User.objects.create_user(username="events")
+        token = Token.objects.create(user=user)
+        headers = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, **headers).status_code, 403)
+        user.is_staff = True
+        user.save()
+        with mock.patch.object(events, "metrics", return_value={"pending": 0}):
+            response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"pending": 0})
@@ -0,0 +1,95 @@
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from circuits.models import Provider
+from dcim.models import Device, DeviceRole, DeviceType, Manufacturer, Site
+
+from netbox_plugin_voip.models import DIDNumbers, Line, Phone
+
+try:
+    import graphene
+
+    from netbox_plugin_voip.graphql import Query
+except ImportError:  # NetBox before 3.0 has no GraphQL API
+    Query = None
+
+DID_COUNT = 1000
+PHONE_COUNT = 20
+SHARED_LINES = 10
+NESTED_QUERY = (
+    "{ did_list(limit: %d) { id did partition provider { name } "
+    "lines { position label phone { device { name } lines { position } } } } }"
+)
+# The same bound voip_benchmark enforces on the graphql_api scenario.
+QUERY_BUDGET = 10
+
+
+@skipIf(Query is None, "GraphQL needs NetBox 3.0 or later")
+class GraphQLTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="graphql", is_superuser=True)
+        provider = Provider.objects.create(name="Carrier", slug="carrier")
+        cls.dids = DIDNumbers.objects.bulk_create(
+            DIDNumbers(did=f"+1555{n:07d}", partition="test", provider=provider if n % 2 else None)
+            for n in range(DID_COUNT)
+        )
+        site = Site.objects.create(name="Site 1", slug="site-1")
+        manufacturer = Manufacturer.objects.create(name="Phones Inc", slug="phones-inc")
+        device_type = DeviceType.objects.create(manufacturer=manufacturer, model="Desk Phone", slug="desk-phone")
+        role = DeviceRole.objects.create(name="Phone", slug="phone", color="ff0000")
+        phones = [
+            Phone.objects.create(device=Device.objects.create(
+                name=f"phone-{n}", site=site, device_type=device_type, device_role=role,
+            ))
+            for n in range(PHONE_COUNT)
+        ]
+        # Two lines per phone, plus the first DID shared on position 3 of half the phones.
+        lines = [
+            Line(phone=phone, position=position, did=cls.dids[2 * n + position - 1])
+            for n, phone in enumerate(phones) for position in (1, 2)
+        ]
+        lines += [Line(phone=phone, position=3, did=cls.dids[0]) for phone in phones[:SHARED_LINES]]
+        Line.objects.bulk_create(lines)
+
+    def setUp(self):
+        self.schema = graphene.Schema(query=Query, auto_camelcase=False)
+        self.request = RequestFactory().post("/graphql/")
+        self.request.user = self.user
+
+    def execute(self, query):
+        result = self.schema.execute(query, context_value=self.request)
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_nested_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as small:
+            self.execute(NESTED_QUERY % 10)
+        self.assertLessEqual(len(small), QUERY_BUDGET)
+
+        with self.assertNumQueries(len(small)):
+            data = self.execute(NESTED_QUERY % DID_COUNT)
+        self.assertEqual(len(data["did_list"]), DID_COUNT)
+        self.assertEqual(len(data["did_list"][0]["lines"]), 1 + SHARED_LINES)
+
+    def test_nested_lists_are_capped(self):
+        with mock.patch.dict(settings.PLUGINS_CONFIG["netbox_plugin_voip"], {"graphql_max_nested": 2}):
+            data = self.execute(NESTED_QUERY % 10)
+        self.assertEqual(len(data["did_list"][0]["lines"]), 2)
+        # phone-0 has three lines.
+        self.assertEqual([len(line["phone"]["lines"]) for line in data["did_list"][0]["lines"]], [2, 2])
+
+    def test_limit_above_max_results_is_rejected(self):
+        result = self.schema.execute(NESTED_QUERY % (DID_COUNT + 1), context_value=self.request)
+        self.assertIsNotNone(result.errors)
+
+    def test_depth_limit(self):
+        with mock.patch.dict(settings.PLUGINS_CONFIG["netbox_plugin_voip"], {"graphql_max_depth": 2}):
+            result = self.schema.execute(NESTED_QUERY % 10, context_value=self.request)
+        self.assertIsNotNone(result.errors)
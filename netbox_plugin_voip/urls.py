@@ -1,4 +1,7 @@
-from netbox_plugin_voip.views import VOIPView
+from netbox_plugin_voip.views import (
+    DIDNumbersBulkDeleteView, DIDNumbersBulkEditView, DIDNumbersListView, NumberBlockHeatmapView, VOIPView,
+)
+from netbox_plugin_voip.resolver import resolve_did, resolve_did_sync
 from django.http import HttpResponse
 from django.urls import path
 
@@ -10,5 +13,11 @@ def dummy_view(request):
 # These urlpatterns are referenced in navigation.py
 urlpatterns = [
     path("", dummy_view, name="voice-main-page"),
+    path("dids/", DIDNumbersListView.as_view(), name="didnumbers_list"),
+    path("dids/edit/", DIDNumbersBulkEditView.as_view(), name="didnumbers_bulk_edit"),
+    path("dids/delete/", DIDNumbersBulkDeleteView.as_view(), name="didnumbers_bulk_delete"),
+    path("blocks/heatmap/", NumberBlockHeatmapView.as_view(), name="numberblock_heatmap"),
+    path("resolve/<str:number>/", resolve_did, name="resolve"),
+    path("resolve-sync/<str:number>/", resolve_did_sync, name="resolve_sync"),
     path("<int:pk>/", VOIPView.as_view(), name="voipview")
 ]
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def get_plugin_setting(name):
+    """Return a plugin setting; NetBox fills in VoicePluginConfig.default_settings for unset keys."""
+    return settings.PLUGINS_CONFIG["netbox_plugin_voip"][name]
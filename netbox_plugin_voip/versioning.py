@@ -0,0 +1,165 @@
+"""Per-partition and global version counters for DID data.
+
+Every DIDNumbers write (single or bulk) bumps the global counter and the
+counter of each partition it touched, once the transaction commits. Provider
+and site assignment changes bump separate counters, since DID responses embed
+the provider and the site a DID inherits from its prefix. Views
+use the counters to answer conditional GETs with 304 before querying any rows.
+
+Counters live in the Django cache (Redis in NetBox) so all workers share them.
+A missing counter is seeded from the current time in microseconds, so a cache
+flush can never bring back a version a client has already seen.
+
+With a read replica configured, each bump also records the primary's WAL
+position. Counters move when the primary commits, so a replica that has not
+replayed that far would serve old rows under the new ETag, which the client then
+revalidates forever; conditional views read from the primary until it has.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.http import condition
+
+from . import permissions
+from .routers import primary_lsn, replica_replayed, use_primary
+
+KEY_PREFIX = "netbox_plugin_voip:version"
+# Primary WAL position of the latest bump, when a read replica is configured.
+LSN_KEY = f"{KEY_PREFIX}:lsn"
+GLOBAL = None
+# Sentinels for the provider and site assignment counters; never equal to a partition name.
+PROVIDERS = object()
+SITES = object()
+# Filters whose results depend on more than DIDs (call records, today's date); requests using
+# them are never answered from the counters.
+UNVERSIONED_FILTERS = ("idle_days",)
+
+
+def _keys(partition):
+    if partition is GLOBAL:
+        name = "global"
+    elif partition is PROVIDERS:
+        name = "providers"
+    elif partition is SITES:
+        name = "sites"
+    else:
+        name = f"partition:{hashlib.sha1(partition.encode()).hexdigest()}"
+    return f"{KEY_PREFIX}:{name}", f"{KEY_PREFIX}:{name}:modified"
+
+
+def _seed():
+    now = time.time()
+    return int(now * 1000000), now
+
+
+def get_version(partition=GLOBAL):
+    """Return ``(version, modified_timestamp)`` for a partition, or for all DIDs."""
+    version_key, modified_key = _keys(partition)
+    values = cache.get_many([version_key, modified_key])
+    if version_key in values and modified_key in values:
+        return values[version_key], values[modified_key]
+    version, modified = _seed()
+    cache.add(version_key, version, timeout=None)
+    cache.add(modified_key, modified, timeout=None)
+    values = cache.get_many([version_key, modified_key])
+    return values.get(version_key, version), values.get(modified_key, modified)
+
+
+def bump_versions(partitions, include_global=True):
+    """Advance the counters of ``partitions``, and the global counter unless told otherwise."""
+    # Recorded before the counters move, so whoever sees a new version also sees its WAL position.
+    lsn = primary_lsn()
+    if lsn is not None:
+        cache.set(LSN_KEY, lsn, timeout=None)
+    now = time.time()
+    for partition in [GLOBAL, *partitions] if include_global else partitions:
+        version_key, modified_key = _keys(partition)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            cache.set(version_key, _seed()[0], timeout=None)
+        cache.set(modified_key, now, timeout=None)
+
+
+def bump_versions_on_commit(partitions):
+    """Bump once the current transaction commits, so no poller caches pre-commit data under a new ETag."""
+    partitions = set(partitions)
+    transaction.on_commit(lambda: bump_versions(partitions))
+
+
+def bump_providers_on_commit():
+    transaction.on_commit(lambda: bump_versions([PROVIDERS], include_global=False))
+
+
+def bump_sites_on_commit():
+    transaction.on_commit(lambda: bump_versions([SITES], include_global=False))
+
+
+def replica_current():
+    """Return True if the read replica (if any) has replayed every write that moved a counter so far."""
+    return replica_replayed(cache.get(LSN_KEY))
+
+
+def _request_version(request):
+    """Return the counter governing a request: its partition's for a single ?partition= filter, else global."""
+    if not hasattr(request, "_voip_version"):
+        partitions = request.GET.getlist("partition")
+        partition = partitions[0] if len(partitions) == 1 else GLOBAL
+        version, modified = get_version(partition)
+        provider_version, provider_modified = get_version(PROVIDERS)
+        site_version, site_modified = get_version(SITES)
+        request._voip_version = (
+            f"{version}.{provider_version}.{site_version}", max(modified, provider_modified, site_modified)
+        )
+    return request._voip_version
+
+
+def _versioned(request):
+    return not any(name in request.GET for name in UNVERSIONED_FILTERS)
+
+
+def did_etag(request, *args, **kwargs):
+    """ETag of a DID response: the governing version, the full URL, the requesting user and the version
+    of the permissions that decide which DIDs the user sees."""
+    if not _versioned(request):
+        return None
+    version, _ = _request_version(request)
+    user = getattr(request, "user", None)
+    user_pk = getattr(user, "pk", None)
+    source = (
+        f"{version}:{request.get_full_path()}:{user_pk}:{permissions._version()}:"
+        f"{request.META.get('HTTP_ACCEPT', '')}"
+    )
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def did_last_modified(request, *args, **kwargs):
+    if not _versioned(request):
+        return None
+    _, modified = _request_version(request)
+    return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def did_condition(view):
+    """Decorator for DID views and API actions whose output only changes when DIDNumbers does.
+
+    The view reads from the replica only once it has replayed the writes behind the ETag's versions.
+    """
+    conditional = condition(etag_func=did_etag, last_modified_func=did_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _versioned(request):
+            return conditional(request, *args, **kwargs)
+        # Counters first: a bump records its WAL position before moving them.
+        _request_version(request)
+        if replica_current():
+            return conditional(request, *args, **kwargs)
+        with use_primary():
+            return conditional(request, *args, **kwargs)
+
+    return wrapper
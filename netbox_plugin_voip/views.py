@@ -1,22 +1,179 @@
 # views.py
+from django.contrib import messages
+from django.db import IntegrityError, transaction
 from django.db.models.query import QuerySet
-from django.shortcuts import get_object_or_404, render
+from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.decorators import method_decorator
 from django.views import View
 
-from .models import DIDNumbers
+from netbox.views import generic
+from utilities.exceptions import PermissionsViolation
+from utilities.forms import restrict_form_fields
+
+from . import filters, forms, tables
+from .blocks import CELL_SIZE, heatmap, largest_free_run, region_blocks
+from .bulk import bulk_delete_dids, bulk_update_dids
+from .models import DIDNumbers, NumberBlock
+from .sites import site_details
+from .versioning import did_condition
 
 class VOIPView(View):
     # Display VOIP page
-    queryset = DIDNumbers.objects.all()
+    queryset = DIDNumbers.objects.select_related("provider", "site", "location")
 
+    @method_decorator(did_condition)
     def get(self, request, pk):
         """Get request."""
         voipview_obj = get_object_or_404(self.queryset, pk=pk)
+        site, location, site_assignment = site_details(voipview_obj)
 
         return render(
             request,
             "netbox_plugin_voip/voipview.html",
             {
                 "voipview": voipview_obj,
+                "site": site,
+                "location": location,
+                "site_assignment": site_assignment,
             },
-        )
\ No newline at end of file
+        )
+
+
+class NumberBlockHeatmapView(View):
+    """Utilization heatmap of a 1M-number region, drawn from the precomputed block bitmaps."""
+    queryset = NumberBlock.objects.all()
+
+    def get(self, request):
+        """Get request."""
+        region = request.GET.get("region", "").lstrip("+")
+        rows = []
+        free_run = None
+        if region.isdigit():
+            # One query for both the heatmap and the free run.
+            blocks = region_blocks(self.queryset.restrict(request.user, "view"), region)
+            for prefix, assigned, cells in heatmap(blocks):
+                # Shade each cell 0-4 by how full its run of CELL_SIZE numbers is.
+                levels = [-(-count * 4 // CELL_SIZE) for count in cells]
+                rows.append((prefix, assigned, zip(cells, levels)))
+            free_run = largest_free_run(blocks)
+
+        return render(
+            request,
+            "netbox_plugin_voip/numberblock_heatmap.html",
+            {
+                "region": region,
+                "rows": rows,
+                "free_run": free_run,
+                "cell_size": CELL_SIZE,
+            },
+        )
+
+
+class DIDNumbersListView(generic.ObjectListView):
+    """List DIDs, loading only the columns the table can display."""
+    queryset = DIDNumbers.objects.select_related("provider").only(*tables.DIDNumbersTable.queryset_fields)
+    filterset = filters.DIDNumbersFilterSet
+    filterset_form = forms.DIDNumbersFilterForm
+    table = tables.DIDNumbersTable
+    action_buttons = ("export",)
+    template_name = "netbox_plugin_voip/didnumbers_list.html"
+
+
+class DIDNumbersBulkEditView(generic.BulkEditView):
+    """Bulk edit DIDs with a single UPDATE instead of one save() per object."""
+    queryset = DIDNumbers.objects.select_related("provider").only(*tables.DIDNumbersTable.queryset_fields)
+    filterset = filters.DIDNumbersFilterSet
+    table = tables.DIDNumbersTable
+    form = forms.DIDNumbersBulkEditForm
+
+    def get_changes(self, form, nullified_fields):
+        """Build the UPDATE values from the bulk edit form."""
+        changes = {}
+        for name in form.fields:
+            if name == "pk":
+                continue
+            if name in form.nullable_fields and name in nullified_fields:
+                model_field = DIDNumbers._meta.get_field(name)
+                changes[name] = None if model_field.null else ""
+            elif form.cleaned_data[name] not in (None, ""):
+                changes[name] = form.cleaned_data[name]
+        return changes
+
+    def post(self, request, **kwargs):
+        if "_apply" not in request.POST:
+            return super().post(request, **kwargs)
+
+        model = self.queryset.model
+        if request.POST.get("_all") and self.filterset is not None:
+            pk_list = self.filterset(request.GET, self.queryset.values_list("pk", flat=True)).qs
+        else:
+            pk_list = request.POST.getlist("pk")
+
+        form = self.form(model, request.POST, initial={"pk": pk_list})
+        restrict_form_fields(form, request.user)
+
+        if form.is_valid():
+            pk_list = [obj.pk for obj in form.cleaned_data["pk"]]
+            changes = self.get_changes(form, request.POST.getlist("_nullify"))
+            try:
+                with transaction.atomic():
+                    count = bulk_update_dids(
+                        self.queryset.filter(pk__in=pk_list),
+                        changes,
+                        user=request.user,
+                        request_id=getattr(request, "id", None),
+                    )
+                    # Enforce object-level permissions on the post-update state.
+                    if self.queryset.filter(pk__in=pk_list).count() != count:
+                        raise PermissionsViolation
+            except IntegrityError:
+                messages.error(request, "Bulk edit would create duplicate DID/partition pairs.")
+            except PermissionsViolation:
+                messages.error(request, "Object update failed due to object-level permissions violation")
+            else:
+                if count:
+                    messages.success(request, f"Updated {count} {model._meta.verbose_name_plural}")
+                return redirect(self.get_return_url(request))
+
+        table = self.table(self.queryset.filter(pk__in=pk_list), orderable=False)
+        return render(request, self.template_name, {
+            "form": form,
+            "table": table,
+            "obj_type_plural": model._meta.verbose_name_plural,
+            "return_url": self.get_return_url(request),
+        })
+
+
+class DIDNumbersBulkDeleteView(generic.BulkDeleteView):
+    """Bulk delete DIDs with a single DELETE instead of one delete() per object."""
+    queryset = DIDNumbers.objects.select_related("provider").only(*tables.DIDNumbersTable.queryset_fields)
+    filterset = filters.DIDNumbersFilterSet
+    table = tables.DIDNumbersTable
+
+    def post(self, request, **kwargs):
+        if "_confirm" not in request.POST:
+            return super().post(request, **kwargs)
+
+        model = self.queryset.model
+        if request.POST.get("_all") and self.filterset is not None:
+            pk_list = list(self.filterset(request.GET, self.queryset.values_list("pk", flat=True)).qs)
+        else:
+            pk_list = request.POST.getlist("pk")
+
+        form = self.get_form()(request.POST, initial={"pk": pk_list})
+        if form.is_valid():
+            count = bulk_delete_dids(
+                self.queryset.filter(pk__in=pk_list),
+                user=request.user,
+                request_id=getattr(request, "id", None),
+            )
+            messages.success(request, f"Deleted {count} {model._meta.verbose_name_plural}")
+            return redirect(self.get_return_url(request))
+
+        table = self.table(self.queryset.filter(pk__in=pk_list), orderable=False)
+        return render(request, self.template_name, {
+            "form": form,
+            "obj_type_plural": model._meta.verbose_name_plural,
+            "table": table,
+            "return_url": self.get_return_url(request),
+        })
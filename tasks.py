@@ -212,12 +212,46 @@ def unittest(context, netbox_ver=NETBOX_VER, python_ver=PYTHON_VER):
     """
     docker = f"docker-compose -f {COMPOSE_FILE} -p {BUILD_NAME} run netbox"
     context.run(
-        f'{docker} sh -c "python manage.py test netbox_onboarding"',
+        f'{docker} sh -c "python manage.py test netbox_plugin_voip"',
         env={"NETBOX_VER": netbox_ver, "PYTHON_VER": python_ver},
         pty=True,
     )
 
 
+@task
+def benchmark(
+    context, sizes="100000,1000000,10000000", iterations=200, output_dir="benchmark-results",
+    netbox_ver=NETBOX_VER, python_ver=PYTHON_VER,
+):
+    """Seed each dataset size and benchmark the plugin against it, writing one JSON file per size.
+
+    Args:
+        context (obj): Used to run specific commands
+        sizes (str): Comma-separated DIDNumbers counts to seed and benchmark
+        iterations (int): Requests per scenario
+        output_dir (str): Directory (relative to the repository) receiving <size>.json results
+        netbox_ver (str): NetBox version to use to build the container
+        python_ver (str): Will use the Python version docker image to build from
+    """
+    docker = f"docker-compose -f {COMPOSE_FILE} -p {BUILD_NAME} run netbox"
+    os.makedirs(output_dir, exist_ok=True)
+    for size in sizes.split(","):
+        size = int(size)
+        print(f"Seeding {size} DIDs...")
+        context.run(
+            f'{docker} sh -c "python manage.py voip_seed_dids --reset --count {size}"',
+            env={"NETBOX_VER": netbox_ver, "PYTHON_VER": python_ver},
+            pty=True,
+        )
+        print(f"Benchmarking {size} DIDs...")
+        context.run(
+            f'{docker} sh -c "python manage.py voip_benchmark --iterations {iterations} '
+            f'--output /source/{output_dir}/{size}.json"',
+            env={"NETBOX_VER": netbox_ver, "PYTHON_VER": python_ver},
+            pty=True,
+        )
+
+
 @task
 def pylint(context, netbox_ver=NETBOX_VER, python_ver=PYTHON_VER):
     """Run pylint code analysis.